@@ -3,7 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.utils import timezone
-from django.core.mail import send_mail
+from notifications.outbox import enqueue_email
 from django.conf import settings
 from django.urls import reverse
 from django.utils.crypto import get_random_string
@@ -185,10 +185,9 @@ def send_verification_email(user):
         reverse('accounts:verify_email')
     ) + f'?token={token}'
     
-    send_mail(
+    enqueue_email(
         'Verify your email address',
         f'Please click the following link to verify your email address:\n\n{verification_url}',
         settings.EMAIL_HOST_USER,
-        [user.email],
-        fail_silently=False,
+        [user.email]
     )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserActivity, SiteStatistics, ProductAnalytics, SubscriptionAnalytics
+from .models import UserActivity, SiteStatistics, ProductAnalytics, SubscriptionAnalytics, RollupCheckpoint
 
 @admin.register(UserActivity)
 class UserActivityAdmin(admin.ModelAdmin):
@@ -31,3 +31,8 @@ class SubscriptionAnalyticsAdmin(admin.ModelAdmin):
     search_fields = ('plan__name',)
     date_hierarchy = 'date'
     readonly_fields = ('date',)
+
+@admin.register(RollupCheckpoint)
+class RollupCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('source', 'last_id', 'updated_at')
+    readonly_fields = ('updated_at',)
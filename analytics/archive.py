@@ -0,0 +1,188 @@
+"""
+Retention for UserActivity.
+
+Rows older than the retention window are written to gzipped JSONL part
+files, one per batch, in a directory per month (user_activity_YYYY-MM/),
+and then deleted in bounded batches. Months are keyed by local date, the
+same way generate_daily_stats splits days, and the files can be read back
+with iter_archived_activity.
+
+ANALYTICS_ARCHIVE_DIR has to be set explicitly and must point at durable
+storage (a mounted volume, not the dyno's ephemeral filesystem), because the
+archived rows no longer exist anywhere else.
+"""
+import gzip
+import json
+import os
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import UserActivity
+
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'activity_type', 'timestamp', 'ip_address',
+    'user_agent', 'content_type_id', 'object_id', 'metadata',
+]
+
+PART_PATTERN = 'part-*.jsonl.gz'
+
+
+def get_archive_dir():
+    archive_dir = getattr(settings, 'ANALYTICS_ARCHIVE_DIR', None)
+    if not archive_dir:
+        raise ImproperlyConfigured('Set ANALYTICS_ARCHIVE_DIR to a durable directory to archive activity')
+    return Path(archive_dir)
+
+
+def archive_path(month, archive_dir=None):
+    """Directory holding the archive parts for a month, given as any date inside it."""
+    return Path(archive_dir or get_archive_dir()) / f'user_activity_{month:%Y-%m}'
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _content_type_labels(ids):
+    # Stored by natural key so archives survive content type ids changing
+    return {
+        ct.id: f'{ct.app_label}.{ct.model}'
+        for ct in ContentType.objects.filter(id__in=ids)
+    }
+
+
+def archive_activity(before, batch_size=5000, archive_dir=None):
+    """
+    Move activity with a timestamp before `before` into the monthly archives.
+
+    Each batch is written to its own part file, which only appears under its
+    final name once it is complete and on disk, and its rows are deleted
+    after that. A crash can at worst leave a temporary file, which readers
+    ignore, or archive a batch again; readers skip duplicate ids. Returns
+    the number of rows archived per month.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    archived = Counter()
+    while True:
+        with transaction.atomic():
+            rows = list(
+                UserActivity.objects.filter(timestamp__lt=before)
+                .order_by('id').values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return archived
+
+            labels = _content_type_labels({row['content_type_id'] for row in rows if row['content_type_id']})
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[_month_start(timezone.localdate(row['timestamp']))].append(row)
+
+            for month, month_rows in by_month.items():
+                _write_part(archive_path(month, archive_dir), month_rows, labels)
+                archived[month] += len(month_rows)
+
+            UserActivity.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+
+def _write_part(month_dir, rows, labels):
+    month_dir.mkdir(parents=True, exist_ok=True)
+    # Named after its id range, so archiving the same batch again replaces it
+    path = month_dir / f'part-{rows[0]["id"]:012d}-{rows[-1]["id"]:012d}.jsonl.gz'
+    fd, tmp_path = tempfile.mkstemp(dir=month_dir, prefix='.part-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as handle:
+                for row in rows:
+                    record = dict(row)
+                    record['timestamp'] = row['timestamp'].isoformat()
+                    record['content_type'] = labels.get(record.pop('content_type_id'))
+                    handle.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    # The rename is only durable once the directory entry is on disk too
+    dir_fd = os.open(month_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def archived_months(start, end, archive_dir=None):
+    """Part files covering the local dates start..end that exist on disk."""
+    archive_dir = archive_dir or getattr(settings, 'ANALYTICS_ARCHIVE_DIR', None)
+    if not archive_dir:
+        # Nothing can have been archived without an archive directory
+        return []
+    month = _month_start(start)
+    paths = []
+    while month <= end:
+        paths.extend(sorted(archive_path(month, archive_dir).glob(PART_PATTERN)))
+        month = _month_start(month + timedelta(days=31))
+    return paths
+
+
+def iter_archived_activity(start, end, archive_dir=None):
+    """
+    Yield archived activity records (dicts) whose local date falls within
+    start..end, with timestamps parsed back to aware datetimes.
+    """
+    seen = set()
+    for path in archived_months(start, end, archive_dir):
+        with gzip.open(path, 'rt') as handle:
+            for line in handle:
+                record = json.loads(line)
+                if record['id'] in seen:
+                    continue
+                seen.add(record['id'])
+                record['timestamp'] = parse_datetime(record['timestamp'])
+                if start <= timezone.localdate(record['timestamp']) <= end:
+                    yield record
+
+
+class ArchivedDailyActivity:
+    """
+    Per-day aggregates of archived activity for the stats backfill: the set
+    of active users and the (object_id, activity_type) counts for products.
+    Each month file is read at most once.
+    """
+
+    def __init__(self, archive_dir=None):
+        self.archive_dir = archive_dir
+        self._months = {}
+
+    def for_day(self, day):
+        month = _month_start(day)
+        if month not in self._months:
+            self._months[month] = self._load(month)
+        return self._months[month].get(day, {'users': set(), 'products': Counter()})
+
+    def _load(self, month):
+        days = {}
+        month_end = _month_start(month + timedelta(days=31)) - timedelta(days=1)
+        for record in iter_archived_activity(month, month_end, self.archive_dir):
+            day = timezone.localdate(record['timestamp'])
+            summary = days.setdefault(day, {'users': set(), 'products': Counter()})
+            summary['users'].add(record['user_id'])
+            if record['content_type'] == 'inventory.product' and record['object_id'] is not None:
+                summary['products'][(record['object_id'], record['activity_type'])] += 1
+        return days
+
+
+def retention_cutoff(days=None):
+    """Start of the oldest local day that is still kept in the database."""
+    if days is None:
+        days = getattr(settings, 'ANALYTICS_ACTIVITY_RETENTION_DAYS', 90)
+    oldest_kept = timezone.localdate() - timedelta(days=days)
+    return timezone.make_aware(datetime.combine(oldest_kept, time.min))
@@ -0,0 +1,55 @@
+"""
+Pre-serialized chart series for the analytics dashboard.
+
+Responses are cached as JSON bytes plus an ETag, keyed by date range and a
+version number that is bumped whenever SiteStatistics rows are written, so
+stale entries are simply never read again. Bumps made by the stats commands
+only reach the web processes through a shared cache, so production needs
+REDIS_URL (see CACHES).
+"""
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import SiteStatistics
+
+VERSION_KEY = 'analytics:site-stats-version'
+
+
+def get_cache_timeout():
+    return getattr(settings, 'ANALYTICS_CHART_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_site_statistics_version():
+    # Time based, so a version lost to eviction can't come back and revive old entries
+    return cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+
+
+def invalidate_site_statistics():
+    """Call after SiteStatistics rows change; cached series are orphaned."""
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def build_site_statistics_series(start_date, end_date):
+    """Serialize the chart series for a date range into JSON bytes."""
+    data = {'dates': [], 'active_users': [], 'total_orders': [], 'total_revenue': []}
+    for date, active_users, total_orders, total_revenue in SiteStatistics.objects.filter(
+        date__range=[start_date, end_date]
+    ).order_by('date').values_list('date', 'active_users', 'total_orders', 'total_revenue'):
+        data['dates'].append(date.strftime('%Y-%m-%d'))
+        data['active_users'].append(active_users)
+        data['total_orders'].append(total_orders)
+        data['total_revenue'].append(float(total_revenue))
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def get_site_statistics_series(start_date, end_date):
+    """Return (etag, body) for a date range, building it on a cache miss."""
+    key = f'analytics:site-stats:{get_site_statistics_version()}:{start_date}:{end_date}'
+    cached = cache.get(key)
+    if cached is None:
+        body = build_site_statistics_series(start_date, end_date)
+        cached = (f'"{hashlib.md5(body).hexdigest()}"', body)
+        cache.set(key, cached, timeout=get_cache_timeout())
+    return cached
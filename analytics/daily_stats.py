@@ -0,0 +1,200 @@
+"""
+Full recomputation of one day's SiteStatistics, ProductAnalytics and
+SubscriptionAnalytics rows.
+
+Every metric comes from a grouped query over that day's raw rows, so the
+number of queries doesn't depend on catalogue size, and every row is
+written with absolute values, so recomputing a day is idempotent.
+
+Metrics the incremental rollup adds deltas to are counted only from the rows
+it has already folded in (see rollups.RollupOwnership), so the rollup's later
+deltas land on top of this day without counting anything twice.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+from checkout.models import Order
+from inventory.models import Product, Review
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from .archive import ArchivedDailyActivity
+from .models import SiteStatistics, ProductAnalytics, SubscriptionAnalytics, UserActivity
+from .rollups import RollupOwnership
+
+
+class DailyStatsGenerator:
+    """Recomputes days one at a time; archived months are read once per generator."""
+
+    def __init__(self, archived_activity=None):
+        # Days past the retention window are read back from the monthly archives
+        self.archived_activity = archived_activity or ArchivedDailyActivity()
+
+    def generate(self, date):
+        """Generate all statistics for one day."""
+        day_start = timezone.make_aware(datetime.combine(date, time.min))
+        day_end = day_start + timedelta(days=1)
+        archived_day = self.archived_activity.for_day(date)
+
+        with transaction.atomic():
+            # Holds the rollup back until this day is written
+            owned = RollupOwnership()
+            subscription_rows = self._generate_subscription_analytics(date, day_start, day_end, owned)
+            self._generate_product_analytics(date, day_start, day_end, archived_day, owned)
+            self._generate_site_statistics(date, day_start, day_end, archived_day, subscription_rows, owned)
+
+    def _generate_site_statistics(self, date, day_start, day_end, archived_day, subscription_rows, owned):
+        """Generate site-wide statistics for the given date."""
+        # Get user statistics
+        total_users = User.objects.filter(date_joined__lt=day_end).count()
+        active_users = owned.counted('activity', UserActivity.objects.filter(
+            timestamp__gte=day_start,
+            timestamp__lt=day_end
+        )).values('user').distinct()
+        if archived_day['users']:
+            active_users = len(archived_day['users'].union(active_users.values_list('user', flat=True)))
+        else:
+            active_users = active_users.count()
+        new_users = owned.counted('users', User.objects.filter(
+            date_joined__gte=day_start,
+            date_joined__lt=day_end
+        )).count()
+
+        # Get order statistics
+        orders = owned.counted('orders', Order.objects.filter(
+            created_at__gte=day_start,
+            created_at__lt=day_end
+        )).aggregate(
+            total_orders=Count('id'),
+            # Pending orders are the rollup's to add once they complete
+            total_revenue=Sum('amount', filter=Q(status='COMPLETED') & ~Q(
+                id__in=owned.checkpoints['orders'].state.get('pending_ids', [])
+            ))
+        )
+
+        # Subscription statistics are the per-plan rows summed up
+        SiteStatistics.objects.bulk_create(
+            [SiteStatistics(
+                date=date,
+                total_users=total_users,
+                active_users=active_users,
+                new_users=new_users,
+                total_orders=orders['total_orders'],
+                total_revenue=orders['total_revenue'] or 0,
+                active_subscriptions=sum(row.active_subscriptions for row in subscription_rows),
+                new_subscriptions=sum(row.new_subscriptions for row in subscription_rows),
+                cancelled_subscriptions=sum(row.cancellations for row in subscription_rows),
+                trial_conversions=sum(row.trial_conversions for row in subscription_rows),
+            )],
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=[
+                'total_users', 'active_users', 'new_users', 'total_orders',
+                'total_revenue', 'active_subscriptions', 'new_subscriptions',
+                'cancelled_subscriptions', 'trial_conversions',
+            ]
+        )
+
+    def _generate_product_analytics(self, date, day_start, day_end, archived_day, owned):
+        """Generate product-specific analytics for the given date."""
+        # Views and add to cart actions, grouped by product and activity
+        activity_counts = Counter(archived_day['products'])
+        for row in owned.counted('activity', UserActivity.objects.filter(
+            activity_type__in=['VIEW_PRODUCT', 'ADD_TO_CART'],
+            content_type__model='product',
+            timestamp__gte=day_start,
+            timestamp__lt=day_end
+        )).values('object_id', 'activity_type').annotate(total=Count('id')):
+            activity_counts[(row['object_id'], row['activity_type'])] += row['total']
+
+        # Purchases and revenue
+        sales = {
+            row['product']: row
+            for row in owned.settled_orders(Order.objects.filter(
+                created_at__gte=day_start,
+                created_at__lt=day_end,
+                status='COMPLETED'
+            )).values('product').annotate(purchases=Count('id'), revenue=Sum('amount'))
+        }
+
+        # Average rating of reviews left that day
+        ratings = dict(
+            Review.objects.filter(
+                created_at__gte=day_start,
+                created_at__lt=day_end
+            ).values('product').annotate(avg=Avg('rating')).values_list('product', 'avg')
+        )
+
+        rows = []
+        for product_id in Product.objects.values_list('id', flat=True):
+            sale = sales.get(product_id, {})
+            rows.append(ProductAnalytics(
+                product_id=product_id,
+                date=date,
+                views=activity_counts.get((product_id, 'VIEW_PRODUCT'), 0),
+                add_to_cart=activity_counts.get((product_id, 'ADD_TO_CART'), 0),
+                purchases=sale.get('purchases', 0),
+                revenue=sale.get('revenue') or 0,
+                average_rating=ratings.get(product_id) or 0,
+            ))
+
+        ProductAnalytics.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['product', 'date'],
+            update_fields=['views', 'add_to_cart', 'purchases', 'revenue', 'average_rating']
+        )
+
+    def _generate_subscription_analytics(self, date, day_start, day_end, owned):
+        """Generate subscription-specific analytics for the given date."""
+        # Subscriptions still running at the end of the day (or now, for today)
+        as_of = min(day_end, timezone.now())
+        active = dict(
+            UserSubscription.objects.filter(
+                status='ACTIVE',
+                start_date__lt=as_of,
+                end_date__gt=as_of
+            ).values('plan').annotate(total=Count('id')).values_list('plan', 'total')
+        )
+
+        created = {
+            row['plan']: row
+            for row in owned.counted('subscriptions', UserSubscription.objects.filter(
+                created_at__gte=day_start,
+                created_at__lt=day_end
+            )).values('plan').annotate(
+                new_subscriptions=Count('id', filter=Q(status='ACTIVE')),
+                cancellations=Count('id', filter=Q(status='CANCELLED')),
+                revenue=Sum('plan__price', filter=Q(status='ACTIVE')),
+                trial_starts=Count('id', filter=Q(is_trial=True)),
+                trial_conversions=Count('id', filter=Q(is_trial=False, status='ACTIVE')),
+            )
+        }
+
+        rows = []
+        for plan_id in SubscriptionPlan.objects.values_list('id', flat=True):
+            stats = created.get(plan_id, {})
+            rows.append(SubscriptionAnalytics(
+                plan_id=plan_id,
+                date=date,
+                active_subscriptions=active.get(plan_id, 0),
+                new_subscriptions=stats.get('new_subscriptions', 0),
+                cancellations=stats.get('cancellations', 0),
+                # Renewals aren't recorded on UserSubscription yet
+                renewals=0,
+                revenue=stats.get('revenue') or 0,
+                trial_starts=stats.get('trial_starts', 0),
+                trial_conversions=stats.get('trial_conversions', 0),
+            ))
+
+        SubscriptionAnalytics.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['plan', 'date'],
+            update_fields=[
+                'active_subscriptions', 'new_subscriptions', 'cancellations',
+                'renewals', 'revenue', 'trial_starts', 'trial_conversions',
+            ]
+        )
+        return rows
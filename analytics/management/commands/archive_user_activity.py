@@ -0,0 +1,39 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from analytics.archive import archive_activity, get_archive_dir, retention_cutoff
+from analytics.models import UserActivity
+
+
+class Command(BaseCommand):
+    help = 'Move user activity older than the retention window into monthly gzipped JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Days of activity to keep in the database, defaults to ANALYTICS_ACTIVITY_RETENTION_DAYS')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows archived and deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        cutoff = retention_cutoff(options['days'])
+        if options['dry_run']:
+            count = UserActivity.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} activities before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        try:
+            archive_dir = get_archive_dir()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        archived = archive_activity(cutoff, batch_size=options['batch_size'], archive_dir=archive_dir)
+        for month, count in sorted(archived.items()):
+            self.stdout.write(f'{month:%Y-%m}: {count} activities')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sum(archived.values())} activities before {cutoff:%Y-%m-%d} to {archive_dir}'
+        ))
@@ -0,0 +1,86 @@
+import timeit
+from django.core.management.base import BaseCommand
+from analytics.middleware import ActivityClassifier
+
+# A mix of tracked and untracked requests, roughly shaped like real traffic
+SAMPLE_REQUESTS = [
+    ('/', 'GET'),
+    ('/static/css/main.css', 'GET'),
+    ('/exercise-plans/', 'GET'),
+    ('/products/product/protein-powder/', 'GET'),
+    ('/products/nutrition-plan/3/', 'GET'),
+    ('/cart/', 'GET'),
+    ('/products/add-to-cart/product/4/', 'POST'),
+    ('/products/cart/remove/product/4/', 'POST'),
+    ('/accounts/login/', 'POST'),
+    ('/subscriptions/', 'GET'),
+    ('/subscription/switch/2/', 'POST'),
+    ('/profile/', 'GET'),
+    ('/products/set-timezone/', 'POST'),
+    ('/checkout/create-checkout-session/5/', 'POST'),
+    ('/sitemap.xml', 'GET'),
+    ('/admin/', 'HEAD'),
+]
+
+
+def legacy_classify(path, method):
+    """The substring if/elif chain the middleware used before ActivityClassifier."""
+    original_path = path
+    path = path.lower()
+
+    if path.endswith('/login/') and method == 'POST':
+        activity_type = 'LOGIN'
+    elif path.endswith('/logout/') and method == 'POST':
+        activity_type = 'LOGOUT'
+    elif '/product/' in path and method == 'GET':
+        activity_type = 'VIEW_PRODUCT'
+    elif '/cart/add/' in path and method == 'POST':
+        activity_type = 'ADD_TO_CART'
+    elif '/cart/remove/' in path and method == 'POST':
+        activity_type = 'REMOVE_FROM_CART'
+    elif '/checkout/' in path and method == 'POST':
+        activity_type = 'CHECKOUT'
+    elif '/subscription/start/' in path and method == 'POST':
+        activity_type = 'SUBSCRIPTION_START'
+    elif '/subscription/cancel/' in path and method == 'POST':
+        activity_type = 'SUBSCRIPTION_CANCEL'
+    elif '/subscription/renew/' in path and method == 'POST':
+        activity_type = 'SUBSCRIPTION_RENEW'
+    elif '/subscription/switch/' in path and method == 'POST':
+        activity_type = 'PLAN_SWITCH'
+    elif '/subscription/trial/start/' in path and method == 'POST':
+        activity_type = 'TRIAL_START'
+    elif '/subscription/trial/convert/' in path and method == 'POST':
+        activity_type = 'TRIAL_CONVERT'
+    else:
+        return None
+
+    product_id = None
+    if '/product/' in path:
+        product_id = original_path.split('/')[-2]
+    return activity_type, product_id
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request overhead of the legacy and compiled activity classifiers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000,
+                            help='Number of passes over the sample request mix')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        classifier = ActivityClassifier()
+
+        def run_legacy():
+            for path, method in SAMPLE_REQUESTS:
+                legacy_classify(path, method)
+
+        def run_compiled():
+            for path, method in SAMPLE_REQUESTS:
+                classifier.classify(path, method)
+
+        calls = iterations * len(SAMPLE_REQUESTS)
+        for label, func in (('legacy if/elif chain', run_legacy), ('compiled classifier', run_compiled)):
+            seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+            self.stdout.write(f"{label:<22} {seconds * 1e9 / calls:8.1f} ns/request")
@@ -0,0 +1,145 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from django.utils import timezone
+from analytics.models import UserActivity
+from inventory.models import Product
+
+ACTIVITY_WEIGHTS = {
+    'VIEW_PRODUCT': 60,
+    'ADD_TO_CART': 10,
+    'REMOVE_FROM_CART': 3,
+    'LOGIN': 12,
+    'LOGOUT': 10,
+    'CHECKOUT': 5,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed UserActivity rows in a throwaway test database and time the analytics '
+        'queries with and without the composite indexes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Activity rows to seed')
+        parser.add_argument('--users', type=int, default=2000, help='Users to spread activity over')
+        parser.add_argument('--products', type=int, default=200, help='Product ids to spread views over')
+        parser.add_argument('--days', type=int, default=90, help='Days of history to spread activity over')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the best is reported')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        # Seeding and dropping indexes never touch the real database
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.seed(options)
+            results = {}
+            with connection.schema_editor() as editor:
+                for index in UserActivity._meta.indexes:
+                    editor.remove_index(UserActivity, index)
+            self._analyze()
+            results['without indexes'] = self.run_queries()
+
+            with connection.schema_editor() as editor:
+                for index in UserActivity._meta.indexes:
+                    editor.add_index(UserActivity, index)
+            self._analyze()
+            results['with indexes'] = self.run_queries()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        names = list(results['without indexes'])
+        width = max(len(name) for name in names)
+        self.stdout.write(f"{'query':<{width}}  {'before':>10}  {'after':>10}")
+        for name in names:
+            before = results['without indexes'][name]
+            after = results['with indexes'][name]
+            self.stdout.write(f"{name:<{width}}  {before * 1000:8.1f}ms  {after * 1000:8.1f}ms")
+
+    def seed(self, options):
+        rows, days = options['rows'], options['days']
+        self.stdout.write(f'Seeding {rows} activity rows...')
+        random.seed(42)
+
+        User.objects.bulk_create(
+            [User(username=f'benchmark-user-{i}') for i in range(options['users'])],
+            batch_size=1000
+        )
+        user_ids = list(User.objects.filter(username__startswith='benchmark-user-').values_list('id', flat=True))
+        product_type = ContentType.objects.get_for_model(Product)
+        activity_types = list(ACTIVITY_WEIGHTS)
+        weights = list(ACTIVITY_WEIGHTS.values())
+
+        self.now = timezone.now()
+        batch = []
+        for _ in range(rows):
+            activity_type = random.choices(activity_types, weights)[0]
+            on_product = activity_type in ('VIEW_PRODUCT', 'ADD_TO_CART', 'REMOVE_FROM_CART')
+            batch.append(UserActivity(
+                user_id=random.choice(user_ids),
+                activity_type=activity_type,
+                timestamp=self.now - timedelta(seconds=random.randrange(days * 86400)),
+                content_type=product_type if on_product else None,
+                object_id=random.randint(1, options['products']) if on_product else None,
+            ))
+            if len(batch) == 10000:
+                UserActivity.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            UserActivity.objects.bulk_create(batch)
+
+        self.user_id = user_ids[0]
+        self.product_type = product_type
+
+    def _analyze(self):
+        # Refresh planner statistics so the index choice reflects the seeded data
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_queries(self):
+        day = timezone.localdate(self.now) - timedelta(days=1)
+        day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        day_end = day_start + timedelta(days=1)
+        logs = UserActivity.objects.select_related('user').order_by('-timestamp')
+
+        queries = {
+            # generate_daily_stats / rollups
+            'daily product activity': lambda: list(UserActivity.objects.filter(
+                activity_type__in=['VIEW_PRODUCT', 'ADD_TO_CART'],
+                content_type=self.product_type,
+                timestamp__gte=day_start,
+                timestamp__lt=day_end
+            ).values('object_id', 'activity_type').annotate(total=Count('id'))),
+            'daily active users': lambda: UserActivity.objects.filter(
+                timestamp__gte=day_start,
+                timestamp__lt=day_end
+            ).values('user').distinct().count(),
+            # activity_logs
+            'logs by user and type': lambda: list(
+                logs.filter(user_id=self.user_id, activity_type='LOGIN')[:50]
+            ),
+            'logs by type': lambda: list(logs.filter(activity_type='CHECKOUT')[:50]),
+            'latest logs': lambda: list(logs[:50]),
+        }
+
+        timings = {}
+        for name, query in queries.items():
+            best = None
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                query()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+        return timings
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from analytics.rollups import IncrementalRollup
+
+
+class Command(BaseCommand):
+    help = 'Add new activity, orders, subscriptions and users into the daily analytics rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows consumed per source in each transaction')
+
+    def handle(self, *args, **options):
+        result = IncrementalRollup(batch_size=options['batch_size']).run()
+        self.stdout.write(self.style.SUCCESS(
+            'Rollups updated: ' + ', '.join(f'{source}={count}' for source, count in result.items())
+        ))
@@ -1,101 +1,127 @@
+import re
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from .models import UserActivity
+from .sink import get_activity_sink
+
+# Tracked routes: (activity type, HTTP method, path marker). Markers are
+# regexes starting with '/' that are searched for in the path, ignoring case.
+# A marker captures the product it refers to as (?P<product_id>...).
+ACTIVITY_ROUTES = [
+    # Login/Logout
+    ('LOGIN', 'POST', r'/login/$'),
+    ('LOGOUT', 'POST', r'/logout/$'),
+
+    # Product related
+    ('VIEW_PRODUCT', 'GET', r'/product/(?:(?P<product_id>[^/]+)/)?'),
+    ('ADD_TO_CART', 'POST', r'/cart/add/(?:product/(?P<product_id>[^/]+)/)?'),
+    ('REMOVE_FROM_CART', 'POST', r'/cart/remove/(?:product/(?P<product_id>[^/]+)/)?'),
+
+    # Checkout
+    ('CHECKOUT', 'POST', r'/checkout/'),
+
+    # Subscription related
+    ('SUBSCRIPTION_START', 'POST', r'/subscription/start/'),
+    ('SUBSCRIPTION_CANCEL', 'POST', r'/subscription/cancel/'),
+    ('SUBSCRIPTION_RENEW', 'POST', r'/subscription/renew/'),
+    ('PLAN_SWITCH', 'POST', r'/subscription/switch/'),
+    ('TRIAL_START', 'POST', r'/subscription/trial/start/'),
+    ('TRIAL_CONVERT', 'POST', r'/subscription/trial/convert/'),
+]
+
+
+class ActivityClassifier:
+    """
+    Classifies a request into an activity type with a single regex search.
+
+    The markers for each HTTP method are compiled once into one alternation
+    with a named group per activity type, so methods without tracked routes
+    are rejected with a dict lookup and everything else costs one scan of
+    the path. If a path contains several markers the leftmost one wins.
+    Product ids are captured by the same search; subscription routes also
+    record the plan_id posted with them.
+    """
+
+    def __init__(self, routes=ACTIVITY_ROUTES):
+        markers_by_method = {}
+        self._product_groups = {}
+        self._plan_activities = set()
+        for activity_type, method, marker in routes:
+            # Group names must be unique across the alternation
+            if '(?P<product_id>' in marker:
+                group = f'{activity_type}__product_id'
+                marker = marker.replace('(?P<product_id>', f'(?P<{group}>')
+                self._product_groups[activity_type] = group
+            if marker.startswith('/subscription/'):
+                self._plan_activities.add(activity_type)
+            # Every marker starts with '/'; hoisting it out of the alternation
+            # gives the regex engine a literal prefix to scan for
+            markers_by_method.setdefault(method, []).append(
+                f'(?P<{activity_type}>{marker[1:]})'
+            )
+        self._matchers = {
+            method: re.compile('/(?:' + '|'.join(markers) + ')', re.IGNORECASE)
+            for method, markers in markers_by_method.items()
+        }
+
+    def classify(self, path, method, data=None):
+        """Return (activity_type, metadata) for a tracked request, or None."""
+        matcher = self._matchers.get(method)
+        if matcher is None:
+            return None
+        match = matcher.search(path)
+        if match is None:
+            return None
+
+        # The activity group encloses its product group, so it closes last
+        activity_type = match.lastgroup
+        metadata = {}
+        group = self._product_groups.get(activity_type)
+        if group and match.group(group):
+            metadata['product_id'] = match.group(group)
+        if activity_type in self._plan_activities and data is not None:
+            plan_id = data.get('plan_id')
+            if plan_id:
+                metadata['plan_id'] = plan_id
+        return activity_type, metadata
+
 
 class UserActivityMiddleware:
     """Middleware to track user activities."""
-    
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.classifier = ActivityClassifier()
 
     def __call__(self, request):
         response = self.get_response(request)
-        
+
+        # Classify first so untracked requests never touch the session or user
+        # The body is only parsed if a subscription route asks for its plan_id
+        post_data = SimpleLazyObject(lambda: request.POST)
+        classification = self.classifier.classify(request.path, request.method, post_data)
+
         # Only track activities for authenticated users
-        if request.user.is_authenticated:
-            self._track_activity(request)
-        
+        if classification and request.user.is_authenticated:
+            self._track_activity(request, *classification)
+
         return response
-    
-    def _track_activity(self, request):
+
+    def _track_activity(self, request, activity_type, metadata):
         """Track user activity based on the request."""
-        activity_type = self._get_activity_type(request)
-        if not activity_type:
-            return
-        
         # Get IP address
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
             ip_address = x_forwarded_for.split(',')[0]
         else:
             ip_address = request.META.get('REMOTE_ADDR')
-        
-        # Create activity record
-        UserActivity.objects.create(
+
+        # Hand the record to the background writer instead of saving it here
+        get_activity_sink().submit(UserActivity(
             user=request.user,
             activity_type=activity_type,
+            timestamp=timezone.now(),
             ip_address=ip_address,
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
-            metadata=self._get_activity_metadata(request)
-        )
-    
-    def _get_activity_type(self, request):
-        """Determine activity type based on request path and method."""
-        path = request.path.lower()
-        method = request.method
-        
-        # Login/Logout
-        if path.endswith('/login/') and method == 'POST':
-            return 'LOGIN'
-        elif path.endswith('/logout/') and method == 'POST':
-            return 'LOGOUT'
-        
-        # Product related
-        elif '/product/' in path and method == 'GET':
-            return 'VIEW_PRODUCT'
-        elif '/cart/add/' in path and method == 'POST':
-            return 'ADD_TO_CART'
-        elif '/cart/remove/' in path and method == 'POST':
-            return 'REMOVE_FROM_CART'
-        
-        # Checkout
-        elif '/checkout/' in path and method == 'POST':
-            return 'CHECKOUT'
-        
-        # Subscription related
-        elif '/subscription/start/' in path and method == 'POST':
-            return 'SUBSCRIPTION_START'
-        elif '/subscription/cancel/' in path and method == 'POST':
-            return 'SUBSCRIPTION_CANCEL'
-        elif '/subscription/renew/' in path and method == 'POST':
-            return 'SUBSCRIPTION_RENEW'
-        elif '/subscription/switch/' in path and method == 'POST':
-            return 'PLAN_SWITCH'
-        elif '/subscription/trial/start/' in path and method == 'POST':
-            return 'TRIAL_START'
-        elif '/subscription/trial/convert/' in path and method == 'POST':
-            return 'TRIAL_CONVERT'
-        
-        return None
-    
-    def _get_activity_metadata(self, request):
-        """Extract relevant metadata from the request."""
-        metadata = {}
-        
-        # Add product ID if viewing a product
-        if '/product/' in request.path.lower():
-            try:
-                product_id = request.path.split('/')[-2]
-                metadata['product_id'] = product_id
-            except (IndexError, ValueError):
-                pass
-        
-        # Add subscription plan ID if subscription related
-        if '/subscription/' in request.path.lower():
-            try:
-                plan_id = request.POST.get('plan_id')
-                if plan_id:
-                    metadata['plan_id'] = plan_id
-            except (AttributeError, ValueError):
-                pass
-        
-        return metadata 
\ No newline at end of file
+            metadata=metadata
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_rollupcheckpoint'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0003_alter_nutritionmeal_options_and_more'),
+        ('subscriptions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productanalytics',
+            index=models.Index(fields=['date'], name='product_analytics_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptionanalytics',
+            index=models.Index(fields=['date'], name='sub_analytics_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['content_type', 'activity_type', 'timestamp', 'object_id'], name='activity_object_daily_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp', 'user'], name='activity_time_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', 'activity_type', '-timestamp'], name='activity_user_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['activity_type', '-timestamp'], name='activity_type_time_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_activity_indexes'),
+        ('inventory', '0003_alter_nutritionmeal_options_and_more'),
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAnalyticsWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_days', models.PositiveSmallIntegerField(choices=[(7, 'Last 7 days'), (30, 'Last 30 days'), (90, 'Last 90 days')])),
+                ('product_name', models.CharField(max_length=200)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('add_to_cart', models.PositiveIntegerField(default=0)),
+                ('purchases', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Analytics Windows',
+                'indexes': [models.Index(fields=['window_days', '-revenue'], name='product_window_revenue_idx')],
+                'unique_together': {('window_days', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SubscriptionAnalyticsWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_days', models.PositiveSmallIntegerField(choices=[(7, 'Last 7 days'), (30, 'Last 30 days'), (90, 'Last 90 days')])),
+                ('plan_name', models.CharField(max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('active_subscriptions', models.PositiveIntegerField(default=0)),
+                ('new_subscriptions', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='subscriptions.subscriptionplan')),
+            ],
+            options={
+                'verbose_name_plural': 'Subscription Analytics Windows',
+                'indexes': [models.Index(fields=['window_days', '-revenue'], name='plan_window_revenue_idx')],
+                'unique_together': {('window_days', 'plan')},
+            },
+        ),
+    ]
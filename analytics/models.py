@@ -17,7 +17,7 @@ class UserActivity(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
@@ -32,6 +32,16 @@ class UserActivity(models.Model):
     class Meta:
         verbose_name_plural = 'User Activities'
         ordering = ['-timestamp']
+        indexes = [
+            # Daily product views/add to cart, grouped by object_id
+            models.Index(fields=['content_type', 'activity_type', 'timestamp', 'object_id'],
+                         name='activity_object_daily_idx'),
+            # Daily active users, and the newest-first listings
+            models.Index(fields=['timestamp', 'user'], name='activity_time_user_idx'),
+            # Activity log filtered by user and/or type, newest first
+            models.Index(fields=['user', 'activity_type', '-timestamp'], name='activity_user_type_time_idx'),
+            models.Index(fields=['activity_type', '-timestamp'], name='activity_type_time_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_activity_type_display()} - {self.timestamp}"
@@ -73,6 +83,8 @@ class ProductAnalytics(models.Model):
         verbose_name_plural = 'Product Analytics'
         unique_together = ['product', 'date']
         ordering = ['-date']
+        # Dashboard ranges span every product, so the unique index can't serve them
+        indexes = [models.Index(fields=['date'], name='product_analytics_date_idx')]
     
     def __str__(self):
         return f"{self.product.name} - {self.date}"
@@ -93,6 +105,66 @@ class SubscriptionAnalytics(models.Model):
         verbose_name_plural = 'Subscription Analytics'
         unique_together = ['plan', 'date']
         ordering = ['-date']
+        # Dashboard ranges span every plan, so the unique index can't serve them
+        indexes = [models.Index(fields=['date'], name='sub_analytics_date_idx')]
     
     def __str__(self):
         return f"{self.plan.name} - {self.date}"
+
+class RollupCheckpoint(models.Model):
+    """High-water mark for an incremental analytics rollup source."""
+    source = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    # Source-specific bookkeeping, e.g. pending order ids awaiting completion
+    state = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.last_id}"
+
+DASHBOARD_WINDOWS = [
+    (7, 'Last 7 days'),
+    (30, 'Last 30 days'),
+    (90, 'Last 90 days'),
+]
+
+class ProductAnalyticsWindow(models.Model):
+    """Rolling-window product totals, refreshed by the stats jobs for the dashboard."""
+    window_days = models.PositiveSmallIntegerField(choices=DASHBOARD_WINDOWS)
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE)
+    # Copied so the dashboard doesn't need to join products
+    product_name = models.CharField(max_length=200)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    add_to_cart = models.PositiveIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Product Analytics Windows'
+        unique_together = ['window_days', 'product']
+        indexes = [models.Index(fields=['window_days', '-revenue'], name='product_window_revenue_idx')]
+
+    def __str__(self):
+        return f"{self.product_name} - {self.window_days} days"
+
+class SubscriptionAnalyticsWindow(models.Model):
+    """Rolling-window subscription plan totals, refreshed by the stats jobs for the dashboard."""
+    window_days = models.PositiveSmallIntegerField(choices=DASHBOARD_WINDOWS)
+    plan = models.ForeignKey('subscriptions.SubscriptionPlan', on_delete=models.CASCADE)
+    plan_name = models.CharField(max_length=100)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    active_subscriptions = models.PositiveIntegerField(default=0)
+    new_subscriptions = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Subscription Analytics Windows'
+        unique_together = ['window_days', 'plan']
+        indexes = [models.Index(fields=['window_days', '-revenue'], name='plan_window_revenue_idx')]
+
+    def __str__(self):
+        return f"{self.plan_name} - {self.window_days} days"
@@ -0,0 +1,356 @@
+"""
+Incremental analytics rollups.
+
+Each source table (activity, orders, subscriptions, users) is consumed in id
+order from a stored high-water mark and its new rows are added into the
+daily SiteStatistics, ProductAnalytics and SubscriptionAnalytics rows. A run
+only reads rows it hasn't seen, never a whole day of raw tables.
+
+The checkpoint also decides which job counts a row. DailyStatsGenerator
+rewrites a day with absolute values, but only from the rows the rollup has
+already folded in (see RollupOwnership); everything past the checkpoint is
+left for the rollup to add, so the two jobs never count the same row.
+
+Ids are handed out before their transactions commit, so a batch can skip an
+id whose row isn't visible yet. Skipped ids are kept on the checkpoint as
+gaps and looked up again by the next runs until LATE_COMMIT_GRACE has
+passed. A row committing later than that is only counted when
+generate_daily_stats next recomputes its day. The default run covers today
+only, so if the row's day has already ended it takes a backfill
+(--date or --start/--end) to count it.
+
+The dashboard's rolling windows are rebuilt by generate_daily_stats only.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from checkout.models import Order
+from subscriptions.models import UserSubscription
+from .charts import invalidate_site_statistics
+from .models import (
+    RollupCheckpoint, SiteStatistics, ProductAnalytics, SubscriptionAnalytics, UserActivity
+)
+
+SOURCES = {
+    'activity': UserActivity,
+    'orders': Order,
+    'subscriptions': UserSubscription,
+    'users': User,
+}
+
+# Keys per UPDATE statement, keeps the OR'ed row filter well within SQL limits
+UPDATE_CHUNK_SIZE = 200
+
+# How long a skipped id is looked up again before its row is left to generate_daily_stats
+LATE_COMMIT_GRACE = timedelta(minutes=10)
+
+# Skipped ids kept per batch; open transactions hold the newest ids, larger jumps are sequence skips
+MAX_BATCH_GAPS = 1000
+
+# How long an order may stay pending before we stop waiting for it to complete
+PENDING_ORDER_WINDOW = timedelta(days=2)
+
+
+def day_bounds(date):
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def add_to_rollup(model, key_fields, deltas):
+    """
+    Add per-row deltas into rollup rows, creating missing rows first.
+
+    deltas maps a key tuple (matching key_fields) to {field: amount}. Each
+    chunk of keys is applied with a single UPDATE using F() + CASE, so
+    concurrent writers never lose increments.
+    """
+    if not deltas:
+        return
+
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas],
+        ignore_conflicts=True
+    )
+
+    items = list(deltas.items())
+    for offset in range(0, len(items), UPDATE_CHUNK_SIZE):
+        chunk = items[offset:offset + UPDATE_CHUNK_SIZE]
+        row_filter = Q()
+        for key, _ in chunk:
+            row_filter |= Q(**dict(zip(key_fields, key)))
+
+        fields = {field for _, values in chunk for field in values}
+        updates = {}
+        for field in fields:
+            output_field = model._meta.get_field(field)
+            whens = [
+                When(Q(**dict(zip(key_fields, key))), then=Value(values[field], output_field=output_field))
+                for key, values in chunk if values.get(field)
+            ]
+            if whens:
+                updates[field] = F(field) + Case(
+                    *whens, default=Value(0, output_field=output_field), output_field=output_field
+                )
+        if updates:
+            model.objects.filter(row_filter).update(**updates)
+
+
+def _nested():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def lock_checkpoint(source):
+    """Lock a source's checkpoint for the rest of the transaction, creating it if needed."""
+    checkpoint, _ = RollupCheckpoint.objects.get_or_create(source=source)
+    # Lock the checkpoint so overlapping runs can't consume the same rows
+    return RollupCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+
+
+def gap_ids(checkpoint):
+    return [int(gap) for gap in checkpoint.state.get('gaps', {})]
+
+
+def counted_rows(queryset, checkpoint):
+    """The rows of queryset the rollup has already folded in."""
+    return queryset.filter(id__lte=checkpoint.last_id).exclude(id__in=gap_ids(checkpoint))
+
+
+def skipped_ids(last_id, ids):
+    """The newest ids after last_id that the sorted batch ids skip over."""
+    missing = []
+    previous = last_id
+    for row_id in ids:
+        missing = (missing + list(range(previous + 1, row_id)[-MAX_BATCH_GAPS:]))[-MAX_BATCH_GAPS:]
+        previous = row_id
+    return missing
+
+
+class RollupOwnership:
+    """
+    The rows each source's checkpoint has folded in, read under its lock.
+
+    Create it inside the transaction that rewrites a day. The locks keep the
+    rollup from advancing until that transaction commits, so rows past a
+    checkpoint, skipped ids and pending orders stay the rollup's to add.
+    """
+
+    def __init__(self):
+        self.checkpoints = {source: lock_checkpoint(source) for source in sorted(SOURCES)}
+
+    def counted(self, source, queryset):
+        return counted_rows(queryset, self.checkpoints[source])
+
+    def settled_orders(self, queryset):
+        """Counted orders, less the pending ones the rollup adds once they complete."""
+        pending_ids = self.checkpoints['orders'].state.get('pending_ids', [])
+        return self.counted('orders', queryset).exclude(id__in=pending_ids)
+
+
+class IncrementalRollup:
+    """Consumes new rows from each source and folds them into the daily rollups."""
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+
+    def run(self):
+        """Process every source until caught up. Returns rows consumed per source."""
+        now = timezone.now()
+        result = {source: self._drain(source, now) for source in SOURCES}
+        result['late'] = sum(self._fill_gaps(source, now) for source in SOURCES)
+        result['pending_orders'] = self._recheck_pending_orders(now)
+        result['snapshot'] = self._refresh_snapshots(now)
+        invalidate_site_statistics()
+        return result
+
+    def _apply(self, source, rows, checkpoint):
+        getattr(self, f'_apply_{source}')(rows, checkpoint)
+
+    def _drain(self, source, now):
+        model = SOURCES[source]
+        consumed = 0
+        while True:
+            with transaction.atomic():
+                checkpoint = lock_checkpoint(source)
+                ids = list(
+                    model.objects.filter(id__gt=checkpoint.last_id)
+                    .order_by('id').values_list('id', flat=True)[:self.batch_size]
+                )
+                if not ids:
+                    return consumed
+                # Only the rows seen above; one committing meanwhile is a gap until the next run
+                self._apply(source, model.objects.filter(id__in=ids), checkpoint)
+                gaps = checkpoint.state.get('gaps', {})
+                gaps.update((str(gap), now.isoformat()) for gap in skipped_ids(checkpoint.last_id, ids))
+                checkpoint.state['gaps'] = gaps
+                checkpoint.last_id = ids[-1]
+                checkpoint.save()
+            consumed += len(ids)
+            if len(ids) < self.batch_size:
+                return consumed
+
+    def _fill_gaps(self, source, now):
+        """Fold in rows that committed after a higher id was consumed. Returns how many."""
+        model = SOURCES[source]
+        with transaction.atomic():
+            checkpoint = lock_checkpoint(source)
+            gaps = checkpoint.state.get('gaps', {})
+            if not gaps:
+                return 0
+
+            found = set(model.objects.filter(id__in=gap_ids(checkpoint)).values_list('id', flat=True))
+            if found:
+                # Still listed as gaps here, so the new rows aren't mistaken for counted ones
+                self._apply(source, model.objects.filter(id__in=found), checkpoint)
+
+            cutoff = now - LATE_COMMIT_GRACE
+            checkpoint.state['gaps'] = {
+                gap: seen for gap, seen in gaps.items()
+                if int(gap) not in found and datetime.fromisoformat(seen) > cutoff
+            }
+            checkpoint.save()
+            return len(found)
+
+    def _apply_activity(self, rows, checkpoint):
+        rows = rows.annotate(day=TruncDate('timestamp'))
+
+        # Product views and add to cart actions
+        product_deltas = _nested()
+        for row in rows.filter(
+            activity_type__in=['VIEW_PRODUCT', 'ADD_TO_CART'],
+            content_type__model='product',
+            object_id__isnull=False
+        ).values('day', 'object_id', 'activity_type').annotate(total=Count('id')):
+            field = 'views' if row['activity_type'] == 'VIEW_PRODUCT' else 'add_to_cart'
+            product_deltas[(row['object_id'], row['day'])][field] += row['total']
+        add_to_rollup(ProductAnalytics, ('product_id', 'date'), product_deltas)
+
+        # Active users: only users with no counted activity that day yet
+        users_by_day = defaultdict(set)
+        for day, user_id in rows.values_list('day', 'user_id').distinct():
+            users_by_day[day].add(user_id)
+
+        site_deltas = _nested()
+        for day, user_ids in users_by_day.items():
+            start, end = day_bounds(day)
+            already_active = set(
+                counted_rows(UserActivity.objects.filter(
+                    user_id__in=user_ids,
+                    timestamp__gte=start,
+                    timestamp__lt=end
+                ), checkpoint).values_list('user_id', flat=True).distinct()
+            )
+            newly_active = len(user_ids - already_active)
+            if newly_active:
+                site_deltas[(day,)]['active_users'] += newly_active
+        add_to_rollup(SiteStatistics, ('date',), site_deltas)
+
+    def _apply_orders(self, rows, checkpoint):
+        rows = rows.annotate(day=TruncDate('created_at'))
+
+        site_deltas = _nested()
+        for row in rows.values('day').annotate(total=Count('id')):
+            site_deltas[(row['day'],)]['total_orders'] += row['total']
+
+        completed = rows.filter(status='COMPLETED')
+        for row in completed.values('day').annotate(revenue=Sum('amount')):
+            site_deltas[(row['day'],)]['total_revenue'] += row['revenue']
+        add_to_rollup(SiteStatistics, ('date',), site_deltas)
+
+        product_deltas = _nested()
+        for row in completed.values('day', 'product_id').annotate(purchases=Count('id'), revenue=Sum('amount')):
+            key = (row['product_id'], row['day'])
+            product_deltas[key]['purchases'] += row['purchases']
+            product_deltas[key]['revenue'] += row['revenue']
+        add_to_rollup(ProductAnalytics, ('product_id', 'date'), product_deltas)
+
+        # Pending orders are revisited until they complete or go stale
+        pending = checkpoint.state.get('pending_ids', [])
+        pending.extend(rows.filter(status='PENDING').values_list('id', flat=True))
+        checkpoint.state['pending_ids'] = pending
+
+    def _recheck_pending_orders(self, now):
+        """Add revenue for pending orders that have completed. Returns how many settled."""
+        with transaction.atomic():
+            checkpoint = lock_checkpoint('orders')
+            pending_ids = checkpoint.state.get('pending_ids', [])
+            if not pending_ids:
+                return 0
+
+            cutoff = now - PENDING_ORDER_WINDOW
+            still_pending = []
+            site_deltas = _nested()
+            product_deltas = _nested()
+            for order in Order.objects.filter(id__in=pending_ids).only(
+                'id', 'status', 'product_id', 'amount', 'created_at'
+            ):
+                if order.status == 'COMPLETED':
+                    day = timezone.localdate(order.created_at)
+                    site_deltas[(day,)]['total_revenue'] += order.amount
+                    product_deltas[(order.product_id, day)]['purchases'] += 1
+                    product_deltas[(order.product_id, day)]['revenue'] += order.amount
+                elif order.status == 'PENDING' and order.created_at > cutoff:
+                    still_pending.append(order.id)
+
+            add_to_rollup(SiteStatistics, ('date',), site_deltas)
+            add_to_rollup(ProductAnalytics, ('product_id', 'date'), product_deltas)
+            checkpoint.state['pending_ids'] = still_pending
+            checkpoint.save()
+            return len(pending_ids) - len(still_pending)
+
+    def _apply_subscriptions(self, rows, checkpoint):
+        plan_deltas = _nested()
+        for row in rows.annotate(day=TruncDate('created_at')).values('day', 'plan_id').annotate(
+            new_subscriptions=Count('id', filter=Q(status='ACTIVE')),
+            cancellations=Count('id', filter=Q(status='CANCELLED')),
+            revenue=Sum('plan__price', filter=Q(status='ACTIVE')),
+            trial_starts=Count('id', filter=Q(is_trial=True)),
+            trial_conversions=Count('id', filter=Q(is_trial=False, status='ACTIVE')),
+        ):
+            key = (row['plan_id'], row['day'])
+            for field in ('new_subscriptions', 'cancellations', 'revenue', 'trial_starts', 'trial_conversions'):
+                plan_deltas[key][field] += row[field] or 0
+        add_to_rollup(SubscriptionAnalytics, ('plan_id', 'date'), plan_deltas)
+
+        site_deltas = _nested()
+        for (plan_id, day), values in plan_deltas.items():
+            site_deltas[(day,)]['new_subscriptions'] += values['new_subscriptions']
+            site_deltas[(day,)]['cancelled_subscriptions'] += values['cancellations']
+            site_deltas[(day,)]['trial_conversions'] += values['trial_conversions']
+        add_to_rollup(SiteStatistics, ('date',), site_deltas)
+
+    def _apply_users(self, rows, checkpoint):
+        site_deltas = _nested()
+        for row in rows.annotate(day=TruncDate('date_joined')).values('day').annotate(total=Count('id')):
+            site_deltas[(row['day'],)]['new_users'] += row['total']
+        add_to_rollup(SiteStatistics, ('date',), site_deltas)
+
+    def _refresh_snapshots(self, now):
+        """Point-in-time totals are replaced, not accumulated."""
+        today = timezone.localdate(now)
+        active_by_plan = dict(
+            UserSubscription.objects.filter(
+                status='ACTIVE', start_date__lt=now, end_date__gt=now
+            ).values('plan').annotate(total=Count('id')).values_list('plan', 'total')
+        )
+
+        SiteStatistics.objects.get_or_create(date=today)
+        SiteStatistics.objects.filter(date=today).update(
+            total_users=User.objects.count(),
+            active_subscriptions=sum(active_by_plan.values())
+        )
+        if active_by_plan:
+            SubscriptionAnalytics.objects.bulk_create(
+                [SubscriptionAnalytics(plan_id=plan_id, date=today) for plan_id in active_by_plan],
+                ignore_conflicts=True
+            )
+        SubscriptionAnalytics.objects.filter(date=today).update(
+            active_subscriptions=Case(
+                *[When(plan_id=plan_id, then=Value(total)) for plan_id, total in active_by_plan.items()],
+                default=Value(0)
+            )
+        )
+        return len(active_by_plan)
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# What to do with a new event when the buffer is full
+OVERFLOW_DROP_NEW = 'drop_new'        # discard the incoming event
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # evict the oldest buffered event
+OVERFLOW_BLOCK = 'block'              # wait up to BLOCK_TIMEOUT, then discard
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)
+
+DEFAULTS = {
+    'MAX_QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 2.0,
+    'OVERFLOW': OVERFLOW_DROP_NEW,
+    'BLOCK_TIMEOUT': 0.05,
+    'SYNCHRONOUS': False,
+}
+
+
+class ActivitySink:
+    """
+    Buffers unsaved UserActivity instances in a bounded in-process queue and
+    writes them with bulk_create from a background thread, once BATCH_SIZE
+    events are waiting or FLUSH_INTERVAL seconds have passed. A synchronous
+    sink writes each event in submit() instead and is never started, so tests
+    don't depend on the writer thread's timing.
+    """
+
+    def __init__(self, max_queue_size=DEFAULTS['MAX_QUEUE_SIZE'],
+                 batch_size=DEFAULTS['BATCH_SIZE'],
+                 flush_interval=DEFAULTS['FLUSH_INTERVAL'],
+                 overflow=DEFAULTS['OVERFLOW'],
+                 block_timeout=DEFAULTS['BLOCK_TIMEOUT'],
+                 synchronous=DEFAULTS['SYNCHRONOUS']):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.synchronous = synchronous
+        self.dropped = 0
+        self.written = 0
+        self._reported_drops = 0
+        self._last_drop_report = float('-inf')
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, activity):
+        """Queue an unsaved UserActivity; only a synchronous sink touches the database."""
+        self._enqueue(activity)
+        if self.synchronous:
+            self.flush()
+
+    def _enqueue(self, activity):
+        if self.overflow == OVERFLOW_BLOCK:
+            try:
+                self._queue.put(activity, timeout=self.block_timeout)
+            except queue.Full:
+                self._record_drop()
+            return
+
+        try:
+            self._queue.put_nowait(activity)
+            return
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP_NEW:
+                self._record_drop()
+                return
+
+        # OVERFLOW_DROP_OLDEST: make room by discarding the oldest event
+        try:
+            self._queue.get_nowait()
+            self._record_drop()
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(activity)
+        except queue.Full:
+            self._record_drop()
+
+    def _record_drop(self):
+        # Logged by flush, not here: drops happen on every request while overloaded
+        with self._counter_lock:
+            self.dropped += 1
+
+    def _report_drops(self, force=False):
+        """Log new drops, at most once per flush interval unless forced."""
+        now = time.monotonic()
+        with self._counter_lock:
+            new_drops = self.dropped - self._reported_drops
+            if not new_drops or (not force and now - self._last_drop_report < self.flush_interval):
+                return
+            self._reported_drops = self.dropped
+            self._last_drop_report = now
+            total = self.dropped
+        logger.warning("Activity buffer dropped %s events since the last report (%s dropped so far)", new_drops, total)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Write every buffered event to the database. Returns the number written."""
+        from .models import UserActivity
+
+        total = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    UserActivity.objects.bulk_create(batch, batch_size=self.batch_size)
+                    total += len(batch)
+                except Exception:
+                    logger.exception("Failed to write %s user activities", len(batch))
+                    with self._counter_lock:
+                        self.dropped += len(batch)
+        with self._counter_lock:
+            self.written += total
+        self._report_drops()
+        return total
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def start(self):
+        """Start the background writer thread if it isn't running yet."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='analytics-activity-sink', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Stop the writer thread and flush whatever is still buffered."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        self._report_drops(force=True)
+        close_old_connections()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop_event.is_set():
+            self._stop_event.wait(min(self.flush_interval, 0.5))
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if self.pending >= self.batch_size or (due and self.pending):
+                close_old_connections()
+                self.flush()
+                last_flush = time.monotonic()
+            elif due:
+                self._report_drops()
+                last_flush = time.monotonic()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_activity_sink():
+    """Return the process-wide sink, configured from ANALYTICS_ACTIVITY_SINK."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                options = {**DEFAULTS, **getattr(settings, 'ANALYTICS_ACTIVITY_SINK', {})}
+                sink = ActivitySink(
+                    max_queue_size=options['MAX_QUEUE_SIZE'],
+                    batch_size=options['BATCH_SIZE'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    overflow=options['OVERFLOW'],
+                    block_timeout=options['BLOCK_TIMEOUT'],
+                    synchronous=options['SYNCHRONOUS'],
+                )
+                if not sink.synchronous:
+                    sink.start()
+                _sink = sink
+    return _sink
@@ -1,3 +1,739 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from io import StringIO
+from decimal import Decimal
+import json
+import os
+import tempfile
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from unittest.mock import patch
+from .models import (
+    UserActivity, SiteStatistics, ProductAnalytics, SubscriptionAnalytics, RollupCheckpoint,
+    ProductAnalyticsWindow, SubscriptionAnalyticsWindow
+)
+from inventory.models import Product
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from checkout.models import Order
+from .middleware import ActivityClassifier, UserActivityMiddleware
+from .management.commands.benchmark_activity_classifier import SAMPLE_REQUESTS, legacy_classify
+from .sink import ActivitySink, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK, get_activity_sink
+from .daily_stats import DailyStatsGenerator
+from .rollups import IncrementalRollup
+from .archive import archive_path, iter_archived_activity
+from . import views
+from .windows import refresh_dashboard_windows
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ActivitySinkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def _activity(self, activity_type='VIEW_PRODUCT'):
+        return UserActivity(user=self.user, activity_type=activity_type)
+
+    def test_flush_writes_buffered_events_in_batches(self):
+        """Test that buffered events are written with bulk inserts."""
+        sink = ActivitySink(batch_size=2)
+        for _ in range(5):
+            sink.submit(self._activity())
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(sink.flush(), 5)
+        self.assertEqual(UserActivity.objects.count(), 5)
+        self.assertEqual(sink.pending, 0)
+
+    def test_drop_new_when_full(self):
+        """Test that the default policy discards incoming events when full."""
+        sink = ActivitySink(max_queue_size=2)
+        sink.submit(self._activity('LOGIN'))
+        sink.submit(self._activity('LOGIN'))
+        sink.submit(self._activity('LOGOUT'))
+
+        self.assertEqual(sink.dropped, 1)
+        sink.flush()
+        self.assertFalse(UserActivity.objects.filter(activity_type='LOGOUT').exists())
+
+    def test_drops_logged_once_per_flush_interval(self):
+        """Test that an overloaded buffer logs its drop total, not every drop."""
+        sink = ActivitySink(max_queue_size=1)
+        with self.assertNoLogs('analytics.sink', level='WARNING'):
+            for _ in range(4):
+                sink.submit(self._activity())
+        with self.assertLogs('analytics.sink', level='WARNING') as logs:
+            sink.flush()
+            sink.submit(self._activity())
+            sink.submit(self._activity())
+            sink.flush()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('dropped 3 events', logs.output[0])
+        self.assertEqual(sink.dropped, 4)
+
+    def test_drop_oldest_when_full(self):
+        """Test that drop_oldest evicts the oldest event to make room."""
+        sink = ActivitySink(max_queue_size=2, overflow=OVERFLOW_DROP_OLDEST)
+        sink.submit(self._activity('LOGIN'))
+        sink.submit(self._activity('CHECKOUT'))
+        sink.submit(self._activity('LOGOUT'))
+
+        self.assertEqual(sink.dropped, 1)
+        sink.flush()
+        self.assertEqual(
+            sorted(UserActivity.objects.values_list('activity_type', flat=True)),
+            ['CHECKOUT', 'LOGOUT']
+        )
+
+    def test_block_gives_up_after_timeout(self):
+        """Test that the block policy drops the event once the wait times out."""
+        sink = ActivitySink(max_queue_size=1, overflow=OVERFLOW_BLOCK, block_timeout=0.01)
+        sink.submit(self._activity())
+        sink.submit(self._activity())
+        self.assertEqual(sink.dropped, 1)
+
+    def test_synchronous_sink_writes_on_submit(self):
+        sink = ActivitySink(synchronous=True)
+        sink.submit(self._activity())
+        self.assertEqual(UserActivity.objects.count(), 1)
+        self.assertEqual(sink.pending, 0)
+
+    @override_settings(ANALYTICS_ACTIVITY_SINK={'SYNCHRONOUS': True})
+    def test_synchronous_setting_starts_no_writer_thread(self):
+        with patch('analytics.sink._sink', None):
+            sink = get_activity_sink()
+            self.assertTrue(sink.synchronous)
+            self.assertIsNone(sink._thread)
+
+    def test_invalid_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            ActivitySink(overflow='explode')
+
+    def test_middleware_does_not_write_during_request(self):
+        """Test that tracked requests only enqueue the activity."""
+        sink = ActivitySink()
+        request = RequestFactory().get('/products/product/42/')
+        request.user = self.user
+        middleware = UserActivityMiddleware(lambda request: None)
+
+        with patch('analytics.middleware.get_activity_sink', return_value=sink):
+            with self.assertNumQueries(0):
+                middleware(request)
+
+        self.assertEqual(sink.pending, 1)
+        sink.flush()
+        activity = UserActivity.objects.get()
+        self.assertEqual(activity.activity_type, 'VIEW_PRODUCT')
+        self.assertEqual(activity.metadata, {'product_id': '42'})
+
+
+class ActivityClassifierTests(TestCase):
+    def setUp(self):
+        self.classifier = ActivityClassifier()
+
+    def test_matches_legacy_classification(self):
+        """Test that the compiled classifier agrees with the old if/elif chain."""
+        requests = SAMPLE_REQUESTS + [
+            ('/accounts/logout/', 'POST'),
+            ('/accounts/LOGIN/', 'POST'),
+            ('/accounts/login/', 'GET'),
+            ('/shop/Product/Whey-Protein/', 'GET'),
+            ('/shop/cart/add/7/', 'POST'),
+            ('/subscription/start/', 'POST'),
+            ('/subscription/cancel/', 'POST'),
+            ('/subscription/renew/', 'POST'),
+            ('/subscription/trial/start/', 'POST'),
+            ('/subscription/trial/convert/', 'POST'),
+        ]
+        for path, method in requests:
+            with self.subTest(path=path, method=method):
+                expected = legacy_classify(path, method)
+                result = self.classifier.classify(path, method)
+                if expected is None:
+                    self.assertIsNone(result)
+                else:
+                    self.assertEqual(result[0], expected[0])
+                    self.assertEqual(result[1].get('product_id'), expected[1])
+
+    def test_product_and_plan_metadata(self):
+        """Test that ids are captured for every route that carries one."""
+        self.assertEqual(
+            self.classifier.classify('/products/cart/remove/product/4/', 'POST'),
+            ('REMOVE_FROM_CART', {'product_id': '4'})
+        )
+        self.assertEqual(self.classifier.classify('/shop/cart/add/7/', 'POST'), ('ADD_TO_CART', {}))
+        self.assertEqual(
+            self.classifier.classify('/subscription/start/', 'POST', {'plan_id': '2'}),
+            ('SUBSCRIPTION_START', {'plan_id': '2'})
+        )
+
+    def test_middleware_records_cart_remove_product(self):
+        sink = ActivitySink()
+        request = RequestFactory().post('/products/cart/remove/product/4/')
+        request.user = User.objects.create_user(username='shopper', password='testpass123')
+        middleware = UserActivityMiddleware(lambda request: None)
+
+        with patch('analytics.middleware.get_activity_sink', return_value=sink):
+            middleware(request)
+        sink.flush()
+        activity = UserActivity.objects.get()
+        self.assertEqual(activity.activity_type, 'REMOVE_FROM_CART')
+        self.assertEqual(activity.metadata, {'product_id': '4'})
+
+    def test_untracked_method(self):
+        self.assertIsNone(self.classifier.classify('/products/product/1/', 'DELETE'))
+
+    def test_untracked_request_skips_user_lookup(self):
+        """Test that untracked paths never load request.user."""
+        request = RequestFactory().get('/exercise-plans/')
+        middleware = UserActivityMiddleware(lambda request: None)
+        middleware(request)
+        self.assertFalse(hasattr(request, 'user'))
+
+
+class DailyStatsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.products = [self._create_product(i) for i in range(3)]
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=Decimal('19.99')
+        )
+        self.day = timezone.localdate() - timedelta(days=2)
+        self.noon = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=12)
+        product_type = ContentType.objects.get_for_model(Product)
+
+        for activity_type in ['VIEW_PRODUCT', 'VIEW_PRODUCT', 'ADD_TO_CART']:
+            UserActivity.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                content_type=product_type,
+                object_id=self.products[0].id,
+                timestamp=self.noon
+            )
+        order = Order.objects.create(
+            user=self.user,
+            product=self.products[0],
+            amount=Decimal('10.00'),
+            status='COMPLETED'
+        )
+        Order.objects.filter(id=order.id).update(created_at=self.noon)
+        subscription = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            start_date=self.noon,
+            end_date=self.noon + timedelta(days=30)
+        )
+        UserSubscription.objects.filter(id=subscription.id).update(created_at=self.noon)
+
+    def _create_product(self, index):
+        return Product.objects.create(
+            name=f'Product {index}',
+            slug=f'product-{index}',
+            description='Test Description',
+            price=10,
+            sku=f'SKU-{index}'
+        )
+
+
+
+class GenerateDailyStatsTests(DailyStatsTestCase):
+    def _run(self, *args):
+        call_command('generate_daily_stats', *args, stdout=StringIO())
+
+    def test_generates_grouped_metrics(self):
+        """Test per-product, per-plan and site metrics for a single day."""
+        self._run('--date', self.day.isoformat())
+
+        analytics = ProductAnalytics.objects.get(product=self.products[0], date=self.day)
+        self.assertEqual(analytics.views, 2)
+        self.assertEqual(analytics.add_to_cart, 1)
+        self.assertEqual(analytics.purchases, 1)
+        self.assertEqual(analytics.revenue, Decimal('10.00'))
+        self.assertEqual(ProductAnalytics.objects.filter(date=self.day).count(), 3)
+
+        plan_stats = SubscriptionAnalytics.objects.get(plan=self.plan, date=self.day)
+        self.assertEqual(plan_stats.active_subscriptions, 1)
+        self.assertEqual(plan_stats.new_subscriptions, 1)
+        self.assertEqual(plan_stats.revenue, Decimal('19.99'))
+
+        site_stats = SiteStatistics.objects.get(date=self.day)
+        self.assertEqual(site_stats.active_users, 1)
+        self.assertEqual(site_stats.total_orders, 1)
+        self.assertEqual(site_stats.new_subscriptions, 1)
+
+    def test_rerun_updates_existing_rows(self):
+        """Test that regenerating a day upserts instead of duplicating."""
+        self._run('--date', self.day.isoformat())
+        UserActivity.objects.filter(activity_type='ADD_TO_CART').delete()
+        self._run('--date', self.day.isoformat())
+
+        analytics = ProductAnalytics.objects.get(product=self.products[0], date=self.day)
+        self.assertEqual(analytics.add_to_cart, 0)
+        self.assertEqual(SiteStatistics.objects.filter(date=self.day).count(), 1)
+
+    def test_backfill_range(self):
+        """Test that --start/--end covers every day in the range."""
+        start = self.day - timedelta(days=3)
+        self._run('--start', start.isoformat(), '--end', self.day.isoformat())
+
+        # The rollup the command catches up first also writes today's row
+        # (the setUp user joined today), which is outside the range
+        self.assertEqual(SiteStatistics.objects.filter(date__range=[start, self.day]).count(), 4)
+        self.assertEqual(ProductAnalytics.objects.count(), 12)
+        self.assertEqual(
+            ProductAnalytics.objects.get(product=self.products[0], date=self.day).views, 2
+        )
+
+    def test_query_count_independent_of_catalogue_size(self):
+        """Test that more products don't mean more queries."""
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self._run('--date', self.day.isoformat())
+            return len(queries)
+
+        # The first run also catches the rollup up on the setUp rows
+        count_queries()
+        baseline = count_queries()
+        for i in range(3, 13):
+            self._create_product(i)
+        self.assertEqual(count_queries(), baseline)
+
+
+class IncrementalRollupTests(DailyStatsTestCase):
+    def _rollup(self, batch_size=5000):
+        return IncrementalRollup(batch_size=batch_size).run()
+
+    def test_matches_full_recompute(self):
+        """Test that incremental rollups agree with generate_daily_stats."""
+        self._rollup(batch_size=2)
+
+        analytics = ProductAnalytics.objects.get(product=self.products[0], date=self.day)
+        site_stats = SiteStatistics.objects.get(date=self.day)
+        plan_stats = SubscriptionAnalytics.objects.get(plan=self.plan, date=self.day)
+        incremental = (
+            analytics.views, analytics.add_to_cart, analytics.purchases, analytics.revenue,
+            site_stats.active_users, site_stats.total_orders, site_stats.total_revenue,
+            site_stats.new_subscriptions, plan_stats.new_subscriptions, plan_stats.revenue,
+        )
+
+        call_command('generate_daily_stats', '--date', self.day.isoformat(), stdout=StringIO())
+        analytics.refresh_from_db()
+        site_stats.refresh_from_db()
+        plan_stats.refresh_from_db()
+        self.assertEqual(incremental, (
+            analytics.views, analytics.add_to_cart, analytics.purchases, analytics.revenue,
+            site_stats.active_users, site_stats.total_orders, site_stats.total_revenue,
+            site_stats.new_subscriptions, plan_stats.new_subscriptions, plan_stats.revenue,
+        ))
+
+    def test_only_new_rows_are_added(self):
+        """Test that a second run only folds in rows past the checkpoint."""
+        self._rollup()
+        self.assertEqual(self._rollup()['activity'], 0)
+
+        UserActivity.objects.create(
+            user=self.user,
+            activity_type='VIEW_PRODUCT',
+            content_type=ContentType.objects.get_for_model(Product),
+            object_id=self.products[0].id,
+            timestamp=self.noon
+        )
+        self.assertEqual(self._rollup()['activity'], 1)
+
+        analytics = ProductAnalytics.objects.get(product=self.products[0], date=self.day)
+        self.assertEqual(analytics.views, 3)
+        # The user was already counted as active that day
+        self.assertEqual(SiteStatistics.objects.get(date=self.day).active_users, 1)
+        self.assertEqual(
+            RollupCheckpoint.objects.get(source='activity').last_id,
+            UserActivity.objects.latest('id').id
+        )
+
+    def test_pending_order_counted_once_completed(self):
+        """Test that orders completed after being consumed still add revenue."""
+        order = Order.objects.create(
+            user=self.user,
+            product=self.products[1],
+            amount=Decimal('5.00'),
+            status='PENDING'
+        )
+        self._rollup()
+        today = timezone.localdate(order.created_at)
+        # Only completed orders add product rows
+        self.assertFalse(ProductAnalytics.objects.filter(product=self.products[1], date=today).exists())
+        self.assertEqual(RollupCheckpoint.objects.get(source='orders').state['pending_ids'], [order.id])
+
+        Order.objects.filter(id=order.id).update(status='COMPLETED')
+        # Rewriting the day leaves the watched order's revenue to the rollup
+        DailyStatsGenerator().generate(today)
+        self.assertEqual(ProductAnalytics.objects.get(product=self.products[1], date=today).purchases, 0)
+        self._rollup()
+        analytics = ProductAnalytics.objects.get(product=self.products[1], date=today)
+        self.assertEqual(analytics.purchases, 1)
+        self.assertEqual(analytics.revenue, Decimal('5.00'))
+        self.assertEqual(RollupCheckpoint.objects.get(source='orders').state['pending_ids'], [])
+
+    def test_interleaved_with_generate_daily_stats(self):
+        """Test that running both jobs in any order never counts a row twice."""
+        today = timezone.localdate()
+        self._rollup()
+        # generate_daily_stats counts the new user before the rollup consumes it
+        User.objects.create_user(username='second', password='testpass123')
+        call_command('generate_daily_stats', stdout=StringIO())
+        self._rollup()
+
+        site_stats = SiteStatistics.objects.get(date=today)
+        self.assertEqual(site_stats.new_users, User.objects.count())
+        self.assertEqual(site_stats.total_users, 2)
+        self.assertEqual(SiteStatistics.objects.get(date=self.day).total_orders, 1)
+        self.assertEqual(ProductAnalytics.objects.get(product=self.products[0], date=self.day).views, 2)
+
+    def _skip_order_id(self):
+        """Consume an order past an id whose row isn't visible yet, as if its transaction were open."""
+        self._rollup()
+        skipped = Order.objects.create(user=self.user, product=self.products[2], amount=Decimal('7.00'))
+        skipped_id = skipped.id
+        skipped.delete()
+        Order.objects.create(user=self.user, product=self.products[1], amount=Decimal('5.00'), status='COMPLETED')
+        self._rollup()
+        self.assertEqual(list(RollupCheckpoint.objects.get(source='orders').state['gaps']), [str(skipped_id)])
+        return skipped_id
+
+    def _commit_late_order(self, order_id):
+        Order.objects.create(
+            id=order_id, user=self.user, product=self.products[2], amount=Decimal('7.00'), status='COMPLETED'
+        )
+
+    def test_late_commit_below_checkpoint_is_counted(self):
+        """Test that a row committed after a higher id was consumed still counts, once."""
+        order_id = self._skip_order_id()
+        self._commit_late_order(order_id)
+        # A rewrite of the day leaves the skipped id to the rollup
+        DailyStatsGenerator().generate(timezone.localdate())
+        self.assertEqual(ProductAnalytics.objects.get(product=self.products[2], date=timezone.localdate()).purchases, 0)
+        self.assertEqual(self._rollup()['late'], 1)
+        call_command('generate_daily_stats', stdout=StringIO())
+
+        analytics = ProductAnalytics.objects.get(product=self.products[2], date=timezone.localdate())
+        self.assertEqual(analytics.purchases, 1)
+        self.assertEqual(analytics.revenue, Decimal('7.00'))
+        self.assertEqual(SiteStatistics.objects.get(date=timezone.localdate()).total_orders, 2)
+        self.assertEqual(RollupCheckpoint.objects.get(source='orders').state['gaps'], {})
+
+    def test_skipped_ids_expire(self):
+        """Test that ids still empty after the grace period stop being looked up."""
+        order_id = self._skip_order_id()
+        with patch('analytics.rollups.timezone.now', return_value=timezone.now() + timedelta(minutes=11)):
+            self._rollup()
+        self.assertEqual(RollupCheckpoint.objects.get(source='orders').state['gaps'], {})
+
+        # A later commit is then counted by the next full recompute of its day
+        self._commit_late_order(order_id)
+        self._rollup()
+        call_command('generate_daily_stats', stdout=StringIO())
+        self.assertEqual(
+            ProductAnalytics.objects.get(product=self.products[2], date=timezone.localdate()).purchases, 1
+        )
+
+    def test_caught_up_run_does_not_rescan_the_day(self):
+        """Test that a run with no new rows reads no raw rows and writes no daily rows."""
+        self._rollup()
+        with CaptureQueriesContext(connection) as queries:
+            self._rollup()
+        sql = [query['sql'] for query in queries]
+        self.assertFalse([q for q in sql if 'analytics_useractivity' in q and 'timestamp' in q])
+        self.assertFalse([q for q in sql if 'analytics_productanalytics' in q])
+
+    def test_command(self):
+        """Test the management command runs the rollup."""
+        out = StringIO()
+        call_command('update_analytics_rollups', '--batch-size', '10', stdout=out)
+        self.assertIn('activity=3', out.getvalue())
+        self.assertEqual(SiteStatistics.objects.get(date=timezone.localdate()).total_users, 1)
+
+
+class ArchiveUserActivityTests(DailyStatsTestCase):
+    def setUp(self):
+        """Set up test data."""
+        super().setUp()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        settings_override = override_settings(ANALYTICS_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Recent activity that must stay in the database
+        UserActivity.objects.create(user=self.user, activity_type='LOGIN')
+
+    def _archive(self, *args):
+        call_command('archive_user_activity', '--days', '1', *args, stdout=StringIO())
+
+    def test_archives_and_deletes_old_rows_in_batches(self):
+        """Test that old rows move to the month's part files and recent rows stay."""
+        self._archive('--batch-size', '2')
+
+        self.assertEqual(list(UserActivity.objects.values_list('activity_type', flat=True)), ['LOGIN'])
+        self.assertTrue(archive_path(self.day, self.archive_dir).exists())
+        records = list(iter_archived_activity(self.day, self.day, self.archive_dir))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['content_type'], 'inventory.product')
+        self.assertEqual(records[0]['timestamp'], self.noon)
+
+    def test_dry_run_keeps_rows(self):
+        """Test that --dry-run doesn't touch the table."""
+        self._archive('--dry-run')
+        self.assertEqual(UserActivity.objects.count(), 4)
+        self.assertFalse(archive_path(self.day, self.archive_dir).exists())
+
+    def test_crash_mid_write_leaves_readable_archive(self):
+        """Test that a batch interrupted while being written is neither read nor lost."""
+        replace = os.replace
+        renamed = []
+
+        def crash_on_second_part(src, dst):
+            renamed.append(dst)
+            if len(renamed) == 2:
+                raise OSError('No space left on device')
+            replace(src, dst)
+
+        with patch('analytics.archive.os.replace', side_effect=crash_on_second_part):
+            with self.assertRaises(OSError):
+                self._archive('--batch-size', '2')
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+        # A process killed mid-write leaves a truncated gzip member behind
+        month_dir = archive_path(self.day, self.archive_dir)
+        part = next(month_dir.glob('part-*.jsonl.gz'))
+        (month_dir / '.part-crashed.tmp').write_bytes(part.read_bytes()[:20])
+        self.assertEqual(len(list(iter_archived_activity(self.day, self.day, self.archive_dir))), 2)
+
+        self._archive('--batch-size', '2')
+        records = list(iter_archived_activity(self.day, self.day, self.archive_dir))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(len({record['id'] for record in records}), 3)
+
+    def test_requires_archive_dir(self):
+        """Test that archiving refuses to run without a configured directory."""
+        with override_settings(ANALYTICS_ARCHIVE_DIR=None):
+            with self.assertRaises(CommandError):
+                self._archive()
+        self.assertEqual(UserActivity.objects.count(), 4)
+
+    def test_backfill_reads_archived_months(self):
+        """Test that generate_daily_stats still counts archived activity."""
+        self._archive()
+        call_command('generate_daily_stats', '--date', self.day.isoformat(), stdout=StringIO())
+
+        analytics = ProductAnalytics.objects.get(product=self.products[0], date=self.day)
+        self.assertEqual(analytics.views, 2)
+        self.assertEqual(analytics.add_to_cart, 1)
+        self.assertEqual(SiteStatistics.objects.get(date=self.day).active_users, 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ActivityLogViewTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_login(self.staff)
+        # Pairs of activities share a timestamp so the id tie-breaker matters
+        base = timezone.now() - timedelta(hours=1)
+        UserActivity.objects.bulk_create([
+            UserActivity(
+                user=self.staff,
+                activity_type='LOGIN' if i % 3 else 'CHECKOUT',
+                timestamp=base + timedelta(minutes=i // 2)
+            )
+            for i in range(7)
+        ])
+        self.newest_first = list(
+            UserActivity.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+
+    def _page_ids(self, response):
+        return [activity.id for activity in response.context['activities']]
+
+    @patch.object(views, 'ACTIVITY_LOG_PAGE_SIZE', 3)
+    def test_keyset_pages_cover_every_row_once(self):
+        """Test walking forward and back through cursor pages."""
+        base_url = reverse('analytics:activity_logs')
+        query = ''
+        seen = []
+        pages = []
+        while query is not None:
+            response = self.client.get(base_url + query)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response)
+            seen.extend(self._page_ids(response))
+            query = response.context['next_url']
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0].context['previous_url'])
+
+        # Going back from the last page returns the previous page
+        previous = self.client.get(base_url + pages[-1].context['previous_url'])
+        self.assertEqual(self._page_ids(previous), self._page_ids(pages[-2]))
+
+    def test_filters_and_bad_cursor(self):
+        """Test type filtering and that a malformed cursor starts from the top."""
+        response = self.client.get(reverse('analytics:activity_logs'), {'type': 'CHECKOUT', 'after': 'nonsense'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self._page_ids(response),
+            list(UserActivity.objects.filter(activity_type='CHECKOUT')
+                 .order_by('-timestamp', '-id').values_list('id', flat=True))
+        )
+
+    def test_streaming_csv_export(self):
+        """Test the CSV export streams a header and every filtered row."""
+        response = self.client.get(reverse('analytics:export_activity_logs'), {'type': 'LOGIN'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'timestamp', 'user_id'])
+        self.assertEqual(len(lines) - 1, UserActivity.objects.filter(activity_type='LOGIN').count())
+
+    def test_streaming_jsonl_export(self):
+        """Test the JSONL export writes one object per activity."""
+        response = self.client.get(reverse('analytics:export_activity_logs'), {'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([record['id'] for record in records], self.newest_first)
+        self.assertEqual(records[0]['user__username'], 'staff')
+
+    def test_export_rejects_unknown_format(self):
+        response = self.client.get(reverse('analytics:export_activity_logs'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_staff(self):
+        self.staff.is_staff = False
+        self.staff.save()
+        response = self.client.get(reverse('analytics:export_activity_logs'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AnalyticsDataCacheTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.client.force_login(self.staff)
+        self.day = timezone.localdate() - timedelta(days=1)
+        SiteStatistics.objects.create(date=self.day, active_users=4, total_orders=2, total_revenue=Decimal('12.50'))
+        self.url = reverse('analytics:analytics_data')
+        self.params = {'start_date': self.day.isoformat(), 'end_date': self.day.isoformat()}
+
+    def test_serves_series_with_etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response.json(), {
+            'dates': [self.day.strftime('%Y-%m-%d')],
+            'active_users': [4],
+            'total_orders': [2],
+            'total_revenue': [12.5],
+        })
+
+    def test_cached_and_not_modified(self):
+        """Test repeat requests skip the stats query and honour If-None-Match."""
+        etag = self.client.get(self.url, self.params)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if 'analytics_sitestatistics' in q['sql']])
+
+    def test_stats_generation_invalidates_cache(self):
+        """Test that regenerating stats changes the served series."""
+        etag = self.client.get(self.url, self.params)['ETag']
+        call_command('generate_daily_stats', '--date', self.day.isoformat(), stdout=StringIO())
+
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['active_users'], [0])
+
+    def test_invalid_dates(self):
+        response = self.client.get(self.url, {'start_date': 'yesterday', 'end_date': 'today'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DashboardWindowTests(DailyStatsTestCase):
+    def setUp(self):
+        """Set up test data."""
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        # Inside the 30 and 90 day windows but not the 7 day one
+        old_day = timezone.localdate() - timedelta(days=20)
+        ProductAnalytics.objects.create(product=self.products[1], date=old_day, views=5, revenue=Decimal('30.00'))
+        ProductAnalytics.objects.create(product=self.products[0], date=self.day, views=2, revenue=Decimal('10.00'))
+        SubscriptionAnalytics.objects.create(plan=self.plan, date=self.day, new_subscriptions=1, revenue=Decimal('19.99'))
+
+    def test_refresh_builds_every_window(self):
+        refresh_dashboard_windows()
+
+        week = ProductAnalyticsWindow.objects.filter(window_days=7)
+        self.assertEqual(list(week.values_list('product_name', flat=True)), ['Product 0'])
+        month = ProductAnalyticsWindow.objects.get(window_days=30, product=self.products[1])
+        self.assertEqual((month.views, month.revenue), (5, Decimal('30.00')))
+        self.assertEqual(SubscriptionAnalyticsWindow.objects.get(window_days=90).new_subscriptions, 1)
+
+        # A second refresh replaces rows rather than adding to them
+        refresh_dashboard_windows()
+        self.assertEqual(ProductAnalyticsWindow.objects.filter(window_days=30).count(), 2)
+
+    def test_dashboard_reads_windows(self):
+        """Test the dashboard serves top products from the window table."""
+        refresh_dashboard_windows()
+        ProductAnalyticsWindow.objects.filter(product=self.products[1]).update(product_name='Renamed')
+
+        response = self.client.get(reverse('analytics:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        names = [row['product__name'] for row in response.context['top_products']]
+        self.assertEqual(names, ['Renamed', 'Product 0'])
+
+        response = self.client.get(reverse('analytics:dashboard'), {'window': '7'})
+        self.assertEqual([row['product__name'] for row in response.context['top_products']], ['Product 0'])
+
+    def test_dashboard_falls_back_before_first_refresh(self):
+        response = self.client.get(reverse('analytics:dashboard'))
+        names = [row['product__name'] for row in response.context['top_products']]
+        self.assertEqual(names, ['Product 1', 'Product 0'])
+        self.assertEqual(response.context['subscription_stats'][0]['new_subs'], 1)
+
+    def test_stats_job_refreshes_windows(self):
+        call_command('generate_daily_stats', '--date', self.day.isoformat(), stdout=StringIO())
+        self.assertTrue(ProductAnalyticsWindow.objects.filter(window_days=7).exists())
@@ -6,5 +6,6 @@ app_name = 'analytics'
 urlpatterns = [
     path('dashboard/', views.analytics_dashboard, name='dashboard'),
     path('activity-logs/', views.activity_logs, name='activity_logs'),
+    path('activity-logs/export/', views.export_activity_logs, name='export_activity_logs'),
     path('api/analytics-data/', views.get_analytics_data, name='analytics_data'),
 ] 
\ No newline at end of file
@@ -1,9 +1,33 @@
+import csv
+import json
+from datetime import date
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-from django.db.models import Sum, Count
-from django.http import JsonResponse
-from .models import UserActivity, SiteStatistics, ProductAnalytics, SubscriptionAnalytics
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, urlsafe_base64_decode, urlsafe_base64_encode
+from django.db.models import F, Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from .charts import get_site_statistics_series
+from .models import (
+    DASHBOARD_WINDOWS, UserActivity, SiteStatistics, ProductAnalyticsWindow, SubscriptionAnalyticsWindow
+)
+from .windows import WINDOW_DAYS, plan_window_totals, product_window_totals, window_bounds
+
+ACTIVITY_LOG_PAGE_SIZE = 50
+
+# Rows fetched per database round trip while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = [
+    'id', 'timestamp', 'user_id', 'user__username', 'activity_type',
+    'ip_address', 'user_agent', 'content_type_id', 'object_id', 'metadata',
+]
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
 
 def is_staff_user(user):
     return user.is_staff
@@ -12,33 +36,37 @@ def is_staff_user(user):
 @user_passes_test(is_staff_user)
 def analytics_dashboard(request):
     """Main analytics dashboard view."""
-    # Get date range (default to last 30 days)
-    end_date = timezone.now().date()
-    start_date = end_date - timezone.timedelta(days=30)
-    
+    # Rolling window, 30 days unless 7 or 90 was picked
+    window_days = request.GET.get('window', '30')
+    window_days = int(window_days) if window_days.isdigit() and int(window_days) in WINDOW_DAYS else 30
+    start_date, end_date = window_bounds(window_days)
+
     # Get site statistics
     site_stats = SiteStatistics.objects.filter(
         date__range=[start_date, end_date]
     ).order_by('date')
-    
-    # Get top products
-    top_products = ProductAnalytics.objects.filter(
-        date__range=[start_date, end_date]
-    ).values('product__name').annotate(
-        total_views=Sum('views'),
-        total_purchases=Sum('purchases'),
-        total_revenue=Sum('revenue')
-    ).order_by('-total_revenue')[:5]
-    
-    # Get subscription metrics
-    subscription_stats = SubscriptionAnalytics.objects.filter(
-        date__range=[start_date, end_date]
-    ).values('plan__name').annotate(
-        active_subs=Sum('active_subscriptions'),
-        new_subs=Sum('new_subscriptions'),
-        total_revenue=Sum('revenue')
-    ).order_by('-total_revenue')
-    
+
+    # Top products and subscription metrics come from the precomputed windows
+    top_products = ProductAnalyticsWindow.objects.filter(window_days=window_days).annotate(
+        product__name=F('product_name'),
+        total_views=F('views'),
+        total_purchases=F('purchases'),
+        total_revenue=F('revenue')
+    ).values('product__name', 'total_views', 'total_purchases', 'total_revenue').order_by('-revenue')[:5]
+
+    subscription_stats = SubscriptionAnalyticsWindow.objects.filter(window_days=window_days).annotate(
+        plan__name=F('plan_name'),
+        active_subs=F('active_subscriptions'),
+        new_subs=F('new_subscriptions'),
+        total_revenue=F('revenue')
+    ).values('plan__name', 'active_subs', 'new_subs', 'total_revenue').order_by('-revenue')
+
+    # Until the stats job has filled the windows, aggregate the daily rows directly
+    if not top_products:
+        top_products = product_window_totals(start_date, end_date)[:5]
+    if not subscription_stats:
+        subscription_stats = plan_window_totals(start_date, end_date)
+
     # Get recent user activities
     recent_activities = UserActivity.objects.select_related('user').order_by('-timestamp')[:10]
     
@@ -50,34 +78,140 @@ def analytics_dashboard(request):
         'date_range': {
             'start': start_date,
             'end': end_date
-        }
+        },
+        'window_days': window_days,
+        'windows': DASHBOARD_WINDOWS,
     }
     
     return render(request, 'analytics/dashboard.html', context)
 
-@login_required
-@user_passes_test(is_staff_user)
-def activity_logs(request):
-    """View for detailed user activity logs."""
-    activities = UserActivity.objects.select_related('user').order_by('-timestamp')
-    
+def _filtered_activities(request):
+    """Activities matching the type/user filters, newest first with id as tie-breaker."""
+    activities = UserActivity.objects.order_by('-timestamp', '-id')
+
     # Filter by activity type if provided
     activity_type = request.GET.get('type')
     if activity_type:
         activities = activities.filter(activity_type=activity_type)
-    
+
     # Filter by user if provided
     user_id = request.GET.get('user')
-    if user_id:
+    if user_id and user_id.isdigit():
         activities = activities.filter(user_id=user_id)
-    
+
+    return activities
+
+
+def _encode_cursor(activity):
+    value = f"{activity.timestamp.isoformat()}|{activity.id}"
+    return urlsafe_base64_encode(value.encode())
+
+
+def _decode_cursor(value):
+    """Return (timestamp, id) from a page cursor, or None if it's malformed."""
+    try:
+        timestamp, activity_id = urlsafe_base64_decode(value).decode().split('|')
+        timestamp = parse_datetime(timestamp)
+        activity_id = int(activity_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if timestamp is None:
+        return None
+    return timestamp, activity_id
+
+
+def _page_url(request, **cursor):
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params.update(cursor)
+    return f"?{params.urlencode()}"
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def activity_logs(request):
+    """
+    View for detailed user activity logs.
+
+    Pages are keyed on (timestamp, id) rather than offsets, so every page
+    costs the same index range scan however deep staff browse.
+    """
+    activities = _filtered_activities(request).select_related('user')
+
+    after = _decode_cursor(request.GET.get('after', ''))
+    before = _decode_cursor(request.GET.get('before', ''))
+    if before:
+        # Walk backwards from the cursor, then restore newest-first order
+        timestamp, activity_id = before
+        page = list(activities.filter(
+            Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=activity_id)
+        ).order_by('timestamp', 'id')[:ACTIVITY_LOG_PAGE_SIZE + 1])
+        has_previous = len(page) > ACTIVITY_LOG_PAGE_SIZE
+        page = page[:ACTIVITY_LOG_PAGE_SIZE][::-1]
+        has_next = True
+    else:
+        if after:
+            timestamp, activity_id = after
+            activities = activities.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=activity_id)
+            )
+        page = list(activities[:ACTIVITY_LOG_PAGE_SIZE + 1])
+        has_next = len(page) > ACTIVITY_LOG_PAGE_SIZE
+        page = page[:ACTIVITY_LOG_PAGE_SIZE]
+        has_previous = after is not None
+
     context = {
-        'activities': activities,
-        'activity_types': UserActivity.ACTIVITY_TYPES
+        'activities': page,
+        'activity_types': UserActivity.ACTIVITY_TYPES,
+        'next_url': _page_url(request, after=_encode_cursor(page[-1])) if page and has_next else None,
+        'previous_url': _page_url(request, before=_encode_cursor(page[0])) if page and has_previous else None,
+        'export_query': _page_url(request)[1:],
     }
-    
+
     return render(request, 'analytics/activity_logs.html', context)
 
+
+class Echo:
+    """File-like object whose write() hands back the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_activities(activities, export_format):
+    rows = activities.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if export_format == 'jsonl':
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['timestamp'] = record['timestamp'].isoformat()
+            yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+        return
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            [json.dumps(value) if isinstance(value, dict) else value for value in row]
+        )
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def export_activity_logs(request):
+    """Stream the filtered activity log as CSV or JSONL in constant memory."""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return JsonResponse({'error': 'Format must be csv or jsonl'}, status=400)
+
+    response = StreamingHttpResponse(
+        _stream_activities(_filtered_activities(request), export_format),
+        content_type=EXPORT_CONTENT_TYPES[export_format]
+    )
+    filename = f"activity-logs-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 @user_passes_test(is_staff_user)
 def get_analytics_data(request):
@@ -89,16 +223,19 @@ def get_analytics_data(request):
     if not start_date or not end_date:
         return JsonResponse({'error': 'Date range required'}, status=400)
     
-    # Get site statistics for the date range
-    stats = SiteStatistics.objects.filter(
-        date__range=[start_date, end_date]
-    ).order_by('date')
-    
-    data = {
-        'dates': [stat.date.strftime('%Y-%m-%d') for stat in stats],
-        'active_users': [stat.active_users for stat in stats],
-        'total_orders': [stat.total_orders for stat in stats],
-        'total_revenue': [float(stat.total_revenue) for stat in stats]
-    }
-    
-    return JsonResponse(data)
+    try:
+        start_date = date.fromisoformat(start_date)
+        end_date = date.fromisoformat(end_date)
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+    # Served from cache as pre-serialized JSON; unchanged data answers 304
+    etag, body = get_site_statistics_series(start_date, end_date)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Let the browser keep the body but revalidate on every poll
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
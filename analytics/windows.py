@@ -0,0 +1,86 @@
+"""
+Rolling 7/30/90-day totals per product and per plan for the dashboard.
+
+The stats jobs rebuild the window tables after writing daily rows, so the
+dashboard reads a handful of precomputed rows instead of summing every
+ProductAnalytics and SubscriptionAnalytics row in the range.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import (
+    DASHBOARD_WINDOWS, ProductAnalytics, ProductAnalyticsWindow,
+    SubscriptionAnalytics, SubscriptionAnalyticsWindow
+)
+
+WINDOW_DAYS = [days for days, _ in DASHBOARD_WINDOWS]
+
+
+def window_bounds(window_days, end_date=None):
+    """First and last date of a window ending on end_date (today by default)."""
+    end_date = end_date or timezone.localdate()
+    return end_date - timedelta(days=window_days - 1), end_date
+
+
+def product_window_totals(start_date, end_date):
+    return ProductAnalytics.objects.filter(
+        date__range=[start_date, end_date]
+    ).values('product', 'product__name').annotate(
+        total_views=Sum('views'),
+        total_add_to_cart=Sum('add_to_cart'),
+        total_purchases=Sum('purchases'),
+        total_revenue=Sum('revenue')
+    ).order_by('-total_revenue')
+
+
+def plan_window_totals(start_date, end_date):
+    return SubscriptionAnalytics.objects.filter(
+        date__range=[start_date, end_date]
+    ).values('plan', 'plan__name').annotate(
+        active_subs=Sum('active_subscriptions'),
+        new_subs=Sum('new_subscriptions'),
+        total_cancellations=Sum('cancellations'),
+        total_revenue=Sum('revenue')
+    ).order_by('-total_revenue')
+
+
+def refresh_dashboard_windows(end_date=None):
+    """Recompute every window. Each window is swapped in one transaction."""
+    for window_days in WINDOW_DAYS:
+        start_date, window_end = window_bounds(window_days, end_date)
+
+        products = [
+            ProductAnalyticsWindow(
+                window_days=window_days,
+                product_id=row['product'],
+                product_name=row['product__name'],
+                start_date=start_date,
+                end_date=window_end,
+                views=row['total_views'] or 0,
+                add_to_cart=row['total_add_to_cart'] or 0,
+                purchases=row['total_purchases'] or 0,
+                revenue=row['total_revenue'] or 0,
+            )
+            for row in product_window_totals(start_date, window_end)
+        ]
+        plans = [
+            SubscriptionAnalyticsWindow(
+                window_days=window_days,
+                plan_id=row['plan'],
+                plan_name=row['plan__name'],
+                start_date=start_date,
+                end_date=window_end,
+                active_subscriptions=row['active_subs'] or 0,
+                new_subscriptions=row['new_subs'] or 0,
+                cancellations=row['total_cancellations'] or 0,
+                revenue=row['total_revenue'] or 0,
+            )
+            for row in plan_window_totals(start_date, window_end)
+        ]
+
+        with transaction.atomic():
+            ProductAnalyticsWindow.objects.filter(window_days=window_days).delete()
+            ProductAnalyticsWindow.objects.bulk_create(products)
+            SubscriptionAnalyticsWindow.objects.filter(window_days=window_days).delete()
+            SubscriptionAnalyticsWindow.objects.bulk_create(plans)
@@ -5,9 +5,10 @@ from django.shortcuts import redirect, render
 from django.views import View
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.mail import send_mail
+from notifications.outbox import enqueue_email
 from django.template.loader import render_to_string
 from inventory.models import Product
+from payments.gateway import get_gateway
 from .models import Order
 
 logger = logging.getLogger(__name__)
@@ -39,15 +40,14 @@ def send_order_confirmation_email(order):
         recipient_email = order.user.email if order.user else order.email
         
         if recipient_email:
-            send_mail(
+            enqueue_email(
                 subject=subject,
                 message=plain_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[recipient_email],
-                html_message=html_message,
-                fail_silently=False,
+                html_message=html_message
             )
-            logger.info(f"Order confirmation email sent to {recipient_email} for order {order.id}")
+            logger.info(f"Order confirmation email queued for {recipient_email} for order {order.id}")
         else:
             logger.warning(f"No email address found for order {order.id}")
             
@@ -56,8 +56,6 @@ def send_order_confirmation_email(order):
 
 class CreateCheckoutSessionView(View):
     def post(self, request, *args, **kwargs):
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-
         try:
             product_id = self.kwargs["pk"]
             product = Product.objects.get(id=product_id)
@@ -76,7 +74,7 @@ class CreateCheckoutSessionView(View):
             )
             logger.info(f"Created pending order {order.id} for user {user.username if user else 'anonymous'}")
 
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = get_gateway().create_checkout_session(
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -0,0 +1,108 @@
+"""
+Database-backed work queues shared by the background workers.
+
+LeasedQueue is the claiming side of a table of jobs (webhook events, outbound
+emails). A due row is claimed with a conditional UPDATE that moves it to the
+claimed status and stamps locked_at, so only one worker gets it; a row left
+claimed longer than the lease belongs to a worker that died and can be
+claimed again. Failures go back to PENDING with exponential backoff until
+the attempts run out. The model needs status, attempts, last_error,
+next_attempt_at and locked_at fields.
+
+QueueWorkerCommand is the management command side: it drains a queue once,
+or keeps polling it with --loop (see the Procfile).
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+class LeasedQueue:
+    """Claims due rows of a model for one worker at a time."""
+
+    def __init__(self, model, claimed_status, lease_timeout, retry_base_delay,
+                 max_retry_delay, max_attempts_setting, default_max_attempts=5):
+        self.model = model
+        self.claimed_status = claimed_status
+        self.lease_timeout = lease_timeout
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts_setting = max_attempts_setting
+        self.default_max_attempts = default_max_attempts
+
+    def get_max_attempts(self):
+        return getattr(settings, self.max_attempts_setting, self.default_max_attempts)
+
+    def retry_delay(self, attempts):
+        return min(self.retry_base_delay * 2 ** (attempts - 1), self.max_retry_delay)
+
+    def _claimable(self, now):
+        return Q(status='PENDING', next_attempt_at__lte=now) | Q(
+            status=self.claimed_status, locked_at__lt=now - self.lease_timeout
+        )
+
+    def claim(self, limit):
+        """Claim up to limit due rows for this worker and return them."""
+        now = timezone.now()
+        claimed = []
+        candidates = self.model.objects.filter(self._claimable(now)).order_by(
+            'next_attempt_at', 'id'
+        ).values_list('id', flat=True)[:limit]
+        for row_id in candidates:
+            if self.model.objects.filter(self._claimable(now), pk=row_id).update(
+                status=self.claimed_status, locked_at=now, attempts=F('attempts') + 1
+            ):
+                claimed.append(row_id)
+        return list(self.model.objects.filter(pk__in=claimed).order_by('next_attempt_at', 'id'))
+
+    def owned(self, row):
+        """The row as a queryset, empty once another worker has reclaimed it."""
+        return self.model.objects.filter(
+            pk=row.pk, status=self.claimed_status, locked_at=row.locked_at
+        )
+
+    def fail(self, row, error):
+        """Schedule a retry of a claimed row, or give up on it. Returns its new status."""
+        status = 'FAILED' if row.attempts >= self.get_max_attempts() else 'PENDING'
+        self.owned(row).update(
+            status=status,
+            last_error=str(error),
+            next_attempt_at=timezone.now() + self.retry_delay(row.attempts),
+        )
+        return status
+
+
+class QueueWorkerCommand(BaseCommand):
+    """
+    Runs run() until the queue is drained, then exits or, with --loop, sleeps
+    and polls again. run() returns counts per outcome, which are printed
+    after any pass that did some work.
+    """
+    label = 'Queue'
+    default_batch_size = 100
+    default_interval = 5.0
+    batch_size_help = 'Rows claimed per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=self.default_batch_size,
+                            help=self.batch_size_help)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new work instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=self.default_interval,
+                            help='Seconds to sleep between polls with --loop')
+
+    def run(self, batch_size):
+        raise NotImplementedError('subclasses of QueueWorkerCommand must provide a run() method')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = self.run(options['batch_size'])
+            if any(counts.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f'{self.label}: ' + ', '.join(f'{status.lower()}={count}' for status, count in counts.items())
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
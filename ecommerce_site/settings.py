@@ -43,6 +43,8 @@ INSTALLED_APPS = [
     'accounts',
     'analytics',
     'newsletter',
+    'payments',
+    'notifications',
     'cloudinary_storage',
     'cloudinary',
 ]
@@ -155,6 +157,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STRIPE_PUBLIC_KEY = 'pk_test_51OH650CsAipY5vRT3ZDnBLphbOfcHgQS3z1zqtALlDBW13yMcUijnjri7VX0xOHqs9ueCl9Zbl7JqjKk9XSVckdp00XKI3VAvZ'
 STRIPE_SECRET_KEY = 'sk_test_51OH650CsAipY5vRT5xuJWaQzd9sXa0ZYWpNTbEUuaQOEGAHQtgE9yXDA3iKqebiyjCvYeCU78jXO3mcsy3sLfJuR00kYP0Acx3'
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+# Dotted path to the payment gateway; payments.fake.FakeStripeGateway runs without Stripe
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'payments.gateway.StripeGateway')
+# Shared Stripe HTTP client: (connect, read) timeout in seconds, retries and keep-alive pool size
+STRIPE_TIMEOUT = (3, 15)
+STRIPE_MAX_NETWORK_RETRIES = 2
+STRIPE_CONNECTION_POOL_SIZE = 10
 
 # Authentication settings
 AUTHENTICATION_BACKENDS = [
@@ -243,6 +251,23 @@ X_FRAME_OPTIONS = 'DENY'
 SECURE_REFERRER_POLICY = 'strict-origin-when-cross-origin'
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# Production runs several processes (web, worker, mailer, invoices) that must
+# see each other's cache invalidations, so set REDIS_URL there. Without it the
+# per-process local memory cache is used, which is only fine for development.
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Rate limiting
 RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
@@ -253,3 +278,33 @@ SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_HTTPONLY = True
+
+# Analytics activity tracking - events are buffered in-process and written in batches
+ANALYTICS_ACTIVITY_SINK = {
+    'MAX_QUEUE_SIZE': int(os.getenv('ANALYTICS_SINK_MAX_QUEUE_SIZE', 10000)),
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 2.0,  # seconds
+    'OVERFLOW': os.getenv('ANALYTICS_SINK_OVERFLOW', 'drop_new'),  # drop_new, drop_oldest or block
+    # Write activity in the request instead of a background thread (tests, or debugging)
+    'SYNCHRONOUS': (
+        'test' in sys.argv or 'pytest' in sys.modules
+        or os.getenv('ANALYTICS_SINK_SYNCHRONOUS', 'False') == 'True'
+    ),
+}
+
+# Activity older than the retention window is moved to gzipped JSONL files, grouped by month.
+# The archive directory must be durable storage (not the dyno filesystem); archiving refuses to run without it.
+ANALYTICS_ACTIVITY_RETENTION_DAYS = int(os.getenv('ANALYTICS_ACTIVITY_RETENTION_DAYS', 90))
+ANALYTICS_ARCHIVE_DIR = os.getenv('ANALYTICS_ARCHIVE_DIR')
+
+# Seconds a serialized dashboard chart series stays cached (stats writes invalidate it sooner)
+ANALYTICS_CHART_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a user's current subscription stays cached (subscription saves invalidate it sooner)
+SUBSCRIPTION_STATUS_CACHE_TIMEOUT = 60
+
+# Attempts the webhook worker makes at a Stripe event before marking it failed
+STRIPE_WEBHOOK_MAX_ATTEMPTS = 5
+
+# Attempts the outbox worker makes at an email before marking it failed
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
@@ -60,6 +60,7 @@ urlpatterns = [
     path('subscriptions/', include('subscriptions.urls')),  # Add subscription URLs
 
     path('newsletter/', include('newsletter.urls')),  # Add newsletter URLs
+    path('analytics/', include('analytics.urls')),
     path('accounts/', include('accounts.urls')),
     path('accounts/logout/', include('django.contrib.auth.urls')),
     
@@ -0,0 +1,139 @@
+"""Helpers for turning the session cart into catalogue objects."""
+from collections import defaultdict
+
+from django.utils.functional import cached_property
+
+from subscriptions.models import SubscriptionPlan
+from .models import Product, ExercisePlan, NutritionPlan
+
+# Maps the item type used in session cart keys ("<item_type>-<item_id>")
+# to the model that backs it. 'plan' is the legacy name for exercise plans.
+CART_ITEM_MODELS = {
+    'product': Product,
+    'exercise_plan': ExercisePlan,
+    'plan': ExercisePlan,
+    'nutrition_plan': NutritionPlan,
+    'subscription_plan': SubscriptionPlan,
+}
+
+
+def parse_cart_key(item_key):
+    """
+    Split a cart key such as 'product-3' into ('product', 3).
+    Returns None if the key is malformed or uses an unknown item type.
+    """
+    item_type, sep, item_id = item_key.partition('-')
+    if not sep or item_type not in CART_ITEM_MODELS:
+        return None
+    try:
+        return item_type, int(item_id)
+    except ValueError:
+        return None
+
+
+def resolve_cart_item(item_type, item_id):
+    """Return the object for a single cart entry, or None if it doesn't exist."""
+    model = CART_ITEM_MODELS.get(item_type)
+    if model is None:
+        return None
+    return model.objects.filter(id=item_id).first()
+
+
+def resolve_cart_items(cart):
+    """
+    Resolve every entry of a session cart, fetching each item type with a
+    single in_bulk() query so the query count doesn't grow with the cart.
+
+    Returns a tuple (cart_items, invalid_keys). cart_items keeps the cart's
+    order and holds dicts with 'key', 'item', 'item_type', 'quantity' and
+    'item_total'; invalid_keys lists keys that are malformed or point at
+    deleted items.
+    """
+    ids_by_model = defaultdict(set)
+    entries = []
+    invalid_keys = []
+
+    for item_key, quantity in cart.items():
+        parsed = parse_cart_key(item_key)
+        if parsed is None:
+            invalid_keys.append(item_key)
+            continue
+        item_type, item_id = parsed
+        ids_by_model[CART_ITEM_MODELS[item_type]].add(item_id)
+        entries.append((item_key, item_type, item_id, quantity))
+
+    objects_by_model = {
+        model: model.objects.in_bulk(ids)
+        for model, ids in ids_by_model.items()
+    }
+
+    cart_items = []
+    for item_key, item_type, item_id, quantity in entries:
+        item = objects_by_model[CART_ITEM_MODELS[item_type]].get(item_id)
+        if item is None:
+            invalid_keys.append(item_key)
+            continue
+        cart_items.append({
+            'key': item_key,
+            'item': item,
+            'item_type': item_type,
+            'quantity': quantity,
+            'item_total': item.price * quantity,
+        })
+
+    return cart_items, invalid_keys
+
+
+class CartSummary:
+    """
+    Per-request view of the session cart. Nothing is read from the session
+    until an attribute is first accessed, and each value is computed once.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    @cached_property
+    def cart(self):
+        return self._request.session.get('cart', {})
+
+    @cached_property
+    def count(self):
+        """Total quantity of all items in the cart."""
+        return sum(self.cart.values())
+
+    @cached_property
+    def _resolved(self):
+        return resolve_cart_items(self.cart)
+
+    @property
+    def items(self):
+        return self._resolved[0]
+
+    @property
+    def invalid_keys(self):
+        return self._resolved[1]
+
+    @cached_property
+    def total(self):
+        return sum(cart_item['item_total'] for cart_item in self.items)
+
+
+def get_cart_summary(request):
+    """Return the memoized CartSummary for this request, creating it if needed."""
+    summary = getattr(request, '_cart_summary', None)
+    if summary is None:
+        summary = CartSummary(request)
+        request._cart_summary = summary
+    return summary
+
+
+def invalidate_cart_summary(request):
+    """Drop the memoized CartSummary so the next access re-reads the session."""
+    request.__dict__.pop('_cart_summary', None)
+
+
+def save_cart(request, cart):
+    """Store the cart in the session and invalidate the request's summary."""
+    request.session['cart'] = cart
+    invalidate_cart_summary(request)
@@ -1,6 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart_summary
+
+
 def cart_count(request):
     """Context processor to provide cart count to all templates."""
-    cart = request.session.get('cart', {})
-    # Sum up all quantities instead of counting unique items
-    total_items = sum(cart.values())
-    return {'cart_count': total_items} 
\ No newline at end of file
+    # Sum up all quantities instead of counting unique items, but only
+    # once a template actually renders the value
+    return {
+        'cart_summary': get_cart_summary(request),
+        'cart_count': SimpleLazyObject(lambda: get_cart_summary(request).count),
+    }
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from inventory.models import (
+    ExercisePlanProgress, ExerciseStep, NutritionPlanProgress, NutritionMeal, recount_progress
+)
+
+# (progress model, plan item model, m2m field, annotated total, annotated completed)
+COUNTED_PROGRESS = [
+    (ExercisePlanProgress, ExerciseStep, 'completed_steps', 'total_step_count', 'completed_step_count'),
+    (NutritionPlanProgress, NutritionMeal, 'completed_meals', 'total_meal_count', 'completed_meal_count'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized progress counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Progress rows repaired per UPDATE')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for progress_model, item_model, item_field, total_name, completed_name in COUNTED_PROGRESS:
+            # Rows where either stored counter disagrees with a live count
+            drifted = list(
+                progress_model.objects.with_progress().exclude(
+                    total_count=F(total_name),
+                    completed_count=F(completed_name)
+                ).values_list('pk', flat=True)
+            )
+            if not options['dry_run']:
+                for offset in range(0, len(drifted), batch_size):
+                    recount_progress(
+                        progress_model, item_model, item_field,
+                        progress_model.objects.filter(pk__in=drifted[offset:offset + batch_size])
+                    )
+
+            verb = 'would be repaired' if options['dry_run'] else 'repaired'
+            self.stdout.write(f'{progress_model._meta.verbose_name}: {len(drifted)} rows {verb}')
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, key):
+    counts = queryset.order_by().values(key).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts[:1]), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    for progress_name, item_name, m2m_name in (
+        ('ExercisePlanProgress', 'ExerciseStep', 'completed_steps'),
+        ('NutritionPlanProgress', 'NutritionMeal', 'completed_meals'),
+    ):
+        progress_model = apps.get_model('inventory', progress_name)
+        item_model = apps.get_model('inventory', item_name)
+        through = getattr(progress_model, m2m_name).through
+        key = progress_name.lower()
+        progress_model.objects.update(
+            completed_count=_count(through.objects.filter(**{key: OuterRef('pk')}), key),
+            total_count=_count(item_model.objects.filter(plan=OuterRef('plan')), 'plan'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_alter_nutritionmeal_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exerciseplanprogress',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exerciseplanprogress',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='nutritionplanprogress',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='nutritionplanprogress',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
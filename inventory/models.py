@@ -1,10 +1,72 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from django.utils import timezone
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, key):
+    """Correlated COUNT(*) of queryset rows grouped on key, 0 when there are none."""
+    counts = queryset.order_by().values(key).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts[:1]), 0)
+
+
+class ExercisePlanProgressQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Annotate total_step_count and completed_step_count in the same query."""
+        completed = self.model.completed_steps.through.objects.filter(
+            exerciseplanprogress=OuterRef('pk')
+        )
+        return self.annotate(
+            total_step_count=count_subquery(ExerciseStep.objects.filter(plan=OuterRef('plan')), 'plan'),
+            completed_step_count=count_subquery(completed, 'exerciseplanprogress'),
+        )
+
+
+class NutritionPlanProgressQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Annotate total_meal_count and completed_meal_count in the same query."""
+        completed = self.model.completed_meals.through.objects.filter(
+            nutritionplanprogress=OuterRef('pk')
+        )
+        return self.annotate(
+            total_meal_count=count_subquery(NutritionMeal.objects.filter(plan=OuterRef('plan')), 'plan'),
+            completed_meal_count=count_subquery(completed, 'nutritionplanprogress'),
+        )
+
+
+class ProgressCountersMixin:
+    """
+    Shared bookkeeping for the denormalized completed_count/total_count.
+
+    The counters are only ever changed with F() or subquery UPDATEs (see the
+    signal handlers below), so save() never writes them back from a possibly
+    stale in-memory copy.
+    """
+    COUNTER_FIELDS = ('completed_count', 'total_count')
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.total_count = self._count_plan_items()
+        elif kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def refresh_counters(self):
+        self.refresh_from_db(fields=list(self.COUNTER_FIELDS))
+
+    def _progress_percentage(self, total, completed):
+        if total == 0:
+            return 0
+        return (completed / total) * 100
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -155,37 +217,47 @@ class ExerciseStep(models.Model):
     def __str__(self):
         return f"{self.plan.name} - Step {self.order}: {self.name}"
 
-class ExercisePlanProgress(models.Model):
+class ExercisePlanProgress(ProgressCountersMixin, models.Model):
     """Tracks user progress through exercise plans."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     plan = models.ForeignKey(ExercisePlan, on_delete=models.CASCADE)
     current_step = models.ForeignKey(ExerciseStep, on_delete=models.SET_NULL, null=True)
     completed_steps = models.ManyToManyField(ExerciseStep, related_name='completed_by')
+    # Maintained by the signal handlers below, repaired by reconcile_progress_counters
+    completed_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
     start_date = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
     is_completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
 
+    objects = ExercisePlanProgressQuerySet.as_manager()
+
     class Meta:
         unique_together = ['user', 'plan']
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name} Progress"
 
+    def _count_plan_items(self):
+        return self.plan.steps.count()
+
     def complete_step(self, step):
         """Mark a step as completed and update progress."""
         if step.plan == self.plan:
             self.completed_steps.add(step)
+            # The with_progress() count no longer holds
+            self.__dict__.pop('completed_step_count', None)
+            self.refresh_counters()
             self.last_activity = timezone.now()
             self.save()
 
     def get_progress_percentage(self):
-        """Calculate progress percentage."""
-        total_steps = self.plan.steps.count()
-        if total_steps == 0:
-            return 0
-        completed = self.completed_steps.count()
-        return (completed / total_steps) * 100
+        """Calculate progress percentage, preferring with_progress() counts over the counters."""
+        return self._progress_percentage(
+            getattr(self, 'total_step_count', self.total_count),
+            getattr(self, 'completed_step_count', self.completed_count)
+        )
 
     def get_end_date(self):
         """Calculate the expected end date based on plan duration."""
@@ -321,44 +393,129 @@ class NutritionMeal(models.Model):
     def __str__(self):
         return f"{self.plan.name} - Day {self.day_of_week} {self.get_meal_type_display()}: {self.name}"
 
-class NutritionPlanProgress(models.Model):
+class NutritionPlanProgress(ProgressCountersMixin, models.Model):
     """Tracks user progress through nutrition plans."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     plan = models.ForeignKey(NutritionPlan, on_delete=models.CASCADE)
     current_meal = models.ForeignKey(NutritionMeal, on_delete=models.SET_NULL, null=True)
     completed_meals = models.ManyToManyField(NutritionMeal, related_name='completed_by')
+    # Maintained by the signal handlers below, repaired by reconcile_progress_counters
+    completed_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
     start_date = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
     is_completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
     
+    objects = NutritionPlanProgressQuerySet.as_manager()
+
     class Meta:
         unique_together = ['user', 'plan']
     
     def __str__(self):
         return f"{self.user.username} - {self.plan.name} Progress"
     
+    def _count_plan_items(self):
+        return self.plan.meals.count()
+
     def complete_meal(self, meal):
         """Mark a meal as completed and update progress."""
         if meal.plan == self.plan:
             self.completed_meals.add(meal)
+            # The with_progress() count no longer holds
+            self.__dict__.pop('completed_meal_count', None)
+            self.refresh_counters()
             self.last_activity = timezone.now()
             self.save()
-    
+
     def get_progress_percentage(self):
-        """Calculate progress percentage."""
-        total_meals = self.plan.meals.count()
-        if total_meals == 0:
-            return 0
-        completed = self.completed_meals.count()
-        return (completed / total_meals) * 100
+        """Calculate progress percentage, preferring with_progress() counts over the counters."""
+        return self._progress_percentage(
+            getattr(self, 'total_meal_count', self.total_count),
+            getattr(self, 'completed_meal_count', self.completed_count)
+        )
 
     def get_end_date(self):
         """Calculate the expected end date based on meal count (assuming 3 meals per day)."""
-        total_meals = self.plan.meals.count()
+        total_meals = getattr(self, 'total_meal_count', self.total_count)
         if total_meals > 0:
             from datetime import timedelta
             import math
             days_needed = math.ceil(total_meals / 3)  # 3 meals per day
             return self.start_date + timedelta(days=days_needed)
         return None
+
+
+# Progress counters: additions are applied as F() increments, everything
+# else (removals, clears, deleted steps/meals) is recounted with a subquery.
+
+def recount_progress(progress_model, item_model, item_field, progress_rows):
+    """Recompute both counters for progress_rows in one UPDATE."""
+    completed = progress_model._meta.get_field(item_field).remote_field.through.objects.filter(
+        **{progress_model._meta.model_name: OuterRef('pk')}
+    )
+    progress_rows.update(
+        completed_count=count_subquery(completed, progress_model._meta.model_name),
+        total_count=count_subquery(item_model.objects.filter(plan=OuterRef('plan')), 'plan'),
+    )
+
+
+def _completed_items_changed(progress_model, item_model, item_field, instance, action, reverse, pk_set):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance is a step/meal and pk_set holds progress ids (None on clear)
+        if action == 'post_add':
+            progress_model.objects.filter(pk__in=pk_set).update(completed_count=F('completed_count') + 1)
+        else:
+            recount_progress(
+                progress_model, item_model, item_field,
+                progress_model.objects.filter(plan_id=instance.plan_id)
+            )
+        return
+
+    progress_rows = progress_model.objects.filter(pk=instance.pk)
+    if action == 'post_add':
+        # pk_set only contains the rows that were actually inserted
+        progress_rows.update(completed_count=F('completed_count') + len(pk_set))
+    else:
+        recount_progress(progress_model, item_model, item_field, progress_rows)
+
+
+@receiver(m2m_changed, sender=ExercisePlanProgress.completed_steps.through)
+def exercise_steps_completed_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _completed_items_changed(ExercisePlanProgress, ExerciseStep, 'completed_steps', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=NutritionPlanProgress.completed_meals.through)
+def nutrition_meals_completed_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _completed_items_changed(NutritionPlanProgress, NutritionMeal, 'completed_meals', instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=ExerciseStep)
+def exercise_step_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ExercisePlanProgress.objects.filter(plan_id=instance.plan_id).update(total_count=F('total_count') + 1)
+
+
+@receiver(post_save, sender=NutritionMeal)
+def nutrition_meal_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        NutritionPlanProgress.objects.filter(plan_id=instance.plan_id).update(total_count=F('total_count') + 1)
+
+
+@receiver(post_delete, sender=ExerciseStep)
+def exercise_step_deleted(sender, instance, **kwargs):
+    # Deleting a step cascades to its completions without an m2m_changed signal
+    recount_progress(
+        ExercisePlanProgress, ExerciseStep, 'completed_steps',
+        ExercisePlanProgress.objects.filter(plan_id=instance.plan_id)
+    )
+
+
+@receiver(post_delete, sender=NutritionMeal)
+def nutrition_meal_deleted(sender, instance, **kwargs):
+    recount_progress(
+        NutritionPlanProgress, NutritionMeal, 'completed_meals',
+        NutritionPlanProgress.objects.filter(plan_id=instance.plan_id)
+    )
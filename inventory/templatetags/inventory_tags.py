@@ -40,50 +40,6 @@ def get_nutrition_color(diet_type):
     
     return color_map.get(diet_type, '#28a745')  # Default to green if not found
 
-@register.filter
-def get_exercise_plan(plan_id):
-    """
-    Get exercise plan by ID
-    """
-    from inventory.models import ExercisePlan
-    try:
-        return ExercisePlan.objects.get(id=plan_id)
-    except ExercisePlan.DoesNotExist:
-        return None
-
-@register.filter
-def get_nutrition_plan(plan_id):
-    """
-    Get nutrition plan by ID
-    """
-    from inventory.models import NutritionPlan
-    try:
-        return NutritionPlan.objects.get(id=plan_id)
-    except NutritionPlan.DoesNotExist:
-        return None
-
-@register.filter
-def get_exercise_progress(plan, user):
-    """
-    Get exercise progress for a plan and user
-    """
-    from inventory.models import ExercisePlanProgress
-    try:
-        return ExercisePlanProgress.objects.get(plan=plan, user=user)
-    except ExercisePlanProgress.DoesNotExist:
-        return None
-
-@register.filter
-def get_nutrition_progress(plan, user):
-    """
-    Get nutrition progress for a plan and user
-    """
-    from inventory.models import NutritionPlanProgress
-    try:
-        return NutritionPlanProgress.objects.get(plan=plan, user=user)
-    except NutritionPlanProgress.DoesNotExist:
-        return None
-
 @register.filter
 def add_days(date, days):
     """
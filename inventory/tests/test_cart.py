@@ -0,0 +1,159 @@
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from ..models import Product, ExercisePlan, NutritionPlan
+from ..cart import parse_cart_key, resolve_cart_items, get_cart_summary, save_cart
+from ..context_processors import cart_count
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CartResolutionTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description='Test Description',
+                price=10,
+                sku=f'SKU-{i}'
+            )
+            for i in range(10)
+        ]
+        self.exercise_plan = ExercisePlan.objects.create(
+            name='Test Plan',
+            slug='test-plan',
+            description='Test Description',
+            difficulty='beginner',
+            price=29.99
+        )
+        self.nutrition_plan = NutritionPlan.objects.create(
+            name='Test Nutrition Plan',
+            description='Test Description',
+            diet_type='BAL',
+            calories_per_day=2000,
+            protein_grams=150,
+            carbs_grams=200,
+            fat_grams=70
+        )
+
+    def _set_cart(self, cart):
+        session = self.client.session
+        session['cart'] = cart
+        session.save()
+
+    def _count_cart_view_queries(self, cart):
+        self._set_cart(cart)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_parse_cart_key(self):
+        """Test parsing of valid and malformed cart keys."""
+        self.assertEqual(parse_cart_key('product-3'), ('product', 3))
+        self.assertEqual(parse_cart_key('nutrition_plan-12'), ('nutrition_plan', 12))
+        self.assertIsNone(parse_cart_key('product'))
+        self.assertIsNone(parse_cart_key('unknown-1'))
+        self.assertIsNone(parse_cart_key('product-abc'))
+
+    def test_resolve_cart_items(self):
+        """Test that items of every type resolve and stale keys are reported."""
+        cart = {
+            f'product-{self.products[0].id}': 2,
+            f'exercise_plan-{self.exercise_plan.id}': 1,
+            f'nutrition_plan-{self.nutrition_plan.id}': 1,
+            'product-999999': 1,
+            'garbage': 1,
+        }
+        with self.assertNumQueries(3):
+            cart_items, invalid_keys = resolve_cart_items(cart)
+
+        self.assertEqual(
+            [cart_item['item'] for cart_item in cart_items],
+            [self.products[0], self.exercise_plan, self.nutrition_plan]
+        )
+        self.assertEqual(cart_items[0]['item_total'], 20)
+        self.assertEqual(sorted(invalid_keys), ['garbage', 'product-999999'])
+
+    def test_cart_view_query_count_is_constant(self):
+        """Test that the cart page query count doesn't grow with the cart."""
+        small_cart = {
+            f'product-{self.products[0].id}': 1,
+            f'exercise_plan-{self.exercise_plan.id}': 1,
+            f'nutrition_plan-{self.nutrition_plan.id}': 1,
+        }
+        large_cart = dict(small_cart)
+        large_cart.update({f'product-{product.id}': 3 for product in self.products})
+
+        self.assertEqual(
+            self._count_cart_view_queries(small_cart),
+            self._count_cart_view_queries(large_cart)
+        )
+
+    def test_cart_view_removes_invalid_items(self):
+        """Test that the cart page drops keys for deleted items."""
+        self._set_cart({
+            f'product-{self.products[0].id}': 1,
+            'product-999999': 1,
+        })
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(len(response.context['cart_items']), 1)
+        self.assertEqual(
+            self.client.session['cart'],
+            {f'product-{self.products[0].id}': 1}
+        )
+
+
+class CountingSession(dict):
+    """Session stand-in that records how often the cart is read."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    def get(self, key, default=None):
+        self.reads += 1
+        return super().get(key, default)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        """Set up a request with a cart in its session."""
+        self.request = RequestFactory().get('/')
+        self.request.session = CountingSession(cart={'product-1': 2, 'product-2': 3})
+
+    def test_context_processor_is_lazy(self):
+        """Test that the session isn't read until a template uses the count."""
+        context = cart_count(self.request)
+        self.assertEqual(self.request.session.reads, 0)
+
+        self.assertEqual(str(context['cart_count']), '5')
+        self.assertEqual(self.request.session.reads, 1)
+
+    def test_summary_is_memoized_per_request(self):
+        """Test that the cart is parsed once per request."""
+        summary = get_cart_summary(self.request)
+        self.assertIs(get_cart_summary(self.request), summary)
+
+        summary.count
+        summary.count
+        str(cart_count(self.request)['cart_count'])
+        self.assertEqual(self.request.session.reads, 1)
+
+    def test_save_cart_invalidates_summary(self):
+        """Test that mutating the cart rebuilds the summary."""
+        self.assertEqual(get_cart_summary(self.request).count, 5)
+
+        save_cart(self.request, {'product-1': 1})
+
+        self.assertEqual(get_cart_summary(self.request).count, 1)
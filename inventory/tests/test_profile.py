@@ -0,0 +1,108 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from posts.models import Post
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from ..models import ExercisePlan, ExercisePlanProgress, NutritionPlan, NutritionPlanProgress
+
+User = get_user_model()
+
+# session, user, profile, active subscription + plan, exercise progress,
+# nutrition progress, posts
+PROFILE_QUERY_BUDGET = 7
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProfileQueryTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_login(self.user)
+        self.plan_count = 0
+
+    def _purchase_plans(self, count):
+        for _ in range(count):
+            self.plan_count += 1
+            exercise_plan = ExercisePlan.objects.create(
+                name=f'Exercise Plan {self.plan_count}',
+                slug=f'exercise-plan-{self.plan_count}',
+                description='Test Description',
+                difficulty='beginner',
+                duration_weeks=4,
+                price=29.99
+            )
+            nutrition_plan = NutritionPlan.objects.create(
+                name=f'Nutrition Plan {self.plan_count}',
+                description='Test Description',
+                diet_type='BAL',
+                calories_per_day=2000,
+                protein_grams=150,
+                carbs_grams=200,
+                fat_grams=70
+            )
+            ExercisePlanProgress.objects.create(user=self.user, plan=exercise_plan, is_completed=self.plan_count == 1)
+            NutritionPlanProgress.objects.create(user=self.user, plan=nutrition_plan)
+
+    def _profile_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_independent_of_purchased_plans(self):
+        """Test that more purchased plans don't add per-plan lookups."""
+        self._purchase_plans(1)
+        # Warm the cached subscription lookup so both requests hit it
+        self._profile_queries()
+        _, baseline = self._profile_queries()
+
+        self._purchase_plans(5)
+        response, queries = self._profile_queries()
+        self.assertEqual(queries, baseline)
+        self.assertContains(response, 'Exercise Plan 6')
+        self.assertContains(response, 'Nutrition Plan 6')
+        self.assertEqual(response.context['total_exercise_plans'], 6)
+        self.assertEqual(response.context['completed_exercise_plans'], 1)
+
+    def test_query_budget(self):
+        """Test the profile page stays within its query budget."""
+        plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=Decimal('19.99')
+        )
+        UserSubscription.objects.create(
+            user=self.user,
+            plan=plan,
+            start_date=timezone.now() - timedelta(days=5),
+            end_date=timezone.now() + timedelta(days=25)
+        )
+        Post.objects.create(author=self.user, content='First post')
+        self._purchase_plans(3)
+
+        with self.assertNumQueries(PROFILE_QUERY_BUDGET):
+            response = self.client.get(reverse('profile'))
+        self.assertContains(response, 'Test Plan')
+        self.assertContains(response, 'First post')
+
+    def test_no_debug_output(self):
+        """Test that profile hits don't print to stdout."""
+        self._purchase_plans(1)
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            self.client.get(reverse('profile'))
+        self.assertNotIn('DEBUG: Profile view', stdout.getvalue())
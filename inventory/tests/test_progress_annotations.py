@@ -0,0 +1,89 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from ..models import (
+    ExercisePlan, ExerciseStep, ExercisePlanProgress,
+    NutritionPlan, NutritionMeal, NutritionPlanProgress
+)
+
+User = get_user_model()
+
+
+class ProgressAnnotationTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.exercise_progress = []
+        for i, step_count in enumerate([4, 2, 0]):
+            plan = ExercisePlan.objects.create(
+                name=f'Exercise Plan {i}',
+                slug=f'exercise-plan-{i}',
+                description='Test Description',
+                difficulty='beginner',
+                price=29.99
+            )
+            steps = [
+                ExerciseStep.objects.create(plan=plan, order=order, name=f'Step {order}', description='Step')
+                for order in range(step_count)
+            ]
+            progress = ExercisePlanProgress.objects.create(user=self.user, plan=plan)
+            progress.completed_steps.add(*steps[:1])
+            self.exercise_progress.append(progress)
+
+        self.nutrition_plan = NutritionPlan.objects.create(
+            name='Test Nutrition Plan',
+            description='Test Description',
+            diet_type='BAL',
+            calories_per_day=2000,
+            protein_grams=150,
+            carbs_grams=200,
+            fat_grams=70
+        )
+        self.meals = [
+            NutritionMeal.objects.create(
+                plan=self.nutrition_plan,
+                day_of_week=1,
+                order=order,
+                name=f'Meal {order}',
+                description='Meal',
+                meal_type='BRK',
+                calories=500,
+                protein_grams=30,
+                carbs_grams=50,
+                fat_grams=20,
+                ingredients='Oats',
+                instructions='Cook'
+            )
+            for order in range(4)
+        ]
+        self.nutrition_progress = NutritionPlanProgress.objects.create(user=self.user, plan=self.nutrition_plan)
+        self.nutrition_progress.completed_meals.add(*self.meals[:3])
+
+    def test_exercise_progress_in_one_query(self):
+        """Test annotated percentages match the stored counters without extra queries."""
+        expected = [
+            ExercisePlanProgress.objects.get(pk=progress.pk).get_progress_percentage()
+            for progress in self.exercise_progress
+        ]
+
+        with self.assertNumQueries(1):
+            rows = list(ExercisePlanProgress.objects.with_progress().order_by('id'))
+            percentages = [progress.get_progress_percentage() for progress in rows]
+
+        self.assertEqual(percentages, expected)
+        self.assertEqual(percentages, [25, 50, 0])
+
+    def test_nutrition_progress_in_one_query(self):
+        with self.assertNumQueries(1):
+            progress = NutritionPlanProgress.objects.with_progress().get(id=self.nutrition_progress.id)
+            self.assertEqual(progress.get_progress_percentage(), 75)
+            self.assertIsNotNone(progress.get_end_date())
+
+    def test_completing_after_annotation_recounts(self):
+        """Test that completing a step doesn't leave a stale annotated count."""
+        progress = ExercisePlanProgress.objects.with_progress().get(id=self.exercise_progress[0].id)
+        progress.complete_step(progress.plan.steps.get(order=1))
+        self.assertEqual(progress.get_progress_percentage(), 50)
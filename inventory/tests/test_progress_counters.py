@@ -0,0 +1,113 @@
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from ..models import (
+    ExercisePlan, ExerciseStep, ExercisePlanProgress,
+    NutritionPlan, NutritionMeal, NutritionPlanProgress
+)
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProgressCounterTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = ExercisePlan.objects.create(
+            name='Test Plan',
+            slug='test-plan',
+            description='Test Description',
+            difficulty='beginner',
+            price=29.99
+        )
+        self.steps = [
+            ExerciseStep.objects.create(plan=self.plan, order=order, name=f'Step {order}', description='Step')
+            for order in range(4)
+        ]
+        self.progress = ExercisePlanProgress.objects.create(user=self.user, plan=self.plan)
+
+    def _counters(self, progress=None):
+        progress = progress or self.progress
+        progress.refresh_counters()
+        return progress.completed_count, progress.total_count
+
+    def test_counters_follow_completions(self):
+        """Test that add, duplicate add, remove and clear keep the counters exact."""
+        self.assertEqual(self._counters(), (0, 4))
+
+        self.progress.complete_step(self.steps[0])
+        self.assertEqual(self.progress.get_progress_percentage(), 25)
+        self.progress.completed_steps.add(self.steps[0], self.steps[1])
+        self.assertEqual(self._counters(), (2, 4))
+
+        self.progress.completed_steps.remove(self.steps[1])
+        self.assertEqual(self._counters(), (1, 4))
+
+        self.steps[2].completed_by.add(self.progress)
+        self.assertEqual(self._counters(), (2, 4))
+
+        self.progress.completed_steps.clear()
+        self.assertEqual(self._counters(), (0, 4))
+
+    def test_step_changes_update_totals(self):
+        self.progress.completed_steps.add(self.steps[0], self.steps[1])
+        ExerciseStep.objects.create(plan=self.plan, order=9, name='Step 9', description='Step')
+        self.assertEqual(self._counters(), (2, 5))
+
+        # Deleting a completed step removes its completion without m2m_changed
+        self.steps[0].delete()
+        self.assertEqual(self._counters(), (1, 4))
+
+    def test_save_does_not_overwrite_counters(self):
+        """Test that a stale in-memory copy can't clobber the stored counters."""
+        stale = ExercisePlanProgress.objects.get(pk=self.progress.pk)
+        self.progress.completed_steps.add(self.steps[0])
+        stale.is_completed = True
+        stale.save()
+        self.assertEqual(self._counters(), (1, 4))
+
+    def test_mark_step_completed_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('inventory:mark_step_completed', args=[self.plan.id, self.steps[1].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['completed_steps'], 1)
+        self.assertEqual(response.json()['progress_percentage'], 25)
+
+    def test_nutrition_counters_and_reconcile(self):
+        """Test meal counters and that the reconcile command repairs drift."""
+        plan = NutritionPlan.objects.create(
+            name='Test Nutrition Plan',
+            description='Test Description',
+            diet_type='BAL',
+            calories_per_day=2000,
+            protein_grams=150,
+            carbs_grams=200,
+            fat_grams=70
+        )
+        meals = [
+            NutritionMeal.objects.create(
+                plan=plan, day_of_week=1, order=order, name=f'Meal {order}', description='Meal',
+                meal_type='LUN', calories=500, protein_grams=30, carbs_grams=50, fat_grams=20,
+                ingredients='Rice', instructions='Cook'
+            )
+            for order in range(2)
+        ]
+        progress = NutritionPlanProgress.objects.create(user=self.user, plan=plan)
+        progress.complete_meal(meals[0])
+        self.assertEqual((progress.completed_count, progress.total_count), (1, 2))
+        self.assertEqual(progress.get_progress_percentage(), 50)
+
+        NutritionPlanProgress.objects.filter(pk=progress.pk).update(completed_count=7, total_count=0)
+        ExercisePlanProgress.objects.filter(pk=self.progress.pk).update(total_count=1)
+        out = StringIO()
+        call_command('reconcile_progress_counters', stdout=out)
+        self.assertIn('1 rows repaired', out.getvalue())
+        self.assertEqual(self._counters(progress), (1, 2))
+        self.assertEqual(self._counters(), (0, 4))
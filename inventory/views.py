@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Product, UserProfile, ExercisePlan, ExercisePlanProgress, NutritionPlan, NutritionPlanProgress, NutritionMeal, Category
-from subscriptions.models import SubscriptionPlan
+from .models import Product, UserProfile, ExercisePlan, ExerciseStep, ExercisePlanProgress, NutritionPlan, NutritionPlanProgress, NutritionMeal, Category
 from posts.models import Post
+from subscriptions.entitlements import get_active_subscription
+from payments.gateway import get_gateway
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from .forms import UserProfileForm, ReviewForm
+from .cart import CART_ITEM_MODELS, resolve_cart_item, get_cart_summary, save_cart
 import stripe
 from django.conf import settings
 from django.http import JsonResponse
@@ -14,7 +16,7 @@ from django.contrib import messages
 from django.urls import reverse
 from django.utils import timezone
 from django.views.generic import ListView, DetailView
-from django.core.mail import send_mail
+from notifications.outbox import enqueue_email
 
 def product_list(request):
     products = Product.objects.all()
@@ -62,58 +64,41 @@ def product_detail(request, slug):
     })
 
 def add_to_cart(request, item_type, item_id):
-    cart = request.session.get('cart', {})
+    cart = get_cart_summary(request).cart
     item_key = f"{item_type}-{item_id}"
     
     # Check if this is an AJAX request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        try:
-            if item_type == 'product':
-                item = Product.objects.get(id=item_id)
-            elif item_type in ['exercise_plan', 'plan']:
-                item = ExercisePlan.objects.get(id=item_id)
-            elif item_type == 'nutrition_plan':
-                item = NutritionPlan.objects.get(id=item_id)
-            elif item_type == 'subscription_plan':
-                item = SubscriptionPlan.objects.get(id=item_id)
-            else:
-                return JsonResponse({'error': 'Invalid item type'}, status=400)
-            
+        if item_type not in CART_ITEM_MODELS:
+            return JsonResponse({'error': 'Invalid item type'}, status=400)
+        item = resolve_cart_item(item_type, item_id)
+        if item is not None:
             # Check if item is already in cart (for plans and subscriptions)
             if item_type in ['exercise_plan', 'plan', 'nutrition_plan', 'subscription_plan']:
                 if item_key in cart:
                     return JsonResponse({
                         'success': False,
                         'message': f'{item.name} is already in your cart. You can only order one of each plan.',
-                        'cart_count': sum(cart.values())
+                        'cart_count': get_cart_summary(request).count
                     }, status=400)
             
             # Add item to cart
             cart[item_key] = cart.get(item_key, 0) + 1
-            request.session['cart'] = cart
+            save_cart(request, cart)
             
             return JsonResponse({
                 'success': True,
                 'message': f'{item.name} added to cart',
-                'cart_count': sum(cart.values())
+                'cart_count': get_cart_summary(request).count
             })
-        except (Product.DoesNotExist, ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist, SubscriptionPlan.DoesNotExist):
-            return JsonResponse({'error': 'Item not found'}, status=404)
+        return JsonResponse({'error': 'Item not found'}, status=404)
     
     # For non-AJAX requests
-    try:
-        if item_type == 'product':
-            item = Product.objects.get(id=item_id)
-        elif item_type in ['exercise_plan', 'plan']:
-            item = ExercisePlan.objects.get(id=item_id)
-        elif item_type == 'nutrition_plan':
-            item = NutritionPlan.objects.get(id=item_id)
-        elif item_type == 'subscription_plan':
-            item = SubscriptionPlan.objects.get(id=item_id)
-        else:
-            messages.error(request, 'Invalid item type.')
-            return redirect('product_list')
-        
+    if item_type not in CART_ITEM_MODELS:
+        messages.error(request, 'Invalid item type.')
+        return redirect('product_list')
+    item = resolve_cart_item(item_type, item_id)
+    if item is not None:
         # Check if item is already in cart (for plans and subscriptions)
         if item_type in ['exercise_plan', 'plan', 'nutrition_plan', 'subscription_plan']:
             if item_key in cart:
@@ -129,10 +114,9 @@ def add_to_cart(request, item_type, item_id):
         
         # Add item to cart
         cart[item_key] = cart.get(item_key, 0) + 1
-        request.session['cart'] = cart
+        save_cart(request, cart)
         messages.success(request, f'{item.name} added to cart')
-        
-    except (Product.DoesNotExist, ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist, SubscriptionPlan.DoesNotExist):
+    else:
         messages.error(request, 'Item not found.')
     
     # Redirect based on item type
@@ -148,45 +132,16 @@ def add_to_cart(request, item_type, item_id):
         return redirect('product_list')
 
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
-    invalid_keys = []
-
-    for item_key, quantity in cart.items():
-        if '-' not in item_key:
-            invalid_keys.append(item_key)
-            continue
-        try:
-            item_type, item_id = item_key.split('-', 1)
-            if item_type == 'product':
-                item = Product.objects.get(id=item_id)
-            elif item_type in ['exercise_plan', 'plan']:
-                item = ExercisePlan.objects.get(id=item_id)
-            elif item_type == 'nutrition_plan':
-                item = NutritionPlan.objects.get(id=item_id)
-            elif item_type == 'subscription_plan':
-                item = SubscriptionPlan.objects.get(id=item_id)
-            else:
-                invalid_keys.append(item_key)
-                continue
-            item_total = item.price * quantity
-            total += item_total
-            cart_items.append({
-                'item': item,
-                'item_type': item_type,
-                'quantity': quantity,
-                'item_total': item_total,
-            })
-        except (Product.DoesNotExist, ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist, SubscriptionPlan.DoesNotExist):
-            invalid_keys.append(item_key)
-            continue
+    summary = get_cart_summary(request)
+    cart_items = summary.items
+    total = summary.total
 
     # Remove any invalid keys from the cart
-    if invalid_keys:
-        for key in invalid_keys:
+    if summary.invalid_keys:
+        cart = dict(summary.cart)
+        for key in summary.invalid_keys:
             cart.pop(key, None)
-        request.session['cart'] = cart
+        save_cart(request, cart)
         messages.info(request, "Some invalid items were removed from your cart.")
 
     context = {
@@ -212,31 +167,22 @@ def create_checkout_session(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    cart = request.session.get('cart', {})
+    cart_items = get_cart_summary(request).items
     line_items = []
 
-    for item_key, quantity in cart.items():
-        item_type, item_id = item_key.split('-')
-        try:
-            if item_type == 'product':
-                item = Product.objects.get(id=item_id)
-            else:  # exercise plan
-                item = ExercisePlan.objects.get(id=item_id)
-                
-            line_items.append({
-                'price_data': {
-                    'currency': 'eur',
-                    'product_data': {
-                        'name': item.name,
-                        'description': item.description[:100] if hasattr(item, 'description') else '',
-                    },
-                    'unit_amount': int(item.price * 100),
+    for cart_item in cart_items:
+        item = cart_item['item']
+        line_items.append({
+            'price_data': {
+                'currency': 'eur',
+                'product_data': {
+                    'name': item.name,
+                    'description': item.description[:100] if hasattr(item, 'description') else '',
                 },
-                'quantity': quantity,
-            })
-        except (Product.DoesNotExist, ExercisePlan.DoesNotExist):
-            pass
+                'unit_amount': int(item.price * 100),
+            },
+            'quantity': cart_item['quantity'],
+        })
 
     if not line_items:
         messages.error(request, "Your cart is empty.")
@@ -250,12 +196,12 @@ def create_checkout_session(request):
         }
         
         # Add plan information to metadata
-        for item_key, quantity in cart.items():
-            item_type, item_id = item_key.split('-')
+        for cart_item in cart_items:
+            item_type = cart_item['item_type']
             if item_type in ['exercise_plan', 'plan', 'nutrition_plan']:
-                cart_metadata[f'{item_type}_{item_id}'] = str(quantity)
+                cart_metadata[f"{item_type}_{cart_item['item'].id}"] = str(cart_item['quantity'])
         
-        session = stripe.checkout.Session.create(
+        session = get_gateway().create_checkout_session(
             payment_method_types=['card'],
             line_items=line_items,
             mode='payment',
@@ -274,44 +220,34 @@ def create_checkout_session(request):
 @login_required
 def payment_success(request):
     """Handle successful payment from cart checkout and create progress records for plans."""
-    cart = request.session.get('cart', {})
+    cart_items = get_cart_summary(request).items
     plans_purchased = []
     
-    # Process each item in the cart
-    for item_key, quantity in cart.items():
-        item_type, item_id = item_key.split('-')
+    # Products need no follow-up; plans get a progress record
+    for cart_item in cart_items:
+        item_type = cart_item['item_type']
+        plan = cart_item['item']
         
-        try:
-            if item_type == 'product':
-                # Handle product purchase (no progress needed)
-                pass
-            elif item_type in ['exercise_plan', 'plan']:
-                # Handle exercise plan purchase
-                plan = ExercisePlan.objects.get(id=item_id)
-                progress, created = ExercisePlanProgress.objects.get_or_create(
-                    user=request.user,
-                    plan=plan,
-                    defaults={'current_step': plan.steps.first()}
-                )
-                if created:
-                    plans_purchased.append(f"Exercise Plan: {plan.name}")
-                    
-            elif item_type == 'nutrition_plan':
-                # Handle nutrition plan purchase
-                plan = NutritionPlan.objects.get(id=item_id)
-                progress, created = NutritionPlanProgress.objects.get_or_create(
-                    user=request.user,
-                    plan=plan,
-                    defaults={'current_meal': plan.meals.first()}
-                )
-                if created:
-                    plans_purchased.append(f"Nutrition Plan: {plan.name}")
-                    
-        except (ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist):
-            pass
+        if item_type in ['exercise_plan', 'plan']:
+            progress, created = ExercisePlanProgress.objects.get_or_create(
+                user=request.user,
+                plan=plan,
+                defaults={'current_step': plan.steps.first()}
+            )
+            if created:
+                plans_purchased.append(f"Exercise Plan: {plan.name}")
+                
+        elif item_type == 'nutrition_plan':
+            progress, created = NutritionPlanProgress.objects.get_or_create(
+                user=request.user,
+                plan=plan,
+                defaults={'current_meal': plan.meals.first()}
+            )
+            if created:
+                plans_purchased.append(f"Nutrition Plan: {plan.name}")
     
     # Clear the cart
-    request.session['cart'] = {}
+    save_cart(request, {})
     
     # Show success message
     if plans_purchased:
@@ -385,45 +321,32 @@ def profile_view(request):
     profile = request.user.userprofile
     posts = request.user.post_set.order_by('-created_at')  # fetch user's posts
     
-    # Get user's active subscription
-    try:
-        active_subscription = request.user.usersubscription_set.filter(
-            status='ACTIVE',
-            end_date__gt=timezone.now()
-        ).first()
-        
-        # Debug logging
-        print(f"DEBUG: Profile view - User ID: {request.user.id}")
-        print(f"DEBUG: Profile view - Active subscription found: {active_subscription is not None}")
-        if active_subscription:
-            print(f"DEBUG: Profile view - Subscription ID: {active_subscription.id}")
-            print(f"DEBUG: Profile view - Subscription status: {active_subscription.status}")
-            print(f"DEBUG: Profile view - Subscription end_date: {active_subscription.end_date}")
-            print(f"DEBUG: Profile view - Current time: {timezone.now()}")
-            print(f"DEBUG: Profile view - Is active: {active_subscription.is_active}")
-        else:
-            # Check if there are any subscriptions at all
-            all_subscriptions = request.user.usersubscription_set.all()
-            print(f"DEBUG: Profile view - Total subscriptions: {all_subscriptions.count()}")
-            for sub in all_subscriptions:
-                print(f"DEBUG: Profile view - Subscription {sub.id}: status={sub.status}, end_date={sub.end_date}, is_active={sub.is_active}")
-    except Exception as e:
-        print(f"DEBUG: Profile view - Error getting subscription: {str(e)}")
-        active_subscription = None
+    # Get user's active subscription, with its plan for the subscription card
+    active_subscription = get_active_subscription(request)
     
     # Get user's progress data - only exercise plans
-    exercise_progress = ExercisePlanProgress.objects.filter(user=request.user)
+    exercise_progress = list(ExercisePlanProgress.objects.filter(
+        user=request.user
+    ).select_related('plan'))
     # Nutrition plans removed from progress tracking
     nutrition_progress = []
     
-    # Get all purchased plans (plans with progress records)
-    purchased_exercise_plans = exercise_progress.values_list('plan', flat=True)
+    # Get all purchased plans (plans with progress records), with lookup maps
+    # so the template doesn't query per plan
+    exercise_progress_by_plan = {progress.plan_id: progress for progress in exercise_progress}
+    exercise_plans_by_id = {progress.plan_id: progress.plan for progress in exercise_progress}
+    purchased_exercise_plans = list(exercise_plans_by_id)
     # Get nutrition plans from progress (for purchased plans display)
-    purchased_nutrition_plans = NutritionPlanProgress.objects.filter(user=request.user).values_list('plan', flat=True)
+    nutrition_progress_by_plan = {
+        progress.plan_id: progress
+        for progress in NutritionPlanProgress.objects.filter(user=request.user).select_related('plan')
+    }
+    nutrition_plans_by_id = {plan_id: progress.plan for plan_id, progress in nutrition_progress_by_plan.items()}
+    purchased_nutrition_plans = list(nutrition_plans_by_id)
     
     # Calculate overall progress - only exercise plans
-    total_exercise_plans = exercise_progress.count()
-    completed_exercise_plans = exercise_progress.filter(is_completed=True).count()
+    total_exercise_plans = len(exercise_progress)
+    completed_exercise_plans = sum(1 for progress in exercise_progress if progress.is_completed)
     # Nutrition plans removed from progress tracking
     total_nutrition_plans = 0
     completed_nutrition_plans = 0
@@ -454,6 +377,10 @@ def profile_view(request):
         'completed_nutrition_plans': completed_nutrition_plans,
         'purchased_exercise_plans': purchased_exercise_plans,
         'purchased_nutrition_plans': purchased_nutrition_plans,
+        'exercise_plans_by_id': exercise_plans_by_id,
+        'exercise_progress_by_plan': exercise_progress_by_plan,
+        'nutrition_plans_by_id': nutrition_plans_by_id,
+        'nutrition_progress_by_plan': nutrition_progress_by_plan,
     })
 
 def error_view(request):
@@ -462,24 +389,17 @@ def error_view(request):
 def update_cart(request, item_type, item_id):
     if request.method == 'POST':
         action = request.POST.get('action')
-        cart = request.session.get('cart', {})
+        cart = get_cart_summary(request).cart
         item_key = f"{item_type}-{item_id}"
         
-        try:
-            if item_type == 'product':
-                item = Product.objects.get(id=item_id)
-            elif item_type in ['exercise_plan', 'plan']:
-                item = ExercisePlan.objects.get(id=item_id)
-            elif item_type == 'nutrition_plan':
-                item = NutritionPlan.objects.get(id=item_id)
-            elif item_type == 'subscription_plan':
-                item = SubscriptionPlan.objects.get(id=item_id)
-            else:
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({'error': 'Invalid item type'}, status=400)
-                messages.error(request, 'Invalid item type.')
-                return redirect('cart')
-                
+        if item_type not in CART_ITEM_MODELS:
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'error': 'Invalid item type'}, status=400)
+            messages.error(request, 'Invalid item type.')
+            return redirect('cart')
+        
+        item = resolve_cart_item(item_type, item_id)
+        if item is not None:
             if action == 'increase':
                 # Prevent increasing quantity for plans and subscriptions
                 if item_type in ['exercise_plan', 'plan', 'nutrition_plan', 'subscription_plan']:
@@ -487,7 +407,7 @@ def update_cart(request, item_type, item_id):
                         return JsonResponse({
                             'success': False,
                             'message': f'You can only order one of each {item.name}.',
-                            'cart_count': sum(cart.values())
+                            'cart_count': get_cart_summary(request).count
                         }, status=400)
                     else:
                         messages.warning(request, f'You can only order one of each {item.name}.')
@@ -509,7 +429,7 @@ def update_cart(request, item_type, item_id):
                 messages.error(request, 'Invalid action.')
                 return redirect('cart')
                 
-            request.session['cart'] = cart
+            save_cart(request, cart)
             
             # Check if this is an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -520,7 +440,7 @@ def update_cart(request, item_type, item_id):
                         'message': success_message,
                         'action': action,
                         'quantity': cart[item_key],
-                        'cart_count': sum(cart.values())
+                        'cart_count': get_cart_summary(request).count
                     })
                 else:
                     # Item was removed
@@ -529,11 +449,11 @@ def update_cart(request, item_type, item_id):
                         'message': f'{item.name} removed from cart',
                         'action': 'decrease',
                         'quantity': 0,
-                        'cart_count': sum(cart.values())
+                        'cart_count': get_cart_summary(request).count
                     })
             else:
                 messages.success(request, success_message)
-        except (Product.DoesNotExist, ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist, SubscriptionPlan.DoesNotExist):
+        else:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'error': 'Item not found'}, status=404)
             messages.error(request, 'Item not found.')
@@ -544,38 +464,31 @@ def update_cart(request, item_type, item_id):
 
 def remove_from_cart(request, item_type, item_id):
     if request.method == 'POST':
-        cart = request.session.get('cart', {})
+        cart = get_cart_summary(request).cart
         item_key = f"{item_type}-{item_id}"
         
         if item_key in cart:
-            try:
-                if item_type == 'product':
-                    item = Product.objects.get(id=item_id)
-                elif item_type in ['exercise_plan', 'plan']:
-                    item = ExercisePlan.objects.get(id=item_id)
-                elif item_type == 'nutrition_plan':
-                    item = NutritionPlan.objects.get(id=item_id)
-                elif item_type == 'subscription_plan':
-                    item = SubscriptionPlan.objects.get(id=item_id)
-                else:
-                    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                        return JsonResponse({'error': 'Invalid item type'}, status=400)
-                    messages.error(request, 'Invalid item type.')
-                    return redirect('cart')
-                
+            if item_type not in CART_ITEM_MODELS:
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return JsonResponse({'error': 'Invalid item type'}, status=400)
+                messages.error(request, 'Invalid item type.')
+                return redirect('cart')
+            
+            item = resolve_cart_item(item_type, item_id)
+            if item is not None:
                 del cart[item_key]
-                request.session['cart'] = cart
+                save_cart(request, cart)
                 
                 # Check if this is an AJAX request
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({
                         'success': True,
                         'message': f'{item.name} removed from cart',
-                        'cart_count': sum(cart.values())
+                        'cart_count': get_cart_summary(request).count
                     })
                 else:
                     messages.success(request, f'{item.name} removed from cart.')
-            except (Product.DoesNotExist, ExercisePlan.DoesNotExist, NutritionPlan.DoesNotExist, SubscriptionPlan.DoesNotExist):
+            else:
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({'error': 'Item not found'}, status=404)
                 messages.error(request, 'Item not found.')
@@ -665,16 +578,17 @@ def mark_step_completed(request, plan_id, step_id):
             defaults={'current_step': step}
         )
         
-        # Mark step as completed
+        # Mark step as completed; the counters are bumped by the m2m signal
         user_progress.completed_steps.add(step)
+        user_progress.refresh_counters()
         user_progress.current_step = step
         user_progress.last_activity = timezone.now()
         user_progress.save()
         
         # Calculate new progress
-        total_steps = plan.steps.count()
-        completed_steps = user_progress.completed_steps.count()
-        progress_percentage = (completed_steps / total_steps * 100) if total_steps > 0 else 0
+        total_steps = user_progress.total_count
+        completed_steps = user_progress.completed_count
+        progress_percentage = user_progress.get_progress_percentage()
         
         # Check if plan is completed
         if completed_steps == total_steps and not user_progress.is_completed:
@@ -706,7 +620,7 @@ def create_exercise_plan_checkout_session(request, plan_id):
         plan = ExercisePlan.objects.get(id=plan_id)
         
         # Create Stripe checkout session
-        session = stripe.checkout.Session.create(
+        session = get_gateway().create_checkout_session(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -748,7 +662,7 @@ def create_plan_checkout_session(request, plan_id):
         plan = NutritionPlan.objects.get(id=plan_id, is_active=True)
         
         # Create Stripe checkout session
-        session = stripe.checkout.Session.create(
+        session = get_gateway().create_checkout_session(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -875,7 +789,7 @@ def complete_meal(request, plan_id, meal_id):
     progress.complete_meal(meal)
     
     # Check if all meals are completed
-    if progress.completed_meals.count() == plan.meals.count():
+    if progress.completed_count >= progress.total_count:
         progress.is_completed = True
         progress.completion_date = timezone.now()
         progress.save()
@@ -924,12 +838,11 @@ def newsletter_signup(request):
             # In a real application, you would save this to a database
             # and integrate with an email marketing service
             try:
-                send_mail(
+                enqueue_email(
                     'Welcome to FitFusion Newsletter!',
                     'Thank you for subscribing to our newsletter. We\'ll keep you updated with the latest fitness tips and offers.',
                     settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
+                    [email]
                 )
                 messages.success(request, 'Thank you for subscribing to our newsletter!')
             except Exception as e:
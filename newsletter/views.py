@@ -3,7 +3,8 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.core.mail import send_mail
+from django.db import transaction
+from notifications.outbox import enqueue_email
 from django.conf import settings
 from .forms import NewsletterForm
 from .models import Newsletter
@@ -13,20 +14,16 @@ def subscribe_newsletter(request):
     if request.method == 'POST':
         form = NewsletterForm(request.POST)
         if form.is_valid():
-            newsletter = form.save()
-            
-            # Send welcome email
-            try:
-                send_mail(
+            # Save the subscription and queue its welcome email together; the
+            # outbox worker sends it, so a mail outage can't fail the signup
+            with transaction.atomic():
+                newsletter = form.save()
+                enqueue_email(
                     'Welcome to FitFusion Newsletter!',
                     f'Hi there!\n\nThank you for subscribing to the FitFusion newsletter! You\'ll now receive weekly fitness tips, workout plans, and exclusive offers.\n\nStay motivated and keep pushing towards your fitness goals!\n\nBest regards,\nThe FitFusion Team',
                     settings.DEFAULT_FROM_EMAIL,
-                    [newsletter.email],
-                    fail_silently=True,  # Don't break the subscription if email fails
+                    [newsletter.email]
                 )
-            except Exception as e:
-                # Log the error but don't break the subscription
-                print(f"Failed to send welcome email to {newsletter.email}: {e}")
             
             # Check if it's an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -0,0 +1,11 @@
+from ecommerce_site.queues import QueueWorkerCommand
+from notifications.outbox import deliver_pending_emails
+
+
+class Command(QueueWorkerCommand):
+    help = 'Deliver emails waiting in the outbox'
+    label = 'Outbox'
+    batch_size_help = 'Emails sent per SMTP connection'
+
+    def run(self, batch_size):
+        return deliver_pending_emails(batch_size=batch_size)
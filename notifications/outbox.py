@@ -0,0 +1,106 @@
+"""
+Durable email outbox.
+
+enqueue_email() has the same arguments as send_mail() but only writes an
+OutboundEmail row, so request and webhook handlers never wait on SMTP, and
+an email queued inside a transaction that rolls back is never sent.
+deliver_pending_emails() is the worker side: it claims due rows through a
+LeasedQueue, sends each batch over one SMTP connection and retries failures
+with backoff.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+from ecommerce_site.queues import LeasedQueue
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Rows stuck in SENDING this long belong to a worker that died
+LEASE_TIMEOUT = timedelta(minutes=5)
+
+queue = LeasedQueue(
+    OutboundEmail,
+    claimed_status='SENDING',
+    lease_timeout=LEASE_TIMEOUT,
+    retry_base_delay=timedelta(minutes=1),
+    max_retry_delay=timedelta(hours=6),
+    max_attempts_setting='EMAIL_OUTBOX_MAX_ATTEMPTS',
+)
+
+
+def build_email(subject, message, from_email, recipient_list, html_message=None):
+    return OutboundEmail(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def enqueue_email(subject, message, from_email, recipient_list, html_message=None):
+    """Queue an email for delivery. Takes the same leading arguments as send_mail()."""
+    email = build_email(subject, message, from_email, recipient_list, html_message)
+    email.save()
+    return email
+
+
+def enqueue_many(emails):
+    """Queue several unsaved OutboundEmail rows (see build_email) in one insert."""
+    return OutboundEmail.objects.bulk_create(emails, batch_size=500)
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.recipients,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_batch(emails):
+    """Send claimed emails over a single connection. Returns counts per resulting status."""
+    counts = {'SENT': 0, 'PENDING': 0, 'FAILED': 0}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open mail connection: {str(e)}")
+        for email in emails:
+            counts[queue.fail(email, e)] += 1
+        return counts
+
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([_message(email, connection)])
+            except Exception as e:
+                logger.error(f"Failed to send queued email {email.pk}: {str(e)}")
+                counts[queue.fail(email, e)] += 1
+                continue
+            # Recorded straight away, so a crash later in the batch can't resend it
+            counts['SENT'] += queue.owned(email).update(
+                status='SENT', sent_at=timezone.now(), last_error=''
+            )
+    finally:
+        connection.close()
+    return counts
+
+
+def deliver_pending_emails(batch_size=100):
+    """Deliver due emails in batches until none are left. Returns counts per status."""
+    totals = {'SENT': 0, 'PENDING': 0, 'FAILED': 0}
+    while True:
+        emails = queue.claim(batch_size)
+        if not emails:
+            return totals
+        for status, count in send_batch(emails).items():
+            totals[status] += count
@@ -0,0 +1,101 @@
+"""
+Email rendering for batch jobs.
+
+render_to_string() looks each template up again and builds a fresh context
+for every call. The renewal and trial jobs render the same few templates
+thousands of times, so get_email_template() compiles each template once per
+process, and render_many() renders a whole batch through one Context.
+
+Keys in `shared` are pushed once for the batch. Parts of a template wrapped
+in {% shared %} (see notifications.templatetags.email_tags) are rendered
+once per batch rather than once per recipient.
+"""
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context, TemplateDoesNotExist, engines
+from django.utils.html import strip_tags
+
+# Context key holding the {% shared %} output for the current batch
+FRAGMENT_CACHE = '_shared_fragments'
+
+
+def _load_template(template_name):
+    # The backend wrapper rebuilds the context on every render; keep the compiled
+    # template. Missing templates come back as None so lookups for them are cached too.
+    try:
+        return engines['django'].get_template(template_name).template
+    except TemplateDoesNotExist:
+        return None
+
+
+_cached_template = lru_cache(maxsize=None)(_load_template)
+
+
+def find_email_template(template_name):
+    """
+    Return the compiled template, or None if it does not exist. Each template
+    is compiled once per process unless DEBUG is on.
+    """
+    if settings.DEBUG:
+        return _load_template(template_name)
+    return _cached_template(template_name)
+
+
+def get_email_template(template_name):
+    """Like find_email_template() but raises TemplateDoesNotExist."""
+    template = find_email_template(template_name)
+    if template is None:
+        raise TemplateDoesNotExist(template_name)
+    return template
+
+
+@receiver(setting_changed)
+def reset_email_templates(setting, **kwargs):
+    if setting in ('TEMPLATES', 'DEBUG'):
+        _cached_template.cache_clear()
+
+
+def _render_batch(template, contexts, context):
+    rendered = []
+    for values in contexts:
+        with context.push(values):
+            rendered.append(template.render(context))
+    return rendered
+
+
+def _batch_context(shared):
+    context = Context(dict(shared or {}), autoescape=engines['django'].engine.autoescape)
+    context[FRAGMENT_CACHE] = {}
+    return context
+
+
+def render_many(template_name, contexts, shared=None):
+    """
+    Render template_name once per dict in contexts and return the strings in
+    the same order. `shared` holds values common to the whole batch.
+    """
+    return _render_batch(get_email_template(template_name), contexts, _batch_context(shared))
+
+
+def render_email_many(name, contexts, shared=None):
+    """
+    Render the `name`.html and `name`.txt pair for each context and return a
+    list of (text, html) tuples. Without a .txt template the text part is
+    the HTML with its tags stripped.
+    """
+    contexts = list(contexts)
+    context = _batch_context(shared)
+    html = _render_batch(get_email_template(f'{name}.html'), contexts, context)
+    text_template = find_email_template(f'{name}.txt')
+    if text_template is None:
+        text = [strip_tags(message) for message in html]
+    else:
+        text = _render_batch(text_template, contexts, context)
+    return list(zip(text, html))
+
+
+def render_email(name, context, shared=None):
+    """Render a single (text, html) pair. See render_email_many()."""
+    return render_email_many(name, [context], shared)[0]
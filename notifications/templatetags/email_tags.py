@@ -0,0 +1,36 @@
+from django import template
+from ..rendering import FRAGMENT_CACHE
+
+register = template.Library()
+
+
+class SharedNode(template.Node):
+    def __init__(self, nodelist, vary_on):
+        self.nodelist = nodelist
+        self.vary_on = vary_on
+
+    def render(self, context):
+        cache = context.get(FRAGMENT_CACHE)
+        if cache is None:
+            return self.nodelist.render(context)
+        key = (self, tuple(var.resolve(context) for var in self.vary_on))
+        if key not in cache:
+            cache[key] = self.nodelist.render(context)
+        return cache[key]
+
+
+@register.tag
+def shared(parser, token):
+    """
+    Render the enclosed block once per email batch (see notifications.rendering)
+    and reuse the output for every recipient. Like {% cache %}, extra
+    arguments are values the block varies on:
+
+        {% shared subscription.plan_id %}...{% endshared %}
+
+    Outside a batch the block is rendered normally.
+    """
+    nodelist = parser.parse(('endshared',))
+    parser.delete_first_token()
+    vary_on = [parser.compile_filter(bit) for bit in token.split_contents()[1:]]
+    return SharedNode(nodelist, vary_on)
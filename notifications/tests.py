@@ -0,0 +1,173 @@
+from io import StringIO
+from unittest.mock import patch
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.template import engines
+from django.template.loader import render_to_string
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboundEmail
+from .outbox import LEASE_TIMEOUT, build_email, deliver_pending_emails, enqueue_email, enqueue_many
+from .rendering import get_email_template, render_email_many, render_many, reset_email_templates
+
+
+class FlakyBackend(EmailBackend):
+    """Counts opened connections and rejects mail to one address."""
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any('bounce@example.com' in message.to for message in messages):
+            raise ConnectionError('SMTP stalled')
+        if any('crash@example.com' in message.to for message in messages):
+            raise SystemExit('worker killed')
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        FlakyBackend.opened = 0
+
+    def test_enqueue_does_not_send(self):
+        email = enqueue_email('Hello', 'Body', None, ['user@example.com'], html_message='<p>Body</p>')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(email.status, 'PENDING')
+        self.assertEqual(email.from_email, settings.DEFAULT_FROM_EMAIL)
+
+        self.assertEqual(deliver_pending_emails()['SENT'], 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Body</p>')
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'SENT')
+        self.assertIsNotNone(email.sent_at)
+
+        # Already sent, nothing left to do
+        self.assertEqual(deliver_pending_emails()['SENT'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rolled_back_email_is_never_sent(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue_email('Hello', 'Body', None, ['user@example.com'])
+                raise RuntimeError('checkout failed')
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_one_connection_per_batch_and_retries(self):
+        """Test batching over one connection and backoff for a failing recipient."""
+        enqueue_many([
+            build_email('Hello', 'Body', None, [f'user{i}@example.com']) for i in range(5)
+        ] + [build_email('Hello', 'Body', None, ['bounce@example.com'])])
+
+        with self.settings(EMAIL_BACKEND='notifications.tests.FlakyBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2):
+            counts = deliver_pending_emails(batch_size=10)
+            self.assertEqual(counts, {'SENT': 5, 'PENDING': 1, 'FAILED': 0})
+            self.assertEqual(FlakyBackend.opened, 1)
+
+            bounced = OutboundEmail.objects.get(recipients=['bounce@example.com'])
+            self.assertEqual(bounced.attempts, 1)
+            self.assertIn('SMTP stalled', bounced.last_error)
+            self.assertGreater(bounced.next_attempt_at, timezone.now())
+
+            OutboundEmail.objects.filter(pk=bounced.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_pending_emails()['FAILED'], 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_crash_mid_batch_does_not_resend(self):
+        enqueue_many([
+            build_email('Hello', 'Body', None, [address])
+            for address in ['user1@example.com', 'user2@example.com', 'crash@example.com']
+        ])
+
+        with self.settings(EMAIL_BACKEND='notifications.tests.FlakyBackend'):
+            with self.assertRaises(SystemExit):
+                deliver_pending_emails(batch_size=10)
+        self.assertEqual(OutboundEmail.objects.filter(status='SENT').count(), 2)
+
+        # Once the dead worker's lease runs out only the unsent email goes again
+        OutboundEmail.objects.filter(status='SENDING').update(locked_at=timezone.now() - LEASE_TIMEOUT * 2)
+        self.assertEqual(deliver_pending_emails()['SENT'], 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_command(self):
+        enqueue_email('Hello', 'Body', None, ['user@example.com'])
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+        self.assertIn('sent=1', out.getvalue())
+
+    def test_order_confirmation_is_queued(self):
+        from checkout.views import send_order_confirmation_email
+        from checkout.models import Order
+        from inventory.models import Product
+        product = Product.objects.create(
+            name='Test Product', slug='test-product', description='Test', price=10, sku='TEST-1'
+        )
+        order = Order.objects.create(product=product, amount=10, email='buyer@example.com')
+        with patch('notifications.outbox.get_connection') as get_connection:
+            send_order_confirmation_email(order)
+        get_connection.assert_not_called()
+        self.assertEqual(OutboundEmail.objects.get().recipients, ['buyer@example.com'])
+
+
+class CountingPlan:
+    """Counts how often its features are looked up while rendering."""
+    lookups = 0
+
+    def __init__(self, plan_id):
+        self.plan_id = plan_id
+
+    @property
+    def features(self):
+        CountingPlan.lookups += 1
+        return [f'Feature {self.plan_id}']
+
+
+@override_settings(DEBUG=False)
+class RenderingTests(TestCase):
+    TEMPLATE = (
+        '{% load email_tags %}Hi {{ name }}. '
+        '{% shared plan.plan_id %}{% for f in plan.features %}[{{ f }}]{% endfor %}{% endshared %} '
+        '{% shared %}{{ footer }}{% endshared %}'
+    )
+
+    def setUp(self):
+        """Set up test data."""
+        CountingPlan.lookups = 0
+        reset_email_templates(setting='TEMPLATES')
+        self.template = engines['django'].from_string(self.TEMPLATE).template
+
+    def test_shared_fragments_render_once_per_batch(self):
+        plans = [CountingPlan(1), CountingPlan(2)]
+        contexts = [{'name': f'<user{i}>', 'plan': plans[i % 2]} for i in range(6)]
+        with patch('notifications.rendering.get_email_template', return_value=self.template):
+            rendered = render_many('inline', contexts, shared={'footer': 'Bye'})
+        self.assertEqual(rendered[0], 'Hi &lt;user0&gt;. [Feature 1] Bye')
+        self.assertEqual(rendered[1], 'Hi &lt;user1&gt;. [Feature 2] Bye')
+        self.assertEqual(len(rendered), 6)
+        # Once per distinct plan, not once per recipient
+        self.assertEqual(CountingPlan.lookups, 2)
+
+        with patch('notifications.rendering.get_email_template', return_value=self.template):
+            render_many('inline', contexts[:1])
+        self.assertEqual(CountingPlan.lookups, 3)
+
+    def test_templates_compiled_once(self):
+        with patch.object(engines['django'], 'get_template', wraps=engines['django'].get_template) as get_template:
+            first = get_email_template('subscriptions/emails/payment_failed.html')
+            self.assertIs(get_email_template('subscriptions/emails/payment_failed.html'), first)
+            render_email_many('subscriptions/emails/trial_ended', [{}, {}])
+            render_email_many('subscriptions/emails/trial_ended', [{}])
+        self.assertEqual(get_template.call_count, 3)
+
+    def test_matches_render_to_string(self):
+        context = {'user': {'first_name': 'Ada'}, 'subscription': {'plan': {'name': 'Gold', 'features': ['A']}}}
+        text, html = render_email_many('subscriptions/emails/trial_ended', [context])[0]
+        self.assertEqual(html, render_to_string('subscriptions/emails/trial_ended.html', context))
+        self.assertEqual(text, render_to_string('subscriptions/emails/trial_ended.txt', context))
+        self.assertIn('- A\n', text)
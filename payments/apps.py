@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PaymentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'payments'
+
+    def ready(self):
+        from .client import configure_stripe
+        configure_stripe()
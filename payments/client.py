@@ -0,0 +1,107 @@
+"""
+Process-wide Stripe client setup and call metrics.
+
+configure_stripe() runs once from PaymentsConfig.ready(). It sets the API
+key and installs a keep-alive requests session with a bounded connection
+pool, timeouts and retries, so checkout redirects reuse warm TLS
+connections instead of opening a new one per call. StripeGateway reports
+every API call to `metrics` so latency can be inspected per operation.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+STRIPE_SETTINGS = (
+    'STRIPE_SECRET_KEY', 'STRIPE_TIMEOUT', 'STRIPE_MAX_NETWORK_RETRIES', 'STRIPE_CONNECTION_POOL_SIZE'
+)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def build_http_client():
+    pool_size = getattr(settings, 'STRIPE_CONNECTION_POOL_SIZE', 10)
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, pool_block=False
+    ))
+    return stripe.RequestsClient(timeout=getattr(settings, 'STRIPE_TIMEOUT', (3, 15)), session=session)
+
+
+def configure_stripe():
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    # Stripe retries are idempotent: the library sends an Idempotency-Key with each retried POST
+    stripe.max_network_retries = getattr(settings, 'STRIPE_MAX_NETWORK_RETRIES', 2)
+    stripe.default_http_client = build_http_client()
+
+
+@receiver(setting_changed)
+def reconfigure_stripe(setting, **kwargs):
+    if setting in STRIPE_SETTINGS:
+        configure_stripe()
+
+
+class CallMetrics:
+    """Latency of recent Stripe calls, kept per operation in a bounded window."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def record(self, operation, seconds, ok=True):
+        with self._lock:
+            stats = self._calls.setdefault(
+                operation, {'count': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)}
+            )
+            stats['count'] += 1
+            stats['latencies'].append(seconds)
+            if not ok:
+                stats['errors'] += 1
+
+    @contextmanager
+    def timed(self, operation):
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed = time.perf_counter() - started
+            self.record(operation, elapsed, ok)
+            logger.debug(f"Stripe {operation} took {elapsed * 1000:.1f}ms (ok={ok})")
+
+    def snapshot(self):
+        """Return {operation: {count, errors, p50_ms, p99_ms}} over the window."""
+        with self._lock:
+            calls = {operation: dict(stats, latencies=list(stats['latencies']))
+                     for operation, stats in self._calls.items()}
+        return {
+            operation: {
+                'count': stats['count'],
+                'errors': stats['errors'],
+                'p50_ms': round(percentile(stats['latencies'], 0.50) * 1000, 2),
+                'p99_ms': round(percentile(stats['latencies'], 0.99) * 1000, 2),
+            }
+            for operation, stats in calls.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+
+
+metrics = CallMetrics()
@@ -0,0 +1,124 @@
+"""
+In-process stand-in for Stripe.
+
+Select it with PAYMENT_GATEWAY = 'payments.fake.FakeStripeGateway'. It keeps
+sessions and subscriptions in memory, never touches the network, and signs
+webhook payloads the way Stripe does, so stripe_webhook verifies them with
+the real signature check.
+"""
+import copy
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+import stripe
+from .gateway import PaymentGateway
+
+SUBSCRIPTION_PERIOD = 30 * 24 * 60 * 60
+
+
+class FakeStripeGateway(PaymentGateway):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.sessions = {}
+        self.subscriptions = {}
+
+    def _new_id(self, prefix):
+        with self._lock:
+            return f'{prefix}_fake{next(self._ids):010d}'
+
+    def _object(self, data):
+        return stripe.StripeObject.construct_from(copy.deepcopy(data), 'sk_test_fake')
+
+    def _get(self, store, object_type, object_id):
+        with self._lock:
+            data = store.get(object_id)
+        if data is None:
+            raise stripe.error.InvalidRequestError(f"No such {object_type}: '{object_id}'", 'id')
+        return data
+
+    def create_checkout_session(self, **params):
+        session_id = self._new_id('cs')
+        mode = params.get('mode', 'payment')
+        data = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'mode': mode,
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'url': f'https://checkout.stripe.fake/pay/{session_id}',
+            'amount_total': sum(
+                item['price_data']['unit_amount'] * item.get('quantity', 1)
+                for item in params.get('line_items', [])
+                if 'price_data' in item
+            ),
+            'payment_intent': self._new_id('pi') if mode == 'payment' else None,
+            'subscription': None,
+            'customer': params.get('customer') or self._new_id('cus'),
+            'customer_email': params.get('customer_email'),
+            'client_reference_id': params.get('client_reference_id'),
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+            'metadata': {key: str(value) for key, value in params.get('metadata', {}).items()},
+            'created': int(time.time()),
+        }
+        with self._lock:
+            self.sessions[session_id] = data
+        return self._object(data)
+
+    def retrieve_checkout_session(self, session_id):
+        return self._object(self._get(self.sessions, 'checkout.session', session_id))
+
+    def create_subscription(self, **params):
+        subscription_id = self._new_id('sub')
+        now = int(time.time())
+        data = {
+            'id': subscription_id,
+            'object': 'subscription',
+            'status': 'active',
+            'customer': params.get('customer'),
+            'metadata': {key: str(value) for key, value in params.get('metadata', {}).items()},
+            'current_period_start': now,
+            'current_period_end': now + SUBSCRIPTION_PERIOD,
+            'created': now,
+        }
+        with self._lock:
+            self.subscriptions[subscription_id] = data
+        return self._object(data)
+
+    def retrieve_subscription(self, subscription_id):
+        return self._object(self._get(self.subscriptions, 'subscription', subscription_id))
+
+    def complete_checkout_session(self, session_id):
+        """Pay for a session as the hosted checkout page would. Returns the session."""
+        data = self._get(self.sessions, 'checkout.session', session_id)
+        if data['mode'] == 'subscription' and data['subscription'] is None:
+            subscription = self.create_subscription(customer=data['customer'], metadata=data['metadata'])
+            data['subscription'] = subscription.id
+        data['status'] = 'complete'
+        data['payment_status'] = 'paid'
+        return self._object(data)
+
+    def build_event(self, event_type, obj):
+        """A Stripe event dict wrapping obj (a Stripe object or plain dict)."""
+        if isinstance(obj, stripe.StripeObject):
+            obj = obj.to_dict_recursive() if hasattr(obj, 'to_dict_recursive') else obj.to_dict()
+        return {
+            'id': self._new_id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': obj},
+        }
+
+    def sign_webhook(self, event, secret, timestamp=None):
+        """Return (payload, Stripe-Signature header) for an event dict."""
+        payload = json.dumps(event)
+        timestamp = timestamp or int(time.time())
+        signature = hmac.new(
+            secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+        return payload, f't={timestamp},v1={signature}'
@@ -0,0 +1,76 @@
+"""
+Payment gateway used by the checkout and subscription views.
+
+Views call get_gateway() rather than the stripe module directly, so the
+PAYMENT_GATEWAY setting can swap in payments.fake.FakeStripeGateway for
+tests and load tests. Every gateway returns Stripe objects and raises
+stripe.error exceptions, so view code handles them the same way.
+"""
+from functools import lru_cache
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from .client import metrics
+
+DEFAULT_GATEWAY = 'payments.gateway.StripeGateway'
+
+
+class PaymentGateway:
+    """The subset of the Stripe API the site uses."""
+    is_configured = True
+
+    def create_checkout_session(self, **params):
+        raise NotImplementedError
+
+    def retrieve_checkout_session(self, session_id):
+        raise NotImplementedError
+
+    def create_subscription(self, **params):
+        raise NotImplementedError
+
+    def retrieve_subscription(self, subscription_id):
+        raise NotImplementedError
+
+    def construct_webhook_event(self, payload, sig_header, secret):
+        """Verify a webhook signature and parse the event. Needs no network access."""
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
+
+
+class StripeGateway(PaymentGateway):
+    """
+    Talks to the real Stripe API through the shared client configured in
+    payments.client, recording each call's latency.
+    """
+
+    @property
+    def is_configured(self):
+        return bool(settings.STRIPE_SECRET_KEY)
+
+    def create_checkout_session(self, **params):
+        with metrics.timed('checkout.session.create'):
+            return stripe.checkout.Session.create(**params)
+
+    def retrieve_checkout_session(self, session_id):
+        with metrics.timed('checkout.session.retrieve'):
+            return stripe.checkout.Session.retrieve(session_id)
+
+    def create_subscription(self, **params):
+        with metrics.timed('subscription.create'):
+            return stripe.Subscription.create(**params)
+
+    def retrieve_subscription(self, subscription_id):
+        with metrics.timed('subscription.retrieve'):
+            return stripe.Subscription.retrieve(subscription_id)
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    return import_string(getattr(settings, 'PAYMENT_GATEWAY', DEFAULT_GATEWAY))()
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    if setting == 'PAYMENT_GATEWAY':
+        get_gateway.cache_clear()
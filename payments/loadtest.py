@@ -0,0 +1,181 @@
+"""
+Load test for the checkout, subscription and webhook flows.
+
+Requests go through the Django test client against FakeStripeGateway, so
+what gets measured is our own view, ORM and template cost, not Stripe's.
+Each flow is timed on its own and reports p50/p99 latency and the number of
+database queries per request.
+"""
+import queue
+import random
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from inventory.models import Product
+from subscriptions.models import SubscriptionPlan, WebhookEvent
+from .client import percentile
+from .fake import FakeStripeGateway
+from .gateway import get_gateway
+
+User = get_user_model()
+
+FLOWS = ('product_checkout', 'cart_checkout', 'subscription_checkout', 'webhook')
+FAKE_CHECKOUT_URL = 'https://checkout.stripe.fake/'
+
+
+class FlowStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, queries, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.queries.append(queries)
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        count = len(self.latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 2),
+            'mean_queries': round(sum(self.queries) / count, 1) if count else 0,
+            'max_queries': max(self.queries, default=0),
+        }
+
+
+class PaymentsLoadTest:
+    """
+    Drive `iterations` requests per flow from `concurrency` threads. Needs
+    PAYMENT_GATEWAY set to the fake and a database it may write to. With a
+    concurrency of 1 everything runs in the calling thread, so it also works
+    inside a TestCase transaction.
+    """
+
+    def __init__(self, iterations=1000, concurrency=8, flows=FLOWS,
+                 redelivery_rate=0.1, webhook_secret='whsec_loadtest'):
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.flows = flows
+        self.redelivery_rate = redelivery_rate
+        self.webhook_secret = webhook_secret
+        self.gateway = get_gateway()
+        if not isinstance(self.gateway, FakeStripeGateway):
+            raise RuntimeError('The load test must run against payments.fake.FakeStripeGateway')
+
+    def seed(self):
+        self.product = Product.objects.create(
+            name='Load Test Product', slug='load-test-product', description='Load test',
+            price=19.99, sku='LOADTEST-1', stock=1000000
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Load Test Plan', plan_type='PREMIUM', description='Load test', price=29.99
+        )
+        self.users = [
+            User.objects.create_user(username=f'loadtest{i}', email=f'loadtest{i}@example.com')
+            for i in range(self.concurrency)
+        ]
+
+    def _client(self, worker):
+        client = Client()
+        client.force_login(self.users[worker])
+        # The cart checkout reuses this cart on every request
+        client.get(
+            reverse('inventory:add_to_cart', args=['product', self.product.id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', secure=True
+        )
+        return client
+
+    def _webhook_payloads(self):
+        payloads = []
+        for _ in range(self.iterations):
+            if payloads and random.random() < self.redelivery_rate:
+                payloads.append(random.choice(payloads))
+                continue
+            session = self.gateway.create_checkout_session(
+                mode='subscription',
+                metadata={'user_id': self.users[0].id, 'plan_id': self.plan.id}
+            )
+            session = self.gateway.complete_checkout_session(session.id)
+            event = self.gateway.build_event('checkout.session.completed', session)
+            payloads.append(self.gateway.sign_webhook(event, self.webhook_secret))
+        return payloads
+
+    def _request(self, flow, client, payload):
+        if flow == 'product_checkout':
+            response = client.post(
+                reverse('create-checkout-session', args=[self.product.id]), secure=True
+            )
+            return response.status_code == 302 and response.url.startswith(FAKE_CHECKOUT_URL)
+        if flow == 'cart_checkout':
+            response = client.post(reverse('create_checkout_session'), secure=True)
+            return response.status_code == 200 and 'id' in response.json()
+        if flow == 'subscription_checkout':
+            response = client.post(reverse('subscriptions:create', args=[self.plan.id]), secure=True)
+            return response.status_code == 302 and response.url.startswith(FAKE_CHECKOUT_URL)
+        body, signature = payload
+        response = client.post(
+            reverse('subscriptions:webhook'), data=body, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature, secure=True
+        )
+        return response.status_code == 200
+
+    def _work(self, worker, flow, jobs, stats):
+        client = self._client(worker)
+        while True:
+            try:
+                payload = jobs.get_nowait()
+            except queue.Empty:
+                return
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                try:
+                    ok = self._request(flow, client, payload)
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - started
+            stats.record(elapsed, len(queries), ok)
+
+    def _thread(self, worker, flow, jobs, stats):
+        try:
+            self._work(worker, flow, jobs, stats)
+        finally:
+            connections.close_all()
+
+    def run_flow(self, flow):
+        stats = FlowStats(flow)
+        jobs = queue.Queue()
+        payloads = self._webhook_payloads() if flow == 'webhook' else [None] * self.iterations
+        for payload in payloads:
+            jobs.put(payload)
+
+        if self.concurrency == 1:
+            self._work(0, flow, jobs, stats)
+        else:
+            threads = [
+                threading.Thread(target=self._thread, args=(worker, flow, jobs, stats))
+                for worker in range(self.concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return stats.summary()
+
+    def run(self):
+        """Seed data, run every flow and return {flow: summary}."""
+        self.seed()
+        results = {flow: self.run_flow(flow) for flow in self.flows}
+        if 'webhook' in results:
+            results['webhook']['events_stored'] = WebhookEvent.objects.count()
+        return results
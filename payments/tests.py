@@ -0,0 +1,133 @@
+from decimal import Decimal
+from unittest.mock import patch
+import stripe
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from subscriptions.models import SubscriptionPlan
+from .client import metrics
+from .fake import FakeStripeGateway
+from .gateway import StripeGateway, get_gateway
+from .loadtest import FLOWS, PaymentsLoadTest
+
+User = get_user_model()
+
+FAKE_GATEWAY = 'payments.fake.FakeStripeGateway'
+
+
+class FakeStripeGatewayTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.gateway = FakeStripeGateway()
+
+    def test_checkout_session_round_trip(self):
+        session = self.gateway.create_checkout_session(
+            mode='payment',
+            line_items=[{'price_data': {'currency': 'eur', 'unit_amount': 1999}, 'quantity': 2}],
+            metadata={'order_id': 7}
+        )
+        self.assertTrue(session.url.startswith('https://checkout.stripe.fake/'))
+        self.assertEqual(session.amount_total, 3998)
+        self.assertEqual(session.metadata['order_id'], '7')
+
+        retrieved = self.gateway.retrieve_checkout_session(session.id)
+        self.assertEqual(retrieved.payment_status, 'unpaid')
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            self.gateway.retrieve_checkout_session('cs_missing')
+
+    def test_completing_subscription_checkout(self):
+        session = self.gateway.create_checkout_session(mode='subscription', metadata={'plan_id': 1})
+        session = self.gateway.complete_checkout_session(session.id)
+        self.assertEqual(session.payment_status, 'paid')
+        subscription = self.gateway.retrieve_subscription(session.subscription)
+        self.assertEqual(subscription.status, 'active')
+        self.assertGreater(subscription.current_period_end, subscription.current_period_start)
+
+    def test_signed_webhooks_verify(self):
+        event = self.gateway.build_event('invoice.payment_succeeded', {'id': 'in_1', 'object': 'invoice'})
+        payload, signature = self.gateway.sign_webhook(event, 'whsec_test')
+        parsed = self.gateway.construct_webhook_event(payload, signature, 'whsec_test')
+        self.assertEqual((parsed.id, parsed.type), (event['id'], 'invoice.payment_succeeded'))
+        with self.assertRaises(stripe.error.SignatureVerificationError):
+            self.gateway.construct_webhook_event(payload, signature, 'whsec_other')
+
+    def test_gateway_setting(self):
+        self.assertIsInstance(get_gateway(), StripeGateway)
+        with override_settings(PAYMENT_GATEWAY=FAKE_GATEWAY):
+            self.assertIsInstance(get_gateway(), FakeStripeGateway)
+            self.assertIs(get_gateway(), get_gateway())
+        self.assertIsInstance(get_gateway(), StripeGateway)
+
+
+class StripeClientTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_configured_once_with_pooled_client(self):
+        client = stripe.default_http_client
+        self.assertIsInstance(client, stripe.RequestsClient)
+        self.assertEqual(stripe.api_key, settings.STRIPE_SECRET_KEY)
+        self.assertEqual(stripe.max_network_retries, settings.STRIPE_MAX_NETWORK_RETRIES)
+        adapter = client._session.get_adapter('https://api.stripe.com')
+        self.assertEqual(adapter._pool_maxsize, settings.STRIPE_CONNECTION_POOL_SIZE)
+
+        with override_settings(STRIPE_SECRET_KEY='sk_test_other'):
+            self.assertEqual(stripe.api_key, 'sk_test_other')
+        self.assertEqual(stripe.api_key, settings.STRIPE_SECRET_KEY)
+
+    def test_calls_are_timed(self):
+        gateway = StripeGateway()
+        with patch('stripe.checkout.Session.create', return_value={'id': 'cs_1'}):
+            gateway.create_checkout_session(mode='payment')
+            gateway.create_checkout_session(mode='payment')
+        with patch('stripe.Subscription.retrieve', side_effect=stripe.error.APIConnectionError('down')):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                gateway.retrieve_subscription('sub_1')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['checkout.session.create']['count'], 2)
+        self.assertEqual(snapshot['checkout.session.create']['errors'], 0)
+        self.assertEqual(snapshot['subscription.retrieve']['errors'], 1)
+        self.assertGreaterEqual(snapshot['subscription.retrieve']['p99_ms'], 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, PAYMENT_GATEWAY=FAKE_GATEWAY)
+class GatewayViewTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=Decimal('19.99')
+        )
+
+    def test_create_subscription_uses_gateway(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('subscriptions:create', args=[self.plan.id]))
+        self.assertEqual(response.status_code, 302)
+        session = get_gateway().retrieve_checkout_session(response.url.rsplit('/', 1)[1])
+        self.assertEqual(session.mode, 'subscription')
+        self.assertEqual(session.metadata['plan_id'], str(self.plan.id))
+        self.assertEqual(session.customer_email, 'test@example.com')
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='whsec_loadtest')
+    def test_load_test_harness(self):
+        """Test a small single-threaded run of every flow."""
+        results = PaymentsLoadTest(
+            iterations=5, concurrency=1, redelivery_rate=0.5, webhook_secret='whsec_loadtest'
+        ).run()
+        self.assertEqual(list(results), list(FLOWS))
+        for summary in results.values():
+            self.assertEqual(summary['requests'], 5)
+            self.assertEqual(summary['errors'], 0)
+            self.assertGreater(summary['mean_queries'], 0)
+        self.assertLessEqual(results['webhook']['events_stored'], 5)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SubscriptionPlan, UserSubscription, PaymentRecord, TrialUsageStats
+from .models import SubscriptionPlan, UserSubscription, PaymentRecord, TrialUsageStats, TrialNotification, WebhookEvent
 
 @admin.register(SubscriptionPlan)
 class SubscriptionPlanAdmin(admin.ModelAdmin):
@@ -31,3 +31,17 @@ class TrialUsageStatsAdmin(admin.ModelAdmin):
     search_fields = ('subscription__user__email',)
     readonly_fields = ('created_at',)
     raw_id_fields = ('subscription',)
+
+@admin.register(TrialNotification)
+class TrialNotificationAdmin(admin.ModelAdmin):
+    list_display = ('subscription', 'kind', 'created_at')
+    list_filter = ('kind',)
+    raw_id_fields = ('subscription',)
+    readonly_fields = ('created_at',)
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('stripe_event_id', 'event_type', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('stripe_event_id',)
+    readonly_fields = ('created_at', 'processed_at', 'locked_at')
@@ -0,0 +1,94 @@
+"""
+Per-request lookup of a user's current subscription.
+
+The result is memoized on the request and backed by a short-lived per-user
+cache entry. With REDIS_URL set (see CACHES) that entry is shared, so an
+invalidation made by the queue worker reaches every web process. Without it
+each process has its own LocMemCache, and a web process can keep serving a
+subscription the worker changed until SUBSCRIPTION_STATUS_CACHE_TIMEOUT
+expires.
+
+Saving or deleting a UserSubscription (including from the Stripe webhooks)
+drops the cache entry once the transaction commits. queryset.update() and
+bulk_update() send no signals, so code that changes subscriptions in bulk
+must call invalidate_active_subscriptions() for the users it touched, as
+subscriptions.renewals does.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import UserSubscription
+
+REQUEST_ATTR = '_current_subscriptions'
+
+
+def get_cache_timeout():
+    return getattr(settings, 'SUBSCRIPTION_STATUS_CACHE_TIMEOUT', 60)
+
+
+def cache_key(user_id):
+    return f'subscriptions:current:{user_id}'
+
+
+def invalidate_active_subscription(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def invalidate_active_subscriptions(user_ids):
+    """
+    Required after queryset.update() or bulk_update() on UserSubscription,
+    which bypass the post_save receiver. Call it from transaction.on_commit.
+    """
+    cache.delete_many([cache_key(user_id) for user_id in set(user_ids)])
+
+
+def load_current_subscriptions(user_id, now):
+    """Return (active, trial) for a user, either of which may be None."""
+    active = trial = None
+    for subscription in UserSubscription.objects.filter(
+        user_id=user_id,
+        status__in=['ACTIVE', 'TRIAL'],
+        end_date__gt=now
+    ).select_related('plan'):
+        if subscription.status == 'ACTIVE' and active is None:
+            active = subscription
+        elif subscription.status == 'TRIAL' and trial is None:
+            trial = subscription
+    return active, trial
+
+
+def _current_subscriptions(request):
+    current = getattr(request, REQUEST_ATTR, None)
+    if current is not None:
+        return current
+
+    now = timezone.now()
+    key = cache_key(request.user.id)
+    current = cache.get(key)
+    if current is None:
+        current = load_current_subscriptions(request.user.id, now)
+        cache.set(key, current, timeout=get_cache_timeout())
+
+    # A cached row may have run out since it was stored
+    current = tuple(
+        subscription if subscription is not None and subscription.end_date > now else None
+        for subscription in current
+    )
+    for subscription in current:
+        if subscription is not None:
+            subscription.evaluated_at = now
+    setattr(request, REQUEST_ATTR, current)
+    return current
+
+
+def get_active_subscription(request, include_trial=False):
+    """
+    The user's active subscription, or None for anonymous users and users
+    without one. With include_trial, a running trial counts too.
+    """
+    if not request.user.is_authenticated:
+        return None
+    active, trial = _current_subscriptions(request)
+    if active is None and include_trial:
+        return trial
+    return active
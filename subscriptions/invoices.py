@@ -0,0 +1,223 @@
+"""
+Invoice PDFs.
+
+handle_invoice_payment_succeeded only records the payment; its invoice_pdf
+is empty until rendered, and is cleared again if a later event changes the
+payment's details. The render_invoices worker picks up paid records without a
+PDF and renders them ahead of the first download. PDFs are built with
+ReportLab's invariant mode, so the same invoice always produces the same
+bytes. They are stored under their SHA-256, which makes the file name a
+strong ETag and lets identical renders share one file. A file is deleted
+once the record clearing it commits and no other record points at it; a
+render that lost the race to such a change leaves its file behind.
+
+The style sheet and table style are built once per process and shared by
+every invoice. The document uses ReportLab's built-in Helvetica fonts, so
+there are no fonts to load.
+"""
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from .models import PaymentRecord
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DIR = 'invoices'
+
+
+@lru_cache(maxsize=None)
+def invoice_styles():
+    """Paragraph styles for invoices, built once per process."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        'InvoiceTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=colors.HexColor('#2c3e50')
+    ))
+    styles.add(ParagraphStyle(
+        'InvoiceFooter',
+        parent=styles['Normal'],
+        alignment=1,
+        textColor=colors.HexColor('#7f8c8d')
+    ))
+    return styles
+
+
+TABLE_STYLE = TableStyle([
+    # Header
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+    # Body
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bdc3c7')),
+
+    # Total row
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 14),
+])
+
+
+def render_invoice_pdf(payment_record):
+    """Build the invoice PDF for a payment record and return its bytes."""
+    styles = invoice_styles()
+    buffer = BytesIO()
+    # invariant drops the creation date and random document id from the output
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72,
+        invariant=1
+    )
+
+    elements = []
+
+    # Add company information
+    elements.append(Paragraph("FitFusion", styles["InvoiceTitle"]))
+    elements.append(Paragraph("123 Fitness Street", styles["Normal"]))
+    elements.append(Paragraph("Fitness City, FC 12345", styles["Normal"]))
+    elements.append(Paragraph("Phone: (555) 123-4567", styles["Normal"]))
+    elements.append(Paragraph("Email: billing@fitfusion.com", styles["Normal"]))
+    elements.append(Spacer(1, 30))
+
+    # Add invoice information
+    elements.append(Paragraph("INVOICE", styles["Heading1"]))
+    elements.append(Paragraph(f"Invoice Number: {payment_record.invoice_number}", styles["Normal"]))
+    elements.append(Paragraph(f"Date: {payment_record.payment_date.strftime('%B %d, %Y')}", styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # Add customer information
+    customer = payment_record.subscription.user
+    elements.append(Paragraph("Bill To:", styles["Heading3"]))
+    elements.append(Paragraph(customer.get_full_name() or customer.email, styles["Normal"]))
+    elements.append(Paragraph(customer.email, styles["Normal"]))
+    if hasattr(customer, 'profile') and customer.profile.address:
+        elements.append(Paragraph(customer.profile.address, styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # Add payment details
+    data = [
+        ['Description', 'Amount'],
+        [f"Subscription: {payment_record.subscription.plan.name}", f"${payment_record.amount}"],
+        ['', ''],
+        ['Subtotal', f"${payment_record.amount}"],
+        ['Tax (0%)', '$0.00'],
+        ['Total', f"${payment_record.amount}"]
+    ]
+    table = Table(data, colWidths=[4*inch, 2*inch])
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+    elements.append(Spacer(1, 30))
+
+    # Add payment status and details
+    elements.append(Paragraph("Payment Information", styles["Heading3"]))
+    elements.append(Paragraph(f"Status: {payment_record.get_status_display()}", styles["Normal"]))
+    if payment_record.stripe_payment_id:
+        elements.append(Paragraph(f"Payment ID: {payment_record.stripe_payment_id}", styles["Normal"]))
+    elements.append(Spacer(1, 20))
+
+    # Add terms and conditions
+    elements.append(Paragraph("Terms & Conditions", styles["Heading3"]))
+    elements.append(Paragraph(
+        "This invoice is automatically generated and is valid without signature. "
+        "Payment is due upon receipt. For any questions regarding this invoice, "
+        "please contact our billing department.",
+        styles["Normal"]
+    ))
+
+    # Add footer
+    elements.append(Spacer(1, 50))
+    elements.append(Paragraph("Thank you for your business!", styles["InvoiceFooter"]))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def invoice_etag(name):
+    """The content hash a stored invoice is named after, or None."""
+    if not name:
+        return None
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def store_invoice_pdf(payment_record):
+    """
+    Render the invoice, store it under its content hash and point the record
+    at it. Returns the storage name. If the record was changed while the PDF
+    was being rendered, the record is left alone for the next pass.
+    """
+    content = render_invoice_pdf(payment_record)
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'{INVOICE_DIR}/{digest[:2]}/{digest}.pdf'
+
+    storage = payment_record.invoice_pdf.storage
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(content))
+
+    updated = PaymentRecord.objects.filter(
+        pk=payment_record.pk, updated_at=payment_record.updated_at
+    ).update(invoice_pdf=name)
+    if updated:
+        payment_record.invoice_pdf.name = name
+    return name
+
+
+def delete_unreferenced_invoice_pdf(name):
+    """Delete a stored invoice unless a payment record still points at it."""
+    if name and not PaymentRecord.objects.filter(invoice_pdf=name).exists():
+        PaymentRecord._meta.get_field('invoice_pdf').storage.delete(name)
+
+
+def pending_invoices():
+    return PaymentRecord.objects.filter(
+        Q(invoice_pdf='') | Q(invoice_pdf__isnull=True), status='SUCCEEDED'
+    )
+
+
+def render_pending_invoices(batch_size=50):
+    """Render PDFs for paid records that have none. Returns {'rendered': n, 'failed': n}."""
+    counts = {'rendered': 0, 'failed': 0}
+    after_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                pending_invoices()
+                .filter(id__gt=after_id)
+                .select_related('subscription__user', 'subscription__plan')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('id')[:batch_size]
+            )
+            for payment_record in batch:
+                try:
+                    with transaction.atomic():
+                        store_invoice_pdf(payment_record)
+                    counts['rendered'] += 1
+                except Exception as e:
+                    logger.error(f"Failed to render invoice {payment_record.invoice_number}: {str(e)}")
+                    counts['failed'] += 1
+        if not batch:
+            return counts
+        after_id = batch[-1].id
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from notifications.rendering import find_email_template, render_email_many
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from subscriptions.utils import trial_reminder_message
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Compare per-email render_to_string() with the batched email renderer. '
+            'Builds unsaved users and subscriptions in memory, so no database rows are written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000,
+                            help='Emails rendered per run')
+        parser.add_argument('--plans', type=int, default=3,
+                            help='Distinct plans shared across the recipients')
+
+    def build_messages(self, recipients, plans):
+        plans = [
+            SubscriptionPlan(
+                id=i, name=f'Plan {i}', plan_type='PREMIUM', price=Decimal('29.99'),
+                features=[f'Feature {n}' for n in range(8)]
+            )
+            for i in range(1, plans + 1)
+        ]
+        trial_end = timezone.now() + timedelta(days=3)
+        messages = []
+        for i in range(recipients):
+            user = User(id=i, username=f'user{i}', first_name=f'User {i}', email=f'user{i}@example.com')
+            subscription = UserSubscription(
+                id=i, user=user, plan=plans[i % len(plans)], is_trial=True, trial_end_date=trial_end
+            )
+            messages.append(trial_reminder_message(user, subscription, 3))
+        return messages
+
+    def render_one_by_one(self, name, contexts):
+        has_text = find_email_template(f'{name}.txt') is not None
+        for context in contexts:
+            html = render_to_string(f'{name}.html', context)
+            if has_text:
+                render_to_string(f'{name}.txt', context)
+            else:
+                strip_tags(html)
+
+    def report(self, label, count, seconds):
+        self.stdout.write(f'{label:<20} {count} emails in {seconds:.2f}s: {count / seconds:,.0f} emails/s')
+
+    def handle(self, *args, **options):
+        name = 'subscriptions/emails/trial_reminder'
+        messages = self.build_messages(options['recipients'], options['plans'])
+        contexts = [dict(context, user=user) for user, subject, context in messages]
+        count = len(contexts)
+
+        # Warm both paths so template compilation is not counted against either
+        self.render_one_by_one(name, contexts[:1])
+        render_email_many(name, contexts[:1])
+
+        started = time.perf_counter()
+        self.render_one_by_one(name, contexts)
+        baseline = time.perf_counter() - started
+        self.report('render_to_string', count, baseline)
+
+        started = time.perf_counter()
+        render_email_many(name, contexts)
+        batched = time.perf_counter() - started
+        self.report('render_email_many', count, batched)
+
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {baseline / batched:.1f}x'))
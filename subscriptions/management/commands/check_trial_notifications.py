@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from subscriptions.trials import send_trial_notifications
+
+
+class Command(BaseCommand):
+    help = ('Queues trial reminder (3 days and 1 day left) and trial ended emails that are due. '
+            'Sent emails are recorded, so it is safe to run as often as you like.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Trials notified per transaction')
+
+    def handle(self, *args, **options):
+        counts = send_trial_notifications(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Trial notifications: ' + ', '.join(f'{kind.lower()}={count}' for kind, count in counts.items())
+        ))
@@ -0,0 +1,12 @@
+from ecommerce_site.queues import QueueWorkerCommand
+from subscriptions.webhooks import process_pending_events
+
+
+class Command(QueueWorkerCommand):
+    help = 'Process queued Stripe webhook events'
+    label = 'Webhook events'
+    default_interval = 2.0
+    batch_size_help = 'Events claimed per batch'
+
+    def run(self, batch_size):
+        return process_pending_events(batch_size=batch_size)
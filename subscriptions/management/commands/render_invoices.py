@@ -0,0 +1,13 @@
+from ecommerce_site.queues import QueueWorkerCommand
+from subscriptions.invoices import render_pending_invoices
+
+
+class Command(QueueWorkerCommand):
+    help = 'Pre-render invoice PDFs for paid invoices that do not have one yet'
+    label = 'Invoices'
+    default_batch_size = 50
+    default_interval = 10.0
+    batch_size_help = 'Invoices locked and rendered per transaction'
+
+    def run(self, batch_size):
+        return render_pending_invoices(batch_size=batch_size)
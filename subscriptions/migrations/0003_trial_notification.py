@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_webhook_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrialNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('REMINDER_3', 'Trial ends in 3 days'), ('REMINDER_1', 'Trial ends in 1 day'), ('ENDED', 'Trial ended')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['is_trial', 'trial_end_date'], name='subscription_trial_end_idx'),
+        ),
+        migrations.AddField(
+            model_name='trialnotification',
+            name='subscription',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trial_notifications', to='subscriptions.usersubscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='trialnotification',
+            constraint=models.UniqueConstraint(fields=('subscription', 'kind'), name='unique_trial_notification'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils import timezone
 import stripe
@@ -44,6 +46,35 @@ class SubscriptionPlan(models.Model):
     def get_features_list(self):
         return json.loads(self.features) if isinstance(self.features, str) else self.features
 
+class UserSubscriptionQuerySet(models.QuerySet):
+    """
+    Status filters for subscriptions. Every instance fetched from a queryset
+    built with active() or evaluated_at() checks its status against the same
+    timestamp the rows were filtered with.
+    """
+    _evaluated_at = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._evaluated_at = self._evaluated_at
+        return clone
+
+    def _fetch_all(self):
+        super()._fetch_all()
+        if self._evaluated_at is not None:
+            for obj in self._result_cache:
+                if isinstance(obj, UserSubscription):
+                    obj.evaluated_at = self._evaluated_at
+
+    def evaluated_at(self, now):
+        clone = self._chain()
+        clone._evaluated_at = now
+        return clone
+
+    def active(self, now=None):
+        now = now or timezone.now()
+        return self.filter(status='ACTIVE', end_date__gt=now).evaluated_at(now)
+
 class UserSubscription(models.Model):
     """
     Represents a user's subscription to a specific plan.
@@ -69,33 +100,59 @@ class UserSubscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UserSubscriptionQuerySet.as_manager()
+
+    _evaluated_at = None
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_trial', 'trial_end_date'], name='subscription_trial_end_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
 
+    @property
+    def evaluated_at(self):
+        """
+        The moment status checks are made against. Fixed on first use so
+        is_active, get_remaining_days and get_progress_percentage agree for
+        the lifetime of the instance (in practice, one request).
+        """
+        if self._evaluated_at is None:
+            self._evaluated_at = timezone.now()
+        return self._evaluated_at
+
+    @evaluated_at.setter
+    def evaluated_at(self, now):
+        self._evaluated_at = now
+
     @property
     def is_active(self):
-        is_active = self.status == 'ACTIVE' and self.end_date > timezone.now()
-        print(f"DEBUG: UserSubscription {self.id} is_active check:")
-        print(f"  - status: {self.status}")
-        print(f"  - end_date: {self.end_date}")
-        print(f"  - current_time: {timezone.now()}")
-        print(f"  - end_date > current_time: {self.end_date > timezone.now()}")
-        print(f"  - is_active result: {is_active}")
+        is_active = self.status == 'ACTIVE' and self.end_date > self.evaluated_at
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "UserSubscription %s is_active=%s (status=%s, end_date=%s, now=%s)",
+                self.id, is_active, self.status, self.end_date, self.evaluated_at
+            )
         return is_active
 
     @property
     def can_renew(self):
-        return self.status == 'CANCELLED' and self.end_date > timezone.now()
+        return self.status == 'CANCELLED' and self.end_date > self.evaluated_at
 
     def get_remaining_days(self):
         if not self.is_active:
             return 0
-        remaining = self.end_date - timezone.now()
+        remaining = self.end_date - self.evaluated_at
         return max(0, remaining.days)
 
+    def get_trial_remaining_days(self):
+        if not self.is_trial or not self.trial_end_date or self.trial_end_date <= self.evaluated_at:
+            return 0
+        return (self.trial_end_date - self.evaluated_at).days
+
     def get_progress_percentage(self):
         if not self.is_active:
             return 100
@@ -114,6 +171,26 @@ class UserSubscription(models.Model):
             return True
         return False
 
+    def renew_subscription(self):
+        """
+        Extend an active, auto-renewing subscription by one billing period.
+        The renew_subscriptions command does the same for many rows at once.
+        """
+        from .renewals import next_period_end
+        if self.status != 'ACTIVE' or not self.auto_renew:
+            return False
+        self.start_date, self.end_date = self.end_date, next_period_end(self)
+        self.save()
+        return True
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_current_subscription(sender, instance, **kwargs):
+    # After commit, so a request can't cache the old row again before the change is visible
+    from .entitlements import invalidate_active_subscription
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_active_subscription(user_id))
+
 class PaymentRecord(models.Model):
     """
     Represents a payment record for a subscription.
@@ -177,3 +254,72 @@ class TrialUsageStats(models.Model):
         """Record when a trial is converted to paid subscription."""
         self.conversion_date = timezone.now()
         self.save()
+
+class TrialNotification(models.Model):
+    """
+    Ledger of trial emails already sent. The unique constraint means each
+    subscription gets each kind of trial email at most once, however often
+    the scheduler runs.
+    """
+    KIND_CHOICES = [
+        ('REMINDER_3', 'Trial ends in 3 days'),
+        ('REMINDER_1', 'Trial ends in 1 day'),
+        ('ENDED', 'Trial ended'),
+    ]
+
+    subscription = models.ForeignKey(
+        UserSubscription,
+        on_delete=models.CASCADE,
+        related_name='trial_notifications'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'kind'], name='unique_trial_notification'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for subscription {self.subscription_id}"
+
+class WebhookEvent(models.Model):
+    """
+    A Stripe webhook event, stored on receipt and handled later by the
+    process_webhook_events command. The Stripe event id is unique, so
+    redeliveries of an event we already have are dropped.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.stripe_event_id})"
+
+    @classmethod
+    def record(cls, event_id, event_type, payload):
+        """Store an event unless it was delivered before. Returns (event, created)."""
+        return cls.objects.get_or_create(
+            stripe_event_id=event_id,
+            defaults={'event_type': event_type, 'payload': payload}
+        )
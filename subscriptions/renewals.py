@@ -0,0 +1,129 @@
+"""
+Bulk subscription renewal and expiry, run by the renew_subscriptions command.
+
+Due subscriptions are walked in primary key order, one chunk per
+transaction. Each chunk is locked with SELECT ... FOR UPDATE SKIP LOCKED,
+so several workers can run at once: rows another worker holds are skipped
+instead of waited on, and a renewed row no longer matches the due filter
+when it is locked again. Renewals, their confirmation emails and the cache
+invalidation for a chunk commit together.
+
+Expiry is a single UPDATE. The rows it touched are found again by the
+timestamp it stamped into updated_at, and their emails are queued in
+chunks inside the same transaction.
+"""
+import calendar
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .entitlements import invalidate_active_subscriptions
+from .models import UserSubscription
+from .utils import queue_subscription_emails
+
+logger = logging.getLogger(__name__)
+
+# Subscriptions ending within this window are renewed
+RENEWAL_WINDOW = timedelta(days=1)
+RENEWED_SUBJECT = 'Your FitFusion Subscription Has Been Renewed'
+EXPIRED_SUBJECT = 'Your FitFusion Subscription Has Expired'
+
+
+def add_months(value, months):
+    """Move a datetime forward by whole months, clamping to the month's last day."""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_period_end(subscription):
+    return add_months(subscription.end_date, subscription.plan.duration_months)
+
+
+def due_for_renewal(now):
+    return UserSubscription.objects.filter(
+        status='ACTIVE',
+        auto_renew=True,
+        end_date__gt=now,
+        end_date__lte=now + RENEWAL_WINDOW,
+    )
+
+
+def renew_chunk(now, after_id, chunk_size):
+    """
+    Lock and renew up to chunk_size due subscriptions with ids above after_id.
+    Returns the renewed subscriptions, empty when there are none left.
+    """
+    with transaction.atomic():
+        chunk = list(
+            due_for_renewal(now)
+            .filter(id__gt=after_id)
+            .select_related('plan', 'user')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:chunk_size]
+        )
+        if not chunk:
+            return chunk
+
+        for subscription in chunk:
+            subscription.start_date, subscription.end_date = (
+                subscription.end_date, next_period_end(subscription)
+            )
+            subscription.updated_at = now
+        UserSubscription.objects.bulk_update(chunk, ['start_date', 'end_date', 'updated_at'])
+
+        queue_subscription_emails('subscription_renewed', [
+            (subscription.user, RENEWED_SUBJECT, {'subscription': subscription, 'plan': subscription.plan})
+            for subscription in chunk
+        ])
+        transaction.on_commit(
+            lambda: invalidate_active_subscriptions([subscription.user_id for subscription in chunk])
+        )
+    return chunk
+
+
+def renew_due_subscriptions(now=None, chunk_size=500):
+    """Renew every auto-renewing subscription that ends within RENEWAL_WINDOW. Returns the count."""
+    now = now or timezone.now()
+    renewed = 0
+    after_id = 0
+    while True:
+        chunk = renew_chunk(now, after_id, chunk_size)
+        if not chunk:
+            return renewed
+        renewed += len(chunk)
+        after_id = chunk[-1].id
+        logger.info(f"Renewed {len(chunk)} subscriptions up to id {after_id}")
+
+
+def expire_subscriptions(now=None, chunk_size=500):
+    """Expire every active subscription past its end date with one UPDATE. Returns the count."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = UserSubscription.objects.filter(status='ACTIVE', end_date__lte=now).update(
+            status='EXPIRED', updated_at=now
+        )
+        if not expired:
+            return 0
+
+        # updated_at=now identifies the rows this UPDATE expired
+        just_expired = UserSubscription.objects.filter(
+            status='EXPIRED', updated_at=now
+        ).select_related('plan', 'user').order_by('id')
+        after_id = 0
+        while True:
+            chunk = list(just_expired.filter(id__gt=after_id)[:chunk_size])
+            if chunk:
+                after_id = chunk[-1].id
+                queue_subscription_emails('subscription_expired', [
+                    (subscription.user, EXPIRED_SUBJECT, {'subscription': subscription, 'plan': subscription.plan})
+                    for subscription in chunk
+                ])
+                user_ids = [subscription.user_id for subscription in chunk]
+                transaction.on_commit(lambda user_ids=user_ids: invalidate_active_subscriptions(user_ids))
+            if len(chunk) < chunk_size:
+                break
+    logger.info(f"Expired {expired} subscriptions")
+    return expired
@@ -3,6 +3,7 @@ from django.core import mail
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
+from notifications.outbox import deliver_pending_emails
 from ..models import UserSubscription, SubscriptionPlan
 
 User = get_user_model()
@@ -48,6 +49,8 @@ class TestEmail(TestCase):
         
         # Send reminder email
         send_trial_reminder_email(self.user, self.subscription, 3)
+        self.assertEqual(len(mail.outbox), 0)
+        deliver_pending_emails()
         
         # Check that one email was sent
         self.assertEqual(len(mail.outbox), 1)
@@ -66,6 +69,7 @@ class TestEmail(TestCase):
         
         # Send trial ended email
         send_trial_ended_email(self.user, self.subscription)
+        deliver_pending_emails()
         
         # Check that one email was sent
         self.assertEqual(len(mail.outbox), 1)
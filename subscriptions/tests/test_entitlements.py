@@ -0,0 +1,108 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+from django.utils import timezone
+from ..entitlements import cache_key, get_active_subscription
+from ..models import SubscriptionPlan, UserSubscription
+from ..views import handle_subscription_deleted
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ActiveSubscriptionResolverTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            price=9.99,
+            description='Test subscription plan'
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            stripe_subscription_id='sub_123',
+            end_date=timezone.now() + timedelta(days=30)
+        )
+
+    def _request(self, user=None):
+        request = self.factory.get('/')
+        request.user = user or self.user
+        return request
+
+    def test_memoized_per_request_and_cached_per_user(self):
+        request = self._request()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_active_subscription(request), self.subscription)
+            self.assertEqual(get_active_subscription(request).plan, self.plan)
+
+        with self.assertNumQueries(0):
+            subscription = get_active_subscription(self._request())
+            self.assertEqual(subscription.plan.name, 'Test Plan')
+            self.assertTrue(subscription.is_active)
+
+    def test_anonymous_and_no_subscription(self):
+        self.assertIsNone(get_active_subscription(self._request(AnonymousUser())))
+        other = User.objects.create_user(username='other', password='testpass123')
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_active_subscription(self._request(other)))
+            self.assertIsNone(get_active_subscription(self._request(other)))
+
+    def test_trial_only_with_include_trial(self):
+        self.subscription.delete()
+        trial = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            status='TRIAL',
+            is_trial=True,
+            end_date=timezone.now() + timedelta(days=14)
+        )
+        request = self._request()
+        self.assertIsNone(get_active_subscription(request))
+        self.assertEqual(get_active_subscription(request, include_trial=True), trial)
+
+    def test_cached_subscription_that_ran_out(self):
+        get_active_subscription(self._request())
+        later = timezone.now() + timedelta(days=31)
+        with patch('subscriptions.entitlements.timezone.now', return_value=later):
+            self.assertIsNone(get_active_subscription(self._request()))
+
+    def test_webhook_invalidates(self):
+        """Test that a Stripe cancellation is seen on the next request."""
+        self.assertIsNotNone(get_active_subscription(self._request()))
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_subscription_deleted(SimpleNamespace(id='sub_123'))
+        self.assertIsNone(get_active_subscription(self._request()))
+
+    def test_invalidated_after_commit(self):
+        """Test that the cache entry is dropped once the change is committed, not before."""
+        get_active_subscription(self._request())
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.subscription.status = 'CANCELLED'
+            self.subscription.save()
+            self.assertIsNotNone(cache.get(cache_key(self.user.id)))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(cache_key(self.user.id)))
+
+    def test_dashboard_uses_cached_subscription(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('subscriptions:dashboard'))
+        with patch('subscriptions.entitlements.load_current_subscriptions') as load:
+            response = self.client.get(reverse('subscriptions:dashboard'))
+        load.assert_not_called()
+        self.assertEqual(response.context['current_subscription'], self.subscription)
@@ -0,0 +1,145 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from ..models import SubscriptionPlan, UserSubscription, PaymentRecord
+from ..invoices import invoice_styles, render_invoice_pdf, render_pending_invoices, store_invoice_pdf
+from ..views import handle_invoice_payment_succeeded
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InvoicePdfTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        # Keep invoice files on local disk instead of uploading them to Cloudinary
+        media = override_settings(MEDIA_ROOT=media_root, STORAGES={
+            **settings.STORAGES,
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': media_root},
+            },
+        })
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=29.99
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            stripe_subscription_id='sub_123',
+            end_date=timezone.now() + timedelta(days=30)
+        )
+
+    def _pay(self, number='INV-1', amount_paid=2999):
+        handle_invoice_payment_succeeded(SimpleNamespace(
+            subscription='sub_123',
+            number=number,
+            amount_paid=amount_paid,
+            currency='usd',
+            payment_intent='pi_123'
+        ))
+        return PaymentRecord.objects.get(invoice_number=number)
+
+    def test_worker_prerenders_paid_invoices(self):
+        payment = self._pay()
+        self.assertFalse(payment.invoice_pdf)
+
+        out = StringIO()
+        call_command('render_invoices', stdout=out)
+        self.assertIn('rendered=1', out.getvalue())
+
+        payment.refresh_from_db()
+        self.assertRegex(payment.invoice_pdf.name, r'^invoices/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        with payment.invoice_pdf.open('rb') as pdf:
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+        self.assertEqual(render_pending_invoices(), {'rendered': 0, 'failed': 0})
+
+        # A redelivered event keeps the rendered PDF
+        rendered = payment.invoice_pdf.name
+        payment = self._pay()
+        self.assertEqual(payment.invoice_pdf.name, rendered)
+
+        # A redelivered payment with new details is rendered again, and the
+        # old file is deleted once nothing points at it
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = self._pay(amount_paid=3999)
+        self.assertFalse(payment.invoice_pdf)
+        self.assertFalse(payment.invoice_pdf.storage.exists(rendered))
+        self.assertEqual(render_pending_invoices()['rendered'], 1)
+
+    def test_content_addressed_and_styles_reused(self):
+        payment = self._pay()
+        invoice_styles()
+        with patch('subscriptions.invoices.getSampleStyleSheet') as sample_styles:
+            first = render_invoice_pdf(payment)
+            self.assertEqual(render_invoice_pdf(payment), first)
+        sample_styles.assert_not_called()
+
+        name = store_invoice_pdf(payment)
+        self.assertEqual(store_invoice_pdf(payment), name)
+
+    def test_stale_render_is_not_recorded(self):
+        payment = self._pay()
+        PaymentRecord.objects.filter(pk=payment.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        store_invoice_pdf(payment)
+        payment.refresh_from_db()
+        self.assertFalse(payment.invoice_pdf)
+
+    def test_download_uses_etag(self):
+        payment = self._pay()
+        self.client.force_login(self.user)
+        url = reverse('subscriptions:download_invoice', args=[payment.id])
+
+        # Rendered on demand when the worker has not got to it yet
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        etag = response['ETag']
+        payment.refresh_from_db()
+        self.assertIn(etag.strip('"'), payment.invoice_pdf.name)
+        response.close()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_download_serves_render_that_lost_the_race(self):
+        """Test the download still works when the record changes during the render."""
+        payment = self._pay()
+        self.client.force_login(self.user)
+
+        def render_while_record_changes(payment_record):
+            PaymentRecord.objects.filter(pk=payment_record.pk).update(
+                updated_at=timezone.now() + timedelta(seconds=1)
+            )
+            return render_invoice_pdf(payment_record)
+
+        with patch('subscriptions.invoices.render_invoice_pdf', side_effect=render_while_record_changes):
+            response = self.client.get(reverse('subscriptions:download_invoice', args=[payment.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['ETag'])
+        response.close()
+        payment.refresh_from_db()
+        self.assertFalse(payment.invoice_pdf)
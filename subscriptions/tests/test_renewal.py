@@ -1,7 +1,18 @@
+from datetime import datetime
+from io import StringIO
 from django.test import TestCase
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from notifications.models import OutboundEmail
+from subscriptions.entitlements import cache_key
 from subscriptions.models import SubscriptionPlan, UserSubscription
+from subscriptions.renewals import (
+    EXPIRED_SUBJECT, RENEWED_SUBJECT, add_months, expire_subscriptions, renew_due_subscriptions
+)
 
 class UserSubscriptionRenewalTests(TestCase):
     def setUp(self):
@@ -45,4 +56,87 @@ class UserSubscriptionRenewalTests(TestCase):
         self.assertFalse(self.subscription.is_active())
         self.subscription.status = 'EXPIRED'
         self.subscription.save()
-        self.assertEqual(self.subscription.status, 'EXPIRED') 
\ No newline at end of file
+        self.assertEqual(self.subscription.status, 'EXPIRED') 
+
+class RenewalEngineTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        User = get_user_model()
+        self.now = timezone.now()
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            price=10.00,
+            description='Test plan',
+            duration_months=1
+        )
+        self.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass')
+            for i in range(8)
+        ]
+
+    def subscribe(self, user, days_left, **kwargs):
+        return UserSubscription.objects.create(
+            user=user,
+            plan=self.plan,
+            start_date=self.now - timezone.timedelta(days=30),
+            end_date=self.now + timezone.timedelta(hours=days_left * 24),
+            **kwargs
+        )
+
+    def test_renews_due_subscriptions_in_chunks(self):
+        due = [self.subscribe(user, 0.5) for user in self.users[:5]]
+        not_due = self.subscribe(self.users[5], 10)
+        manual = self.subscribe(self.users[6], 0.5, auto_renew=False)
+
+        self.assertEqual(renew_due_subscriptions(self.now, chunk_size=2), 5)
+        for subscription in due:
+            old_end = subscription.end_date
+            subscription.refresh_from_db()
+            self.assertEqual(subscription.start_date, old_end)
+            self.assertEqual(subscription.end_date, add_months(old_end, 1))
+        for subscription in (not_due, manual):
+            old_end = subscription.end_date
+            subscription.refresh_from_db()
+            self.assertEqual(subscription.end_date, old_end)
+
+        emails = OutboundEmail.objects.order_by('id')
+        self.assertEqual(emails.count(), 5)
+        self.assertEqual(emails[0].subject, RENEWED_SUBJECT)
+        # Renewed rows are out of the window, so a second run does nothing
+        self.assertEqual(renew_due_subscriptions(self.now, chunk_size=2), 0)
+
+    def test_expires_with_one_update(self):
+        lapsed = [self.subscribe(user, -1) for user in self.users[:3]]
+        current = self.subscribe(self.users[3], 5)
+        cancelled = self.subscribe(self.users[4], -1, status='CANCELLED')
+        cache.set(cache_key(self.users[0].id), 'stale')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(expire_subscriptions(self.now), 3)
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements.count('UPDATE'), 1)
+        self.assertEqual(statements.count('INSERT'), 1)
+
+        self.assertEqual(
+            set(UserSubscription.objects.filter(status='EXPIRED').values_list('id', flat=True)),
+            {subscription.id for subscription in lapsed}
+        )
+        current.refresh_from_db()
+        cancelled.refresh_from_db()
+        self.assertEqual((current.status, cancelled.status), ('ACTIVE', 'CANCELLED'))
+        self.assertEqual(OutboundEmail.objects.filter(subject=EXPIRED_SUBJECT).count(), 3)
+        self.assertIsNone(cache.get(cache_key(self.users[0].id)))
+        self.assertEqual(expire_subscriptions(self.now), 0)
+
+    def test_command(self):
+        self.subscribe(self.users[0], 0.5)
+        self.subscribe(self.users[1], -1)
+        out = StringIO()
+        call_command('renew_subscriptions', '--chunk-size', '10', stdout=out)
+        self.assertIn('Renewed: 1, Expired: 1', out.getvalue())
+
+    def test_add_months_clamps_to_month_end(self):
+        self.assertEqual(add_months(datetime(2024, 1, 31), 1), datetime(2024, 2, 29))
+        self.assertEqual(add_months(datetime(2024, 11, 15), 3), datetime(2025, 2, 15))
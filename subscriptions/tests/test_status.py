@@ -0,0 +1,80 @@
+from io import StringIO
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from ..models import SubscriptionPlan, UserSubscription
+
+User = get_user_model()
+
+
+class SubscriptionStatusTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            price=9.99,
+            description='Test subscription plan'
+        )
+        now = timezone.now()
+        self.active = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            start_date=now - timedelta(days=10),
+            end_date=now + timedelta(days=20)
+        )
+        self.expired = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            start_date=now - timedelta(days=40),
+            end_date=now - timedelta(days=10)
+        )
+        self.cancelled = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            status='CANCELLED',
+            start_date=now - timedelta(days=10),
+            end_date=now + timedelta(days=20)
+        )
+
+    def test_active_queryset(self):
+        self.assertEqual(list(UserSubscription.objects.active()), [self.active])
+        later = timezone.now() + timedelta(days=21)
+        self.assertFalse(self.user.usersubscription_set.active(later).exists())
+
+    def test_instances_share_the_filter_timestamp(self):
+        """Test that fetched rows evaluate status at the time they were filtered with."""
+        later = timezone.now() + timedelta(days=15)
+        subscription = UserSubscription.objects.active(later).get()
+        self.assertEqual(subscription.evaluated_at, later)
+        self.assertEqual(subscription.get_remaining_days(), 4)
+
+        history = list(UserSubscription.objects.evaluated_at(later).order_by('start_date'))
+        self.assertEqual({sub.evaluated_at for sub in history}, {later})
+        self.assertEqual([sub.is_active for sub in history], [False, True, False])
+
+    def test_now_is_fixed_per_instance(self):
+        with patch('subscriptions.models.timezone.now', wraps=timezone.now) as now:
+            self.assertTrue(self.active.is_active)
+            self.active.get_remaining_days()
+            self.active.get_progress_percentage()
+            self.assertTrue(self.cancelled.can_renew)
+        self.assertEqual(now.call_count, 2)
+
+    def test_status_checks_are_silent(self):
+        """Test that status checks don't print and only log at debug level."""
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            self.active.is_active
+            self.active.get_progress_percentage()
+        self.assertEqual(stdout.getvalue(), '')
+
+        with self.assertLogs('subscriptions.models', level='DEBUG') as logs:
+            self.active.is_active
+        self.assertIn('is_active=True', logs.output[0])
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from io import StringIO
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from notifications.models import OutboundEmail
+from ..models import SubscriptionPlan, TrialNotification, UserSubscription
+from ..trials import send_trial_notifications
+
+User = get_user_model()
+
+
+class TrialNotificationTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.now = timezone.now()
+        self.plan = SubscriptionPlan.objects.create(
+            name='Premium Plan',
+            plan_type='PREMIUM',
+            description='Test Description',
+            price=29.99,
+            features=['Premium Workouts']
+        )
+        self.count = 0
+
+    def trial(self, ends_in):
+        self.count += 1
+        user = User.objects.create_user(
+            username=f'user{self.count}', email=f'user{self.count}@example.com', password='testpass123'
+        )
+        return UserSubscription.objects.create(
+            user=user,
+            plan=self.plan,
+            status='TRIAL',
+            end_date=self.now + ends_in,
+            is_trial=True,
+            trial_end_date=self.now + ends_in
+        )
+
+    def test_selects_each_window(self):
+        three_days = self.trial(timedelta(days=3, hours=5))
+        one_day = [self.trial(timedelta(days=1, hours=2)) for _ in range(3)]
+        ended = self.trial(-timedelta(hours=3))
+        self.trial(timedelta(days=2, hours=12))
+        self.trial(timedelta(days=10))
+        self.trial(-timedelta(days=5))
+
+        counts = send_trial_notifications(self.now, chunk_size=2)
+        self.assertEqual(counts, {'REMINDER_3': 1, 'REMINDER_1': 3, 'ENDED': 1})
+
+        ledger = set(TrialNotification.objects.values_list('subscription_id', 'kind'))
+        self.assertEqual(ledger, {(three_days.id, 'REMINDER_3'), (ended.id, 'ENDED')} | {
+            (subscription.id, 'REMINDER_1') for subscription in one_day
+        })
+        subjects = sorted(OutboundEmail.objects.values_list('subject', flat=True))
+        self.assertEqual(subjects.count('Your Premium Plan Trial Ends in 1 Days'), 3)
+        self.assertIn('Your Premium Plan Trial Ends in 3 Days', subjects)
+        self.assertIn('Your Premium Plan Trial Has Ended', subjects)
+
+    def test_reruns_send_nothing_twice(self):
+        self.trial(timedelta(days=1, hours=2))
+        self.trial(-timedelta(hours=1))
+        send_trial_notifications(self.now)
+        later = self.now + timedelta(hours=1)
+        self.assertEqual(send_trial_notifications(later), {'REMINDER_1': 0, 'REMINDER_3': 0, 'ENDED': 0})
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_trials(self):
+        for _ in range(20):
+            self.trial(timedelta(days=7))
+        with CaptureQueriesContext(connection) as queries:
+            send_trial_notifications(self.now)
+        # One empty range query per kind of email
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries.captured_queries].count('SELECT'), 3
+        )
+
+    def test_command(self):
+        self.trial(timedelta(days=3, hours=1))
+        out = StringIO()
+        call_command('check_trial_notifications', stdout=out)
+        self.assertIn('reminder_3=1', out.getvalue())
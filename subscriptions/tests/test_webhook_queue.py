@@ -0,0 +1,281 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.db import connection
+from django.utils import timezone
+from io import StringIO
+from notifications.models import OutboundEmail
+from payments.gateway import get_gateway
+from ..models import SubscriptionPlan, UserSubscription, PaymentRecord, WebhookEvent
+from .. import webhooks
+
+User = get_user_model()
+
+WEBHOOK_SECRET = 'whsec_test_secret'
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class WebhookQueueTests(TestCase):
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=29.99
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            stripe_subscription_id='sub_123',
+            end_date=timezone.now() + timedelta(days=30)
+        )
+
+    def _invoice_event(self, event_id, event_type='invoice.payment_succeeded'):
+        return {
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': {
+                'object': 'invoice',
+                'id': 'in_123',
+                'subscription': 'sub_123',
+                'amount_paid': 2999,
+                'amount_due': 2999,
+                'currency': 'eur',
+                'payment_intent': 'pi_123',
+                'number': 'INV-0001',
+            }},
+        }
+
+    def _post(self, event):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            reverse('subscriptions:webhook'),
+            data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+        )
+
+    def test_webhook_stores_event_once(self):
+        """Test that the endpoint queues events without running handlers and drops redeliveries."""
+        event = self._invoice_event('evt_1')
+        for _ in range(3):
+            self.assertEqual(self._post(event).status_code, 200)
+        self.assertEqual(WebhookEvent.objects.get().status, 'PENDING')
+        self.assertFalse(PaymentRecord.objects.exists())
+
+        response = self.client.post(
+            reverse('subscriptions:webhook'),
+            data='{}',
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE='t=1,v1=bad'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_worker_processes_each_event_once(self):
+        self._post(self._invoice_event('evt_1'))
+        self._post(self._invoice_event('evt_1'))
+        # Stripe can also report the same invoice under a new event id
+        self._post(self._invoice_event('evt_2'))
+
+        out = StringIO()
+        call_command('process_webhook_events', stdout=out)
+        self.assertIn('processed=2', out.getvalue())
+        self.assertEqual(PaymentRecord.objects.get().status, 'SUCCEEDED')
+        self.assertEqual(
+            set(WebhookEvent.objects.values_list('status', 'attempts')), {('PROCESSED', 1)}
+        )
+
+        call_command('process_webhook_events', stdout=StringIO())
+        self.assertEqual(PaymentRecord.objects.count(), 1)
+
+    def test_late_failure_keeps_successful_payment(self):
+        self._post(self._invoice_event('evt_1'))
+        self._post(self._invoice_event('evt_2', 'invoice.payment_failed'))
+        webhooks.process_pending_events()
+        self.assertEqual(PaymentRecord.objects.get().status, 'SUCCEEDED')
+
+    @override_settings(STRIPE_WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failures_are_retried_then_given_up(self):
+        self._post(self._invoice_event('evt_1'))
+        with patch.dict(webhooks.EVENT_HANDLERS, {'invoice.payment_succeeded': self._fail}):
+            self.assertEqual(webhooks.process_pending_events()['PENDING'], 1)
+            event = WebhookEvent.objects.get()
+            self.assertEqual(event.attempts, 1)
+            self.assertIn('Stripe is down', event.last_error)
+            self.assertGreater(event.next_attempt_at, timezone.now())
+
+            # Not due yet
+            self.assertEqual(webhooks.process_pending_events()['PENDING'], 0)
+
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(webhooks.process_pending_events()['FAILED'], 1)
+        self.assertEqual(WebhookEvent.objects.get().status, 'FAILED')
+
+    def _fail(self, obj):
+        raise RuntimeError('Stripe is down')
+
+    def test_reclaimed_event_rolls_back(self):
+        """Test that a worker whose lease was taken over discards its writes."""
+        self._post(self._invoice_event('evt_1'))
+        handler = webhooks.EVENT_HANDLERS['invoice.payment_succeeded']
+
+        def reclaimed(obj):
+            handler(obj)
+            WebhookEvent.objects.update(locked_at=timezone.now() + timedelta(seconds=1))
+
+        with patch.dict(webhooks.EVENT_HANDLERS, {'invoice.payment_succeeded': reclaimed}):
+            self.assertEqual(webhooks.process_pending_events()['PROCESSING'], 1)
+        self.assertFalse(PaymentRecord.objects.exists())
+
+        # A stale lease is picked up again once it times out
+        WebhookEvent.objects.update(locked_at=timezone.now() - webhooks.LEASE_TIMEOUT * 2)
+        self.assertEqual(webhooks.process_pending_events()['PROCESSED'], 1)
+        self.assertEqual(PaymentRecord.objects.count(), 1)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+    PAYMENT_GATEWAY='payments.fake.FakeStripeGateway'
+)
+class WebhookHandlerTests(TestCase):
+    """Runs each handler through the worker with the real email helpers."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.gateway = get_gateway()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Test Plan',
+            plan_type='BASIC',
+            description='Test Description',
+            price=29.99
+        )
+
+    def _subscribe(self, **kwargs):
+        return UserSubscription.objects.create(
+            user=self.user,
+            plan=self.plan,
+            stripe_subscription_id='sub_123',
+            end_date=timezone.now() + timedelta(days=30),
+            **kwargs
+        )
+
+    def _process(self, event_type, obj):
+        payload, signature = self.gateway.sign_webhook(self.gateway.build_event(event_type, obj), WEBHOOK_SECRET)
+        self.client.post(
+            reverse('subscriptions:webhook'),
+            data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature
+        )
+        webhooks.process_pending_events()
+        return WebhookEvent.objects.get(event_type=event_type)
+
+    def _invoice(self, subscription_id='sub_123'):
+        return {
+            'object': 'invoice',
+            'id': 'in_123',
+            'subscription': subscription_id,
+            'amount_paid': 2999,
+            'amount_due': 2999,
+            'currency': 'eur',
+            'payment_intent': 'pi_123',
+            'number': 'INV-0001',
+        }
+
+    def test_subscription_updated(self):
+        subscription = self._subscribe()
+        period_end = int((timezone.now() + timedelta(days=60)).timestamp())
+        event = self._process('customer.subscription.updated', {
+            'object': 'subscription', 'id': 'sub_123', 'status': 'active', 'current_period_end': period_end
+        })
+        self.assertEqual(event.status, 'PROCESSED', event.last_error)
+        subscription.refresh_from_db()
+        self.assertEqual(int(subscription.end_date.timestamp()), period_end)
+        self.assertEqual(OutboundEmail.objects.get().subject, 'Your FitFusion Subscription Has Been Renewed')
+
+    def test_subscription_updated_to_canceled(self):
+        subscription = self._subscribe()
+        event = self._process('customer.subscription.updated', {
+            'object': 'subscription', 'id': 'sub_123', 'status': 'canceled'
+        })
+        self.assertEqual(event.status, 'PROCESSED', event.last_error)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.status, 'CANCELLED')
+        self.assertEqual(OutboundEmail.objects.get().subject, 'Your FitFusion Subscription Has Been Cancelled')
+
+    def test_subscription_deleted(self):
+        subscription = self._subscribe()
+        event = self._process('customer.subscription.deleted', {'object': 'subscription', 'id': 'sub_123'})
+        self.assertEqual(event.status, 'PROCESSED', event.last_error)
+        subscription.refresh_from_db()
+        self.assertEqual((subscription.status, subscription.auto_renew), ('CANCELLED', False))
+        self.assertEqual(OutboundEmail.objects.get().recipients, ['test@example.com'])
+
+    def test_invoice_payment_failed(self):
+        self._subscribe()
+        event = self._process('invoice.payment_failed', self._invoice())
+        self.assertEqual(event.status, 'PROCESSED', event.last_error)
+        self.assertEqual(PaymentRecord.objects.get().status, 'FAILED')
+        self.assertEqual(OutboundEmail.objects.get().subject, 'Action Required: Payment Failed')
+
+    def test_checkout_session_completed(self):
+        session = self.gateway.create_checkout_session(
+            mode='subscription',
+            customer_email=self.user.email,
+            metadata={'user_id': self.user.id, 'plan_id': self.plan.id}
+        )
+        session = self.gateway.complete_checkout_session(session.id)
+
+        # The Stripe call happens outside the handler's transaction
+        depth = len(connection.atomic_blocks)
+        retrieve = self.gateway.retrieve_subscription
+
+        def retrieve_outside_transaction(subscription_id):
+            self.assertEqual(len(connection.atomic_blocks), depth)
+            return retrieve(subscription_id)
+
+        with patch.object(self.gateway, 'retrieve_subscription', side_effect=retrieve_outside_transaction) as fetch:
+            event = self._process('checkout.session.completed', session)
+        fetch.assert_called_once_with(session.subscription)
+        self.assertEqual(event.status, 'PROCESSED', event.last_error)
+        subscription = UserSubscription.objects.get(stripe_subscription_id=session.subscription)
+        self.assertEqual((subscription.user, subscription.plan, subscription.status), (self.user, self.plan, 'ACTIVE'))
+        self.assertEqual(OutboundEmail.objects.get().subject, 'Welcome to FitFusion Premium!')
+
+    def test_event_before_checkout_is_retried(self):
+        """Test that an invoice for a subscription that does not exist yet stays queued."""
+        event = self._process('invoice.payment_succeeded', self._invoice())
+        self.assertEqual(event.status, 'PENDING')
+        self.assertEqual(event.attempts, 1)
+        self.assertFalse(PaymentRecord.objects.exists())
+
+        self._subscribe()
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        webhooks.process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'PROCESSED')
+        self.assertEqual(PaymentRecord.objects.get().status, 'SUCCEEDED')
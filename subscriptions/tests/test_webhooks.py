@@ -1,7 +1,9 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from subscriptions.models import SubscriptionPlan, UserSubscription
+from notifications.models import OutboundEmail
+from subscriptions.models import PaymentRecord, SubscriptionPlan, UserSubscription
+from subscriptions.webhooks import process_pending_events
 from django.utils import timezone
 import stripe
 import json
@@ -9,6 +11,7 @@ from unittest.mock import patch, MagicMock
 
 User = get_user_model()
 
+@override_settings(SECURE_SSL_REDIRECT=False)
 class StripeWebhookTest(TestCase):
     def setUp(self):
         # Create test user
@@ -34,16 +37,25 @@ class StripeWebhookTest(TestCase):
         self.stripe_secret = 'whsec_test_secret'
         self.stripe_signature = 'test_signature'
 
+    @patch('payments.gateway.StripeGateway.retrieve_subscription')
     @patch('stripe.Webhook.construct_event')
-    def test_checkout_session_completed(self, mock_construct_event):
+    def test_checkout_session_completed(self, mock_construct_event, mock_retrieve_subscription):
         """Test handling of checkout.session.completed webhook event."""
+        # Mock the subscription the worker fetches from Stripe
+        mock_retrieve_subscription.return_value = stripe.Subscription.construct_from({
+            'id': 'sub_test123',
+            'current_period_end': int((timezone.now() + timezone.timedelta(days=30)).timestamp())
+        }, None)
+
         # Mock the Stripe event
         mock_event = {
+            'id': 'evt_checkout',
             'type': 'checkout.session.completed',
             'data': {
                 'object': {
                     'mode': 'subscription',
                     'subscription': 'sub_test123',
+                    'customer': 'cus_test123',
                     'metadata': {
                         'plan_id': str(self.plan.id),
                         'user_id': str(self.user.id)
@@ -51,32 +63,33 @@ class StripeWebhookTest(TestCase):
                 }
             }
         }
-        mock_construct_event.return_value = mock_event
-        
-        # Mock email sending
-        with patch('subscriptions.utils.send_mail') as mock_send_mail:
-            # Send webhook request
-            response = self.client.post(
-                reverse('subscriptions:webhook'),
-                data=json.dumps(mock_event),
-                content_type='application/json',
-                HTTP_STRIPE_SIGNATURE=self.stripe_signature
-            )
-            
-            # Check response
-            self.assertEqual(response.status_code, 200)
-            
-            # Check subscription was created
-            subscription = UserSubscription.objects.filter(
-                user=self.user,
-                plan=self.plan,
-                stripe_subscription_id='sub_test123'
-            ).first()
-            self.assertIsNotNone(subscription)
-            self.assertEqual(subscription.status, 'ACTIVE')
-            
-            # Check email was sent
-            mock_send_mail.assert_called_once()
+        mock_construct_event.return_value = stripe.Event.construct_from(mock_event, None)
+        
+        # Send webhook request
+        response = self.client.post(
+            reverse('subscriptions:webhook'),
+            data=json.dumps(mock_event),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=self.stripe_signature
+        )
+        
+        # Check response
+        self.assertEqual(response.status_code, 200)
+
+        # Run the queued event through the webhook worker
+        process_pending_events()
+        
+        # Check subscription was created
+        subscription = UserSubscription.objects.filter(
+            user=self.user,
+            plan=self.plan,
+            stripe_subscription_id='sub_test123'
+        ).first()
+        self.assertIsNotNone(subscription)
+        self.assertEqual(subscription.status, 'ACTIVE')
+        
+        # Check email was queued
+        self.assertEmailQueued('Welcome to FitFusion Premium!')
 
     @patch('stripe.Webhook.construct_event')
     def test_subscription_deleted(self, mock_construct_event):
@@ -93,6 +106,7 @@ class StripeWebhookTest(TestCase):
         
         # Mock the Stripe event
         mock_event = {
+            'id': 'evt_deleted',
             'type': 'customer.subscription.deleted',
             'data': {
                 'object': {
@@ -100,29 +114,30 @@ class StripeWebhookTest(TestCase):
                 }
             }
         }
-        mock_construct_event.return_value = mock_event
-        
-        # Mock email sending
-        with patch('subscriptions.utils.send_mail') as mock_send_mail:
-            # Send webhook request
-            response = self.client.post(
-                reverse('subscriptions:webhook'),
-                data=json.dumps(mock_event),
-                content_type='application/json',
-                HTTP_STRIPE_SIGNATURE=self.stripe_signature
-            )
-            
-            # Check response
-            self.assertEqual(response.status_code, 200)
-            
-            # Refresh subscription from db
-            subscription.refresh_from_db()
-            
-            # Check subscription was cancelled
-            self.assertEqual(subscription.status, 'CANCELLED')
-            
-            # Check email was sent
-            mock_send_mail.assert_called_once()
+        mock_construct_event.return_value = stripe.Event.construct_from(mock_event, None)
+        
+        # Send webhook request
+        response = self.client.post(
+            reverse('subscriptions:webhook'),
+            data=json.dumps(mock_event),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=self.stripe_signature
+        )
+        
+        # Check response
+        self.assertEqual(response.status_code, 200)
+
+        # Run the queued event through the webhook worker
+        process_pending_events()
+        
+        # Refresh subscription from db
+        subscription.refresh_from_db()
+        
+        # Check subscription was cancelled
+        self.assertEqual(subscription.status, 'CANCELLED')
+        
+        # Check email was queued
+        self.assertEmailQueued('Your FitFusion Subscription Has Been Cancelled')
 
     @patch('stripe.Webhook.construct_event')
     def test_payment_failed(self, mock_construct_event):
@@ -139,36 +154,60 @@ class StripeWebhookTest(TestCase):
         
         # Mock the Stripe event
         mock_event = {
+            'id': 'evt_failed',
             'type': 'invoice.payment_failed',
             'data': {
                 'object': {
-                    'subscription': 'sub_test123'
+                    'subscription': 'sub_test123',
+                    'number': 'INV-0001',
+                    'amount_due': 2999,
+                    'currency': 'usd',
+                    'payment_intent': 'pi_test123'
                 }
             }
         }
-        mock_construct_event.return_value = mock_event
-        
-        # Mock email sending
-        with patch('subscriptions.utils.send_mail') as mock_send_mail:
-            # Send webhook request
-            response = self.client.post(
-                reverse('subscriptions:webhook'),
-                data=json.dumps(mock_event),
-                content_type='application/json',
-                HTTP_STRIPE_SIGNATURE=self.stripe_signature
-            )
-            
-            # Check response
-            self.assertEqual(response.status_code, 200)
-            
-            # Refresh subscription from db
-            subscription.refresh_from_db()
-            
-            # Check subscription status was updated
-            self.assertEqual(subscription.status, 'PAYMENT_FAILED')
-            
-            # Check email was sent
-            mock_send_mail.assert_called_once()
+        mock_construct_event.return_value = stripe.Event.construct_from(mock_event, None)
+        
+        # Send webhook request
+        response = self.client.post(
+            reverse('subscriptions:webhook'),
+            data=json.dumps(mock_event),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=self.stripe_signature
+        )
+        
+        # Check response
+        self.assertEqual(response.status_code, 200)
+
+        # Run the queued event through the webhook worker
+        process_pending_events()
+        
+        # Check the failed payment was recorded
+        payment = PaymentRecord.objects.get(invoice_number='INV-0001')
+        self.assertEqual(payment.subscription, subscription)
+        self.assertEqual(payment.status, 'FAILED')
+        
+        # Check email was queued
+        self.assertEmailQueued('Action Required: Payment Failed')
+        
+        # A later failure event for the same invoice doesn't notify again
+        mock_event['id'] = 'evt_failed_again'
+        mock_construct_event.return_value = stripe.Event.construct_from(mock_event, None)
+        self.client.post(
+            reverse('subscriptions:webhook'),
+            data=json.dumps(mock_event),
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=self.stripe_signature
+        )
+        process_pending_events()
+        self.assertEqual(PaymentRecord.objects.count(), 1)
+        self.assertEmailQueued('Action Required: Payment Failed')
+
+    def assertEmailQueued(self, subject):
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.subject, subject)
+        self.assertEqual(email.recipients, [self.user.email])
+        self.assertEqual(email.status, 'PENDING')
 
     def test_invalid_signature(self):
         """Test webhook with invalid signature."""
@@ -0,0 +1,97 @@
+"""
+Trial notification scheduler, run by the check_trial_notifications command.
+
+Each kind of trial email selects exactly the trials whose trial_end_date
+falls in its window and that have no TrialNotification row for that kind
+yet. The query is a range scan on (is_trial, trial_end_date), so a run
+costs in proportion to the emails it sends rather than to the number of
+running trials. Matching rows are handled in keyset chunks like
+subscriptions.renewals. Each chunk's ledger rows and queued emails commit
+together, so a rerun, or a second worker, sends nothing twice.
+"""
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import TrialNotification, UserSubscription
+from .utils import queue_subscription_emails, trial_ended_message, trial_reminder_message
+
+logger = logging.getLogger(__name__)
+
+# Trials that ended longer ago than this are not notified any more
+ENDED_LOOKBACK = timedelta(days=1)
+
+
+def reminder(days):
+    # Same rounding as get_trial_remaining_days(): whole days left
+    return {
+        'template': 'trial_reminder',
+        'window': lambda now: (now + timedelta(days=days), now + timedelta(days=days + 1)),
+        'message': lambda subscription: trial_reminder_message(subscription.user, subscription, days),
+    }
+
+
+NOTIFICATIONS = {
+    'REMINDER_3': reminder(3),
+    'REMINDER_1': reminder(1),
+    'ENDED': {
+        'template': 'trial_ended',
+        'window': lambda now: (now - ENDED_LOOKBACK, now),
+        'message': lambda subscription: trial_ended_message(subscription.user, subscription),
+    },
+}
+
+
+def pending_notifications(kind, now):
+    """Trials due for the `kind` email that have not had it yet."""
+    start, end = NOTIFICATIONS[kind]['window'](now)
+    return UserSubscription.objects.filter(
+        is_trial=True,
+        trial_end_date__gte=start,
+        trial_end_date__lt=end,
+    ).exclude(
+        Exists(TrialNotification.objects.filter(subscription=OuterRef('pk'), kind=kind))
+    ).evaluated_at(now)
+
+
+def notify_chunk(kind, now, after_id, chunk_size):
+    """Send the `kind` email to up to chunk_size due trials with ids above after_id."""
+    with transaction.atomic():
+        chunk = list(
+            pending_notifications(kind, now)
+            .filter(id__gt=after_id)
+            .select_related('plan', 'user')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:chunk_size]
+        )
+        if not chunk:
+            return chunk
+
+        TrialNotification.objects.bulk_create([
+            TrialNotification(subscription=subscription, kind=kind) for subscription in chunk
+        ])
+        notification = NOTIFICATIONS[kind]
+        queue_subscription_emails(
+            notification['template'],
+            [notification['message'](subscription) for subscription in chunk]
+        )
+    return chunk
+
+
+def send_trial_notifications(now=None, chunk_size=500):
+    """Send every due trial reminder and trial ended email. Returns {kind: emails queued}."""
+    now = now or timezone.now()
+    counts = {}
+    for kind in NOTIFICATIONS:
+        counts[kind] = 0
+        after_id = 0
+        while True:
+            chunk = notify_chunk(kind, now, after_id, chunk_size)
+            if not chunk:
+                break
+            counts[kind] += len(chunk)
+            after_id = chunk[-1].id
+        if counts[kind]:
+            logger.info(f"Queued {counts[kind]} {kind} trial emails")
+    return counts
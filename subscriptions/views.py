@@ -4,16 +4,23 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import reverse
 from django.contrib import messages
 from django.urls import reverse
-from .models import SubscriptionPlan, UserSubscription, PaymentRecord
+from .models import SubscriptionPlan, UserSubscription, PaymentRecord, WebhookEvent
+from .entitlements import get_active_subscription
+from . import invoices
+from payments.gateway import get_gateway
 from django.utils import timezone
 import stripe
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.utils import timezone
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
 from datetime import timedelta
+from decimal import Decimal
 import pytz
+import json
 import logging
 from django.contrib.auth import get_user_model
 from .utils import (
@@ -23,10 +30,9 @@ from .utils import (
     send_subscription_renewed,
     generate_invoice_pdf,
     send_trial_started_email,
-    send_trial_reminder_email,
     send_trial_ended_email
 )
-from django.db import models
+from django.db import models, transaction
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -46,12 +52,7 @@ class SubscriptionPlanListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            context['current_subscription'] = UserSubscription.objects.filter(
-                user=self.request.user,
-                status__in=['ACTIVE', 'TRIAL'],
-                end_date__gt=timezone.now()
-            ).first()
+        context['current_subscription'] = get_active_subscription(self.request, include_trial=True)
         context['stripe_public_key'] = settings.STRIPE_PUBLIC_KEY
         return context
 
@@ -63,12 +64,7 @@ class SubscriptionPlanDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            context['current_subscription'] = UserSubscription.objects.filter(
-                user=self.request.user,
-                status='ACTIVE',
-                end_date__gt=timezone.now()
-            ).first()
+        context['current_subscription'] = get_active_subscription(self.request)
         context['stripe_public_key'] = settings.STRIPE_PUBLIC_KEY
         context['debug'] = settings.DEBUG
         return context
@@ -83,11 +79,7 @@ class UserSubscriptionView(LoginRequiredMixin, TemplateView):
         context['subscriptions'] = UserSubscription.objects.filter(
             user=self.request.user
         ).order_by('-created_at')
-        context['active_subscription'] = UserSubscription.objects.filter(
-            user=self.request.user,
-            status='ACTIVE',
-            end_date__gt=timezone.now()
-        ).first()
+        context['active_subscription'] = get_active_subscription(self.request)
         
         # Add available plans for switching
         context['available_plans'] = SubscriptionPlan.objects.filter(
@@ -163,11 +155,7 @@ class UserSubscriptionView(LoginRequiredMixin, TemplateView):
 @login_required
 def plan_list(request):
     plans = SubscriptionPlan.objects.filter(is_active=True)
-    current_subscription = UserSubscription.objects.filter(
-        user=request.user,
-        status='ACTIVE',
-        end_date__gt=timezone.now()
-    ).first()
+    current_subscription = get_active_subscription(request)
     
     context = {
         'plans': plans,
@@ -178,25 +166,11 @@ def plan_list(request):
 
 @login_required
 def dashboard(request):
-    print(f"DEBUG: dashboard called for user {request.user.id}")
-    
-    # Get all subscriptions for this user to debug
-    all_subscriptions = UserSubscription.objects.filter(user=request.user)
-    print(f"DEBUG: All subscriptions for user: {list(all_subscriptions.values('id', 'status', 'end_date', 'plan__name'))}")
-    
-    current_subscription = UserSubscription.objects.filter(
-        user=request.user,
-        status='ACTIVE',
-        end_date__gt=timezone.now()
-    ).first()
-    
-    print(f"DEBUG: Current subscription found: {current_subscription}")
-    if current_subscription:
-        print(f"DEBUG: Current subscription details: id={current_subscription.id}, status={current_subscription.status}, end_date={current_subscription.end_date}")
+    current_subscription = get_active_subscription(request)
     
     subscription_history = UserSubscription.objects.filter(
         user=request.user
-    ).order_by('-created_at')
+    ).evaluated_at(timezone.now()).order_by('-created_at')
     
     context = {
         'current_subscription': current_subscription,
@@ -216,18 +190,10 @@ def create_subscription(request, plan_id):
     if not request.user.is_authenticated:
         return redirect('/accounts/login/')
     
-    # Configure Stripe API key
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    
     # Only proceed with database queries if user is authenticated
     plan = get_object_or_404(SubscriptionPlan, id=plan_id, is_active=True)
     
-    # Now we know user is authenticated, so this query is safe
-    active_subscription = UserSubscription.objects.filter(
-        user=request.user,
-        status='ACTIVE',
-        end_date__gt=timezone.now()
-    ).first()
+    active_subscription = get_active_subscription(request)
     
     if active_subscription:
         # Check if user is trying to subscribe to the same plan
@@ -245,12 +211,12 @@ def create_subscription(request, plan_id):
     
     try:
         # Check if Stripe is configured
-        if not settings.STRIPE_SECRET_KEY:
+        if not get_gateway().is_configured:
             messages.error(request, 'Payment processing is not configured yet. Please contact support to set up your subscription.')
             return redirect('subscriptions:plan_list')
         
         # Create Stripe checkout session with dynamic pricing
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = get_gateway().create_checkout_session(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -286,6 +252,13 @@ def create_subscription(request, plan_id):
         messages.error(request, 'Unable to create checkout session. Please try again.')
         return redirect('subscriptions:plan_list')
 
+def stripe_metadata(stripe_object):
+    """An object's Stripe metadata as a plain dict. Newer stripe versions no longer make StripeObject a dict."""
+    metadata = getattr(stripe_object, 'metadata', None)
+    if not metadata:
+        return {}
+    return metadata.to_dict() if hasattr(metadata, 'to_dict') else dict(metadata)
+
 @login_required
 def subscription_success(request):
     """Handle successful subscription payment and create UserSubscription."""
@@ -299,11 +272,8 @@ def subscription_success(request):
         
         if session_id:
             print(f"DEBUG: Processing session_id = {session_id}")
-            # Configure Stripe
-            stripe.api_key = settings.STRIPE_SECRET_KEY
-            
             # Retrieve the checkout session
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = get_gateway().retrieve_checkout_session(session_id)
             print(f"DEBUG: Session payment_status = {session.payment_status}")
             print(f"DEBUG: Session subscription = {session.subscription}")
             print(f"DEBUG: Session metadata = {session.metadata}")
@@ -311,8 +281,9 @@ def subscription_success(request):
             if session.payment_status == 'paid':
                 # Get subscription details
                 subscription_id = session.subscription
-                plan_id = session.metadata.get('plan_id')
-                user_id = session.metadata.get('user_id')
+                metadata = stripe_metadata(session)
+                plan_id = metadata.get('plan_id')
+                user_id = metadata.get('user_id')
                 
                 print(f"DEBUG: subscription_id = {subscription_id}")
                 print(f"DEBUG: plan_id = {plan_id}")
@@ -327,7 +298,7 @@ def subscription_success(request):
                     print(f"DEBUG: Plan found = {plan.name}")
                     
                     # Get the Stripe subscription to get the end date
-                    stripe_subscription = stripe.Subscription.retrieve(subscription_id)
+                    stripe_subscription = get_gateway().retrieve_subscription(subscription_id)
                     print(f"DEBUG: Stripe subscription object = {stripe_subscription}")
                     print(f"DEBUG: Stripe subscription attributes = {dir(stripe_subscription)}")
                     
@@ -473,12 +444,12 @@ def subscription_renew(request):
 
 @csrf_exempt
 def stripe_webhook(request):
-    """Handle Stripe webhook events."""
+    """Verify a Stripe webhook event and queue it for processing."""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
     try:
-        event = stripe.Webhook.construct_event(
+        event = get_gateway().construct_webhook_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
     except ValueError as e:
@@ -486,225 +457,211 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError as e:
         return HttpResponse(status=400)
     
-    # Handle the event
-    if event.type == 'checkout.session.completed':
-        session = event.data.object
-        handle_checkout_session_completed(session)
-    elif event.type == 'customer.subscription.updated':
-        subscription = event.data.object
-        handle_subscription_updated(subscription)
-    elif event.type == 'customer.subscription.deleted':
-        subscription = event.data.object
-        handle_subscription_deleted(subscription)
-    elif event.type == 'invoice.payment_succeeded':
-        invoice = event.data.object
-        handle_invoice_payment_succeeded(invoice)
-    elif event.type == 'invoice.payment_failed':
-        invoice = event.data.object
-        handle_invoice_payment_failed(invoice)
+    # Processing happens in the process_webhook_events worker; redeliveries are ignored
+    WebhookEvent.record(event.id, event.type, json.loads(payload))
     
     return HttpResponse(status=200)
 
-def handle_checkout_session_completed(session):
+def fetch_checkout_session_subscription(session):
+    """
+    Fetch the Stripe subscription a subscription checkout created. The webhook
+    worker calls this before opening the handler's transaction, so no database
+    locks are held during the Stripe request.
+    """
+    if session.mode != 'subscription':
+        return {}
+    return {'subscription': get_gateway().retrieve_subscription(session.subscription)}
+
+def handle_checkout_session_completed(session, subscription=None):
     """Handle successful checkout session completion."""
-    try:
-        # Check if this is a subscription or individual plan purchase
-        if session.mode == 'subscription':
-            # Handle subscription plan purchase
-            subscription_id = session.subscription
-            customer_id = session.customer
-            plan_id = session.metadata.get('plan_id')
-            user_id = session.metadata.get('user_id')
-            
-            # Get the subscription from Stripe
-            stripe.api_key = settings.STRIPE_SECRET_KEY
-            subscription = stripe.Subscription.retrieve(subscription_id)
-            
-            # Get the end date from the subscription
-            if hasattr(subscription, 'current_period_end'):
-                end_timestamp = subscription.current_period_end
-            elif hasattr(subscription, 'period_end'):
-                end_timestamp = subscription.period_end
-            else:
-                # Fallback: set end date to 30 days from now
-                end_timestamp = int(timezone.now().timestamp()) + (30 * 24 * 60 * 60)
-            
-            # Get the user and plan
-            user = User.objects.get(id=user_id)
-            plan = SubscriptionPlan.objects.get(id=plan_id)
-            
-            # Check if user already has an active subscription
-            existing_active = UserSubscription.objects.filter(
+    # Check if this is a subscription or individual plan purchase
+    if session.mode == 'subscription':
+        # Handle subscription plan purchase
+        subscription_id = session.subscription
+        customer_id = session.customer
+        metadata = stripe_metadata(session)
+        plan_id = metadata.get('plan_id')
+        user_id = metadata.get('user_id')
+        
+        # Get the subscription from Stripe unless the caller fetched it
+        if subscription is None:
+            subscription = fetch_checkout_session_subscription(session)['subscription']
+        
+        # Get the end date from the subscription
+        if hasattr(subscription, 'current_period_end'):
+            end_timestamp = subscription.current_period_end
+        elif hasattr(subscription, 'period_end'):
+            end_timestamp = subscription.period_end
+        else:
+            # Fallback: set end date to 30 days from now
+            end_timestamp = int(timezone.now().timestamp()) + (30 * 24 * 60 * 60)
+        
+        # Get the user and plan
+        user = User.objects.get(id=user_id)
+        plan = SubscriptionPlan.objects.get(id=plan_id)
+        
+        # A row for this Stripe subscription means the session was handled
+        # already (e.g. by subscription_success); otherwise reuse any active one
+        existing_active = UserSubscription.objects.filter(
+            user=user,
+            stripe_subscription_id=subscription_id
+        ).first() or UserSubscription.objects.filter(
+            user=user,
+            status='ACTIVE',
+            end_date__gt=timezone.now()
+        ).first()
+
+        if existing_active:
+            # Update the existing active subscription
+            existing_active.plan = plan
+            existing_active.stripe_subscription_id = subscription_id
+            existing_active.end_date = timezone.datetime.fromtimestamp(
+                end_timestamp,
+                tz=pytz.UTC
+            )
+            existing_active.auto_renew = True
+            existing_active.save()
+            user_subscription = existing_active
+            print(f"DEBUG: Webhook - Existing active subscription updated")
+        else:
+            # Create a new subscription
+            user_subscription = UserSubscription.objects.create(
                 user=user,
+                plan=plan,
                 status='ACTIVE',
-                end_date__gt=timezone.now()
-            ).first()
-
-            if existing_active:
-                # Update the existing active subscription
-                existing_active.plan = plan
-                existing_active.stripe_subscription_id = subscription_id
-                existing_active.end_date = timezone.datetime.fromtimestamp(
+                stripe_subscription_id=subscription_id,
+                end_date=timezone.datetime.fromtimestamp(
                     end_timestamp,
                     tz=pytz.UTC
-                )
-                existing_active.auto_renew = True
-                existing_active.save()
-                user_subscription = existing_active
-                print(f"DEBUG: Webhook - Existing active subscription updated")
-            else:
-                # Create a new subscription
-                user_subscription = UserSubscription.objects.create(
-                    user=user,
-                    plan=plan,
-                    status='ACTIVE',
-                    stripe_subscription_id=subscription_id,
-                    end_date=timezone.datetime.fromtimestamp(
-                        end_timestamp,
-                        tz=pytz.UTC
-                    ),
-                    auto_renew=True
-                )
-                print(f"DEBUG: Webhook - New subscription created")
-            
-            # Send confirmation email
-            send_subscription_confirmation(user, plan)
-            
-        elif session.mode == 'payment':
-            # Handle individual plan purchase (exercise or nutrition plan)
-            plan_type = session.metadata.get('plan_type')
-            plan_id = session.metadata.get('plan_id')
-            user_id = session.metadata.get('user_id')
-            
-            if not all([plan_type, plan_id, user_id]):
-                print(f"DEBUG: Webhook - Missing metadata for individual plan purchase")
-                return
+                ),
+                auto_renew=True
+            )
+            print(f"DEBUG: Webhook - New subscription created")
+        
+        # Send confirmation email
+        send_subscription_confirmation(user, user_subscription)
+        
+    elif session.mode == 'payment':
+        # Handle individual plan purchase (exercise or nutrition plan)
+        metadata = stripe_metadata(session)
+        plan_type = metadata.get('plan_type')
+        plan_id = metadata.get('plan_id')
+        user_id = metadata.get('user_id')
+        
+        if not all([plan_type, plan_id, user_id]):
+            print(f"DEBUG: Webhook - Missing metadata for individual plan purchase")
+            return
+        
+        user = User.objects.get(id=user_id)
+        
+        if plan_type == 'nutrition_plan':
+            from inventory.models import NutritionPlan, NutritionPlanProgress
+            plan = NutritionPlan.objects.get(id=plan_id)
             
-            user = User.objects.get(id=user_id)
+            # Create progress record for the user
+            progress, created = NutritionPlanProgress.objects.get_or_create(
+                user=user,
+                plan=plan,
+                defaults={'current_meal': plan.meals.first()}
+            )
+            print(f"DEBUG: Webhook - Created nutrition plan progress: {created}")
             
-            if plan_type == 'nutrition_plan':
-                from inventory.models import NutritionPlan, NutritionPlanProgress
-                plan = NutritionPlan.objects.get(id=plan_id)
-                
-                # Create progress record for the user
-                progress, created = NutritionPlanProgress.objects.get_or_create(
-                    user=user,
-                    plan=plan,
-                    defaults={'current_meal': plan.meals.first()}
-                )
-                print(f"DEBUG: Webhook - Created nutrition plan progress: {created}")
-                
-            elif plan_type == 'exercise_plan':
-                from inventory.models import ExercisePlan, ExercisePlanProgress
-                plan = ExercisePlan.objects.get(id=plan_id)
-                
-                # Create progress record for the user
-                progress, created = ExercisePlanProgress.objects.get_or_create(
-                    user=user,
-                    plan=plan,
-                    defaults={'current_step': plan.steps.first()}
-                )
-                print(f"DEBUG: Webhook - Created exercise plan progress: {created}")
+        elif plan_type == 'exercise_plan':
+            from inventory.models import ExercisePlan, ExercisePlanProgress
+            plan = ExercisePlan.objects.get(id=plan_id)
             
-            print(f"DEBUG: Webhook - Individual plan purchase processed: {plan_type} - {plan_id}")
+            # Create progress record for the user
+            progress, created = ExercisePlanProgress.objects.get_or_create(
+                user=user,
+                plan=plan,
+                defaults={'current_step': plan.steps.first()}
+            )
+            print(f"DEBUG: Webhook - Created exercise plan progress: {created}")
         
-    except Exception as e:
-        logger.error(f"Error handling checkout session: {str(e)}")
-        raise
+        print(f"DEBUG: Webhook - Individual plan purchase processed: {plan_type} - {plan_id}")
 
 def handle_subscription_updated(subscription):
     """Handle subscription updates from Stripe."""
-    try:
-        user_subscription = UserSubscription.objects.get(
-            stripe_subscription_id=subscription.id
-        )
-        
-        if subscription.status == 'active':
-            user_subscription.status = 'ACTIVE'
-            user_subscription.end_date = timezone.datetime.fromtimestamp(
-                subscription.current_period_end,
-                tz=pytz.UTC
-            )
-            user_subscription.save()
-            send_subscription_renewed(user_subscription.user, user_subscription.plan)
-        elif subscription.status == 'canceled':
-            user_subscription.status = 'CANCELLED'
-            user_subscription.auto_renew = False
-            user_subscription.save()
-            send_subscription_cancelled(user_subscription.user, user_subscription.plan)
-            
-    except UserSubscription.DoesNotExist:
-        logger.error(f"Subscription {subscription.id} not found")
-    except Exception as e:
-        logger.error(f"Error handling subscription update: {str(e)}")
-        raise
-
-def handle_subscription_deleted(subscription):
-    """Handle subscription deletion from Stripe."""
-    try:
-        user_subscription = UserSubscription.objects.get(
-            stripe_subscription_id=subscription.id
+    user_subscription = UserSubscription.objects.get(
+        stripe_subscription_id=subscription.id
+    )
+    
+    if subscription.status == 'active':
+        user_subscription.status = 'ACTIVE'
+        user_subscription.end_date = timezone.datetime.fromtimestamp(
+            subscription.current_period_end,
+            tz=pytz.UTC
         )
+        user_subscription.save()
+        send_subscription_renewed(user_subscription.user, user_subscription)
+    elif subscription.status == 'canceled':
         user_subscription.status = 'CANCELLED'
         user_subscription.auto_renew = False
         user_subscription.save()
-        send_subscription_cancelled(user_subscription.user, user_subscription.plan)
-    except UserSubscription.DoesNotExist:
-        logger.error(f"Subscription {subscription.id} not found")
-    except Exception as e:
-        logger.error(f"Error handling subscription deletion: {str(e)}")
-        raise
+        send_subscription_cancelled(user_subscription.user, user_subscription)
+
+def handle_subscription_deleted(subscription):
+    """Handle subscription deletion from Stripe."""
+    user_subscription = UserSubscription.objects.get(
+        stripe_subscription_id=subscription.id
+    )
+    user_subscription.status = 'CANCELLED'
+    user_subscription.auto_renew = False
+    user_subscription.save()
+    send_subscription_cancelled(user_subscription.user, user_subscription)
 
 def handle_invoice_payment_succeeded(invoice):
     """Handle successful invoice payment."""
-    try:
-        subscription_id = invoice.subscription
-        user_subscription = UserSubscription.objects.get(
-            stripe_subscription_id=subscription_id
-        )
-        
-        # Create payment record
-        PaymentRecord.objects.create(
-            subscription=user_subscription,
-            amount=invoice.amount_paid / 100,  # Convert from cents
-            currency=invoice.currency,
-            status='SUCCEEDED',
-            stripe_payment_id=invoice.payment_intent,
-            invoice_number=invoice.number
-        )
-        
-    except UserSubscription.DoesNotExist:
-        logger.error(f"Subscription {subscription_id} not found")
-    except Exception as e:
-        logger.error(f"Error handling invoice payment: {str(e)}")
-        raise
+    user_subscription = UserSubscription.objects.get(
+        stripe_subscription_id=invoice.subscription
+    )
+    
+    # Create the payment record, or update it if a retried invoice paid
+    details = {
+        'subscription': user_subscription,
+        'amount': Decimal(invoice.amount_paid) / 100,  # Convert from cents
+        'currency': invoice.currency,
+        'status': 'SUCCEEDED',
+        'stripe_payment_id': invoice.payment_intent,
+    }
+    payment_record, created = PaymentRecord.objects.get_or_create(
+        invoice_number=invoice.number,
+        defaults=details
+    )
+    
+    # A redelivered event keeps the rendered PDF; changed details clear it
+    # so the render_invoices worker renders the invoice again
+    if not created and any(getattr(payment_record, field) != value for field, value in details.items()):
+        for field, value in details.items():
+            setattr(payment_record, field, value)
+        stale_pdf = payment_record.invoice_pdf.name
+        payment_record.invoice_pdf = None
+        payment_record.save()
+        if stale_pdf:
+            transaction.on_commit(lambda: invoices.delete_unreferenced_invoice_pdf(stale_pdf))
 
 def handle_invoice_payment_failed(invoice):
     """Handle failed invoice payment."""
-    try:
-        subscription_id = invoice.subscription
-        user_subscription = UserSubscription.objects.get(
-            stripe_subscription_id=subscription_id
-        )
-        
-        # Create payment record
-        PaymentRecord.objects.create(
-            subscription=user_subscription,
-            amount=invoice.amount_due / 100,  # Convert from cents
-            currency=invoice.currency,
-            status='FAILED',
-            stripe_payment_id=invoice.payment_intent,
-            invoice_number=invoice.number
-        )
-        
-        # Send payment failed notification
-        send_payment_failed(user_subscription.user, user_subscription.plan)
-        
-    except UserSubscription.DoesNotExist:
-        logger.error(f"Subscription {subscription_id} not found")
-    except Exception as e:
-        logger.error(f"Error handling failed payment: {str(e)}")
-        raise
+    user_subscription = UserSubscription.objects.get(
+        stripe_subscription_id=invoice.subscription
+    )
+    
+    # Record the failure unless this invoice already has a record; a late
+    # failure event must not overwrite a later successful payment
+    payment_record, created = PaymentRecord.objects.get_or_create(
+        invoice_number=invoice.number,
+        defaults={
+            'subscription': user_subscription,
+            'amount': Decimal(invoice.amount_due) / 100,  # Convert from cents
+            'currency': invoice.currency,
+            'status': 'FAILED',
+            'stripe_payment_id': invoice.payment_intent,
+        }
+    )
+    
+    # Only the event that recorded the failure notifies, not its retries
+    if created:
+        send_payment_failed(user_subscription.user, user_subscription)
 
 @csrf_exempt
 @login_required
@@ -726,11 +683,7 @@ def switch_subscription_plan(request, plan_id):
 
     try:
         # Get current active subscription
-        current_subscription = UserSubscription.objects.filter(
-            user=request.user,
-            status='ACTIVE',
-            end_date__gt=timezone.now()
-        ).first()
+        current_subscription = get_active_subscription(request)
 
         if not current_subscription:
             return JsonResponse(
@@ -760,10 +713,8 @@ def switch_subscription_plan(request, plan_id):
                 status=400
             )
 
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-
         # Create Stripe Checkout Session for plan switch
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = get_gateway().create_checkout_session(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -862,28 +813,44 @@ def payment_history(request):
         messages.error(request, "An error occurred while loading payment history.")
         return redirect('subscriptions:dashboard')
 
+def invoice_etag(request, payment_id):
+    name = PaymentRecord.objects.filter(
+        id=payment_id,
+        subscription__user=request.user
+    ).values_list('invoice_pdf', flat=True).first()
+    return invoices.invoice_etag(name)
+
 @login_required
+@condition(etag_func=invoice_etag)
 def download_invoice(request, payment_id):
     """
     Download invoice PDF for a specific payment.
+    Invoices are stored under their content hash, which doubles as the ETag,
+    so a browser that already has the file gets a 304.
     """
     try:
         payment = get_object_or_404(
-            PaymentRecord,
+            PaymentRecord.objects.select_related('subscription__user', 'subscription__plan'),
             id=payment_id,
             subscription__user=request.user
         )
         
-        if not payment.invoice_pdf:
-            # Generate PDF if it doesn't exist
-            generate_invoice_pdf(payment)
+        name = payment.invoice_pdf.name
+        if not name:
+            # Not pre-rendered by the worker yet. Serve the file just stored,
+            # the record is left empty if it changed during the render.
+            name = generate_invoice_pdf(payment)
         
-        # Serve the PDF file
+        # Stream the PDF file
         response = FileResponse(
-            payment.invoice_pdf,
+            payment.invoice_pdf.storage.open(name, 'rb'),
             as_attachment=True,
             filename=f"invoice_{payment.invoice_number}.pdf"
         )
+        etag = invoices.invoice_etag(name)
+        if etag:
+            response['ETag'] = quote_etag(etag)
+        patch_cache_control(response, private=True, no_cache=True)
         return response
         
     except Exception as e:
@@ -911,11 +878,7 @@ def start_trial(request, plan_id):
             return redirect('subscriptions:plan_list')
 
         # Check if user already has an active subscription or trial
-        active_subscription = UserSubscription.objects.filter(
-            user=request.user,
-            status__in=['ACTIVE', 'TRIAL'],
-            end_date__gt=timezone.now()
-        ).first()
+        active_subscription = get_active_subscription(request, include_trial=True)
 
         if active_subscription:
             if active_subscription.is_trial_active():
@@ -953,15 +916,7 @@ def start_trial(request, plan_id):
         except Exception as e:
             logger.error(f"Failed to send trial started email to user {request.user.id}: {str(e)}")
 
-        # Schedule trial reminder emails
-        reminder_days = [3, 1]  # Send reminders 3 days and 1 day before trial ends
-        for days in reminder_days:
-            reminder_date = subscription.trial_end_date - timezone.timedelta(days=days)
-            if reminder_date > timezone.now():
-                try:
-                    send_trial_reminder_email(request.user, subscription, days)
-                except Exception as e:
-                    logger.error(f"Failed to send trial reminder email to user {request.user.id}: {str(e)}")
+        # Trial reminders are sent by the check_trial_notifications command when they fall due
 
         logger.info(f"Successfully started trial for user {request.user.id} with plan {plan_id}")
         messages.success(
@@ -1034,8 +989,7 @@ def convert_trial(request, subscription_id):
         
         # Create Stripe Checkout Session for conversion
         try:
-            stripe.api_key = settings.STRIPE_SECRET_KEY
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = get_gateway().create_checkout_session(
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -0,0 +1,89 @@
+"""
+Worker side of the Stripe webhook queue.
+
+stripe_webhook only verifies and stores events; process_pending_events runs
+the handlers. Events are claimed through a LeasedQueue, so only one worker
+runs each, and the handler's writes commit in the same transaction that
+marks the event processed. If the claim was lost in the meantime the
+transaction is rolled back instead, so an event's database effects are
+applied at most once. Stripe API calls a handler needs are made before that
+transaction opens (EVENT_PREFETCHERS), so no locks are held across a
+network request. Failed events, including ones that arrive before the
+subscription they refer to exists, are retried with exponential backoff.
+"""
+import logging
+from datetime import timedelta
+import stripe
+from django.db import transaction
+from django.utils import timezone
+from ecommerce_site.queues import LeasedQueue
+from .models import WebhookEvent
+from . import views
+
+logger = logging.getLogger(__name__)
+
+EVENT_HANDLERS = {
+    'checkout.session.completed': views.handle_checkout_session_completed,
+    'customer.subscription.updated': views.handle_subscription_updated,
+    'customer.subscription.deleted': views.handle_subscription_deleted,
+    'invoice.payment_succeeded': views.handle_invoice_payment_succeeded,
+    'invoice.payment_failed': views.handle_invoice_payment_failed,
+}
+
+# Stripe API calls an event's handler needs, made before its transaction opens.
+# Each returns keyword arguments for the handler.
+EVENT_PREFETCHERS = {
+    'checkout.session.completed': views.fetch_checkout_session_subscription,
+}
+
+# Events stuck in PROCESSING this long belong to a worker that died
+LEASE_TIMEOUT = timedelta(minutes=5)
+
+queue = LeasedQueue(
+    WebhookEvent,
+    claimed_status='PROCESSING',
+    lease_timeout=LEASE_TIMEOUT,
+    retry_base_delay=timedelta(seconds=30),
+    max_retry_delay=timedelta(hours=1),
+    max_attempts_setting='STRIPE_WEBHOOK_MAX_ATTEMPTS',
+)
+
+
+class LeaseLost(Exception):
+    """Another worker reclaimed the event while its handler was running."""
+
+
+def process_event(webhook_event):
+    """Run the handler for a claimed event. Returns the event's new status."""
+    handler = EVENT_HANDLERS.get(webhook_event.event_type)
+    owned = queue.owned(webhook_event)
+    try:
+        kwargs = {}
+        if handler is not None:
+            event = stripe.Event.construct_from(webhook_event.payload, stripe.api_key)
+            prefetch = EVENT_PREFETCHERS.get(webhook_event.event_type)
+            if prefetch is not None:
+                kwargs = prefetch(event.data.object)
+        with transaction.atomic():
+            if handler is not None:
+                handler(event.data.object, **kwargs)
+            if not owned.update(status='PROCESSED', processed_at=timezone.now(), last_error=''):
+                raise LeaseLost(webhook_event.stripe_event_id)
+        return 'PROCESSED'
+    except LeaseLost:
+        logger.warning(f"Webhook event {webhook_event.stripe_event_id} was reclaimed, discarding this run")
+        return 'PROCESSING'
+    except Exception as e:
+        logger.error(f"Error processing webhook event {webhook_event.stripe_event_id}: {str(e)}")
+        return queue.fail(webhook_event, e)
+
+
+def process_pending_events(batch_size=100):
+    """Process due events in batches until none are left. Returns counts per status."""
+    counts = {'PROCESSED': 0, 'PENDING': 0, 'FAILED': 0, 'PROCESSING': 0}
+    while True:
+        events = queue.claim(batch_size)
+        if not events:
+            return counts
+        for webhook_event in events:
+            counts[process_event(webhook_event)] += 1